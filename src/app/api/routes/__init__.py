@@ -2,10 +2,15 @@ from fastapi import APIRouter
 from app.api.routes.users import router as user_router
 from app.api.routes.boards import router as board_router
 from app.api.routes.lists import router as list_router
-from app.api.routes.cards import router as card_router
+from app.api.routes.cards import router as card_router, batch_router as card_batch_router
+from app.api.routes.events import router as events_router
+from app.api.routes.metrics import router as metrics_router
 
 router = APIRouter()
 router.include_router(user_router)
 router.include_router(board_router)
 router.include_router(list_router)
 router.include_router(card_router)
+router.include_router(card_batch_router)
+router.include_router(events_router)
+router.include_router(metrics_router)
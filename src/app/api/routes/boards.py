@@ -1,20 +1,37 @@
 # from typing import List
 
-from fastapi import APIRouter, Body, Depends, Request
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 # from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from starlette.status import (
     HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
     HTTP_404_NOT_FOUND,
 )
 
 # from pydantic import parse_obj_as
 
 from app.db import models
-from app.db.repositories.boards import board_repo
-from app.db.repositories.users import user_repo
-from app.dependencies.auth import get_current_active_user, get_user_from_token, get_current_active_or_unauthenticated_user
+from app.db.database import release_request_connection
+from app.core import config
+from app.db.repositories import card_repo
+from app.db.repositories.cards import CARD_SEARCH_PAGE_KEY
+from app.db.repositories.boards import board_repo, BOARDS_PAGE_KEY
+from app.db.repositories.lists import list_repo
+from app.dependencies.auth import get_current_active_user, get_user_from_token
+from app.dependencies.resolvers import BoardContext, resolve_board, resolve_board_conditional
 from app.schemes import board as board_schema
+from app.schemes import card as card_schema
+from app.schemes import list as list_schema
 from app.schemes import user as user_schema
+from app.services.board_export import CSV, NDJSON, iterate_board_export
+from app.services.board_import import ImportFailed, import_boards
+from app.utils.etag import make_board_etag
+from app.utils.links import BOARD_LINKS, LIST_LINKS, USER_LINKS, link_builder
+from app.utils.pagination import set_next_cursor_header
+from app.utils.serialization import RowsResponse, serialize_row
 
 
 router = APIRouter(prefix="/boards", tags=["boards"])
@@ -38,9 +55,29 @@ async def create_new_board(
     return board_schema.Board(**board.to_dict())
 
 
+@router.post("/import", name="board:import-boards", status_code=HTTP_201_CREATED)
+async def import_new_boards(
+        request: Request,
+        current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Create boards, lists and cards from ndjson body, one object with `type` field (board, list or card) per line,
+    in format of board export. Lists refer to boards and cards to lists by ids of imported rows, parents should
+    come first. Nothing is created if any line is invalid. Returns ids of created boards by imported ids.
+    """
+    # import writes in its own transaction
+    await release_request_connection(request)
+
+    try:
+        return await import_boards(request.stream(), owner_id=current_user.id)
+    except ImportFailed as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("/", name="board:get-all-public-boards")
-async def get_all(offset: int = 0, limit: int = 25):
-    boards = await board_repo.get_all_public_boards(offset=offset, limit=limit)
+async def get_all(response: Response, offset: int = 0, limit: int = 25, cursor: Optional[str] = None):
+    boards = await board_repo.get_all_public_boards(offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor_header(response, boards, columns=BOARDS_PAGE_KEY, limit=limit)
 
     # query = Board.outerjoin(BoardUsers).outerjoin(User).select()
     # boards = await query.gino.load(
@@ -50,20 +87,15 @@ async def get_all(offset: int = 0, limit: int = 25):
     # users = await query.gino.load(
     #     User.distinct(User.id).load(add_user=Board.distinct(Board.id))).all()
 
-    response = []
-
-    for board in boards:
-        response.append(
-            board_schema.Board(
-                **board.to_dict(),
-                **{
-                    'url': await board_repo.get_board_url(board.id),
-                    'collaborators_url': await board_repo.get_board_collaborators_url(board.id)
-                },
-            )
+    result = [
+        serialize_row(
+            board, board_schema.Board,
+            **board_links,
         )
+        for board, board_links in zip(boards, link_builder.resolve(boards, BOARD_LINKS))
+    ]
 
-    return response
+    return RowsResponse(result, response=response)
 
 
 @router.get("/me", name="board:get-my-boards")
@@ -71,67 +103,153 @@ async def get_my_boards(
         *,
         current_user: models.User = Depends(get_current_active_user),
         offset: int = 0,
-        limit: int = 25
+        limit: int = 25,
+        cursor: Optional[str] = None,
+        response: Response,
 ):
 
-    boards = await board_repo.get_my_boards(user=current_user, offset=offset, limit=limit)
+    boards = await board_repo.get_my_boards(user=current_user, offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor_header(response, boards, columns=BOARDS_PAGE_KEY, limit=limit)
 
-    response = []
-
-    for board in boards:
-        response.append(
-            board_schema.Board(
-                **board.to_dict(),
-                **{
-                    'url': await board_repo.get_board_url(board.id),
-                    'collaborators_url': await board_repo.get_board_collaborators_url(board.id)
-                },
-            )
+    result = [
+        serialize_row(
+            board, board_schema.Board,
+            **board_links,
         )
+        for board, board_links in zip(boards, link_builder.resolve(boards, BOARD_LINKS))
+    ]
 
-    return response
+    return RowsResponse(result, response=response)
 
 
 @router.get("/{board_id}", name="board:get-board-by-id")
 async def get_board(
         *,
         board_id: int,
-        current_user:
-        models.User = Depends(get_current_active_or_unauthenticated_user),
-        request: Request,
+        context: BoardContext = Depends(resolve_board_conditional),
+        response: Response,
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
-    # convert model object to pydantic model, add self url and users url
-    board = board_schema.Board(
-        **board.to_dict(),
-        **{
-            'url': await board_repo.get_board_url(board.id),
-            'collaborators_url': await board_repo.get_board_collaborators_url(board.id)
-        },
-    )
+    board = context.board
+
+    # add self url and users url to board fields
+    result = serialize_row(board, board_schema.Board, **link_builder.resolve_one(board, BOARD_LINKS))
 
-    return board
+    return RowsResponse(result, response=response)
 
 
 @router.get("/{board_id}/users", name="board:get-board-users")
 async def get_board_collaborators(
         *,
         board_id: int,
-        current_user: models.User = Depends(get_current_active_or_unauthenticated_user),
-        request: Request):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
+        context: BoardContext = Depends(resolve_board),
+):
     db_users = await board_repo.get_board_collaborators(board_id=board_id)
     # users = parse_obj_as(List[user_schema.UserPublicList], list(map(models.User.to_dict, db_users)))
-    users = []
+    return [
+        user_schema.UserPublicList(**user.to_dict(), **user_links)
+        for user, user_links in zip(db_users, link_builder.resolve(db_users, USER_LINKS))
+    ]
+
 
-    for user in db_users:
-        users.append(
-            user_schema.UserPublicList(
-                **user.to_dict(),
-                **{'profile_url': await user_repo.get_user_profile_url(user.username)}
+@router.get("/{board_id}/snapshot", name="board:get-board-snapshot", response_model=board_schema.BoardSnapshot)
+async def get_board_snapshot(
+        *,
+        board_id: int,
+        context: BoardContext = Depends(resolve_board_conditional),
+):
+    board = context.board
+    lists = await list_repo.get_board_lists_with_cards(board_id=board.id)
+
+    snapshot = serialize_row(
+        board, board_schema.Board,
+        **link_builder.resolve_one(board, BOARD_LINKS),
+        lists=[
+            serialize_row(
+                lst, list_schema.ListModel,
+                **list_links,
+                cards=[serialize_row(card, card_schema.Card) for card in lst.cards],
             )
+            for lst, list_links in zip(lists, link_builder.resolve(lists, LIST_LINKS))
+        ],
+    )
+
+    # rows come from database, so snapshot is encoded without validation
+    return RowsResponse(snapshot, headers={'ETag': make_board_etag(board)})
+
+
+@router.get("/{board_id}/changes", name="board:get-board-changes", response_model=card_schema.BoardChanges)
+async def get_board_changes(
+        *,
+        board_id: int,
+        context: BoardContext = Depends(resolve_board_conditional),
+        since: int = 0,
+):
+    """
+    Net changes of board cards after history record `since`. Client stores `last_history_id` and passes
+    it as `since` next time, while `has_more` is true it should request next part right away.
+    """
+    changes, last_history_id, has_more = await card_repo.get_board_changes(
+        board_id=context.board.id, since=since, limit=config.BOARD_CHANGES_MAX_RECORDS
+    )
+
+    return card_schema.BoardChanges(
+        since=since,
+        last_history_id=last_history_id,
+        has_more=has_more,
+        changes=[card_schema.CardChange(**record.to_dict() | {'action': action}) for record, action in changes],
+    )
+
+
+@router.get("/{board_id}/search", name="board:search-cards")
+async def search_cards(
+        *,
+        board_id: int,
+        context: BoardContext = Depends(resolve_board_conditional),
+        q: str = Query(..., min_length=1, max_length=256),
+        offset: int = 0,
+        limit: int = 25,
+        cursor: Optional[str] = None,
+        response: Response
+):
+    """
+    Search board cards by title and description. `q` supports "quoted phrases", `or` and -excluded words.
+    Cards are ordered by relevance, next page is requested with cursor from X-Next-Cursor header.
+    """
+    cards = await card_repo.search_board_cards(
+        board_id=context.board.id, text=q, offset=offset, limit=limit, cursor=cursor
+    )
+    set_next_cursor_header(response, cards, columns=CARD_SEARCH_PAGE_KEY, limit=limit)
+
+    result = [
+        serialize_row(
+            card, card_schema.CardSearchResult,
+            score=card.score,
+            title_highlight=card.title_highlight,
+            description_highlight=card.description_highlight,
         )
+        for card in cards
+    ]
+
+    return RowsResponse(result, response=response)
+
 
-    return users
+@router.get("/{board_id}/export", name="board:export-board")
+async def export_board(
+        *,
+        board_id: int,
+        context: BoardContext = Depends(resolve_board),
+        request: Request,
+        export_format: str = Query(NDJSON, alias='format', regex=f'^({NDJSON}|{CSV})$'),
+):
+    """
+    Board, its lists, cards and cards history, one row per line. Every row has `type` field
+    (board, list, card or history), csv rows have all columns, unused by row type are empty.
+    """
+    # export reads in its own transaction
+    await release_request_connection(request)
+
+    return StreamingResponse(
+        iterate_board_export(board_id=context.board.id, export_format=export_format),
+        media_type='text/csv' if export_format == CSV else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="board-{context.board.id}.{export_format}"'},
+    )
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Body, Depends, Request, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, Response, HTTPException
 from starlette.status import (
     HTTP_201_CREATED,
     HTTP_404_NOT_FOUND,
@@ -6,12 +8,19 @@ from starlette.status import (
 )
 
 from app.db import models, enums
-from app.db.repositories import board_repo, list_repo, card_repo
-from app.dependencies.auth import get_current_active_user, get_current_active_or_unauthenticated_user
+from app.db.repositories import card_repo
+from app.db.repositories.cards import CARDS_PAGE_KEY, CARD_HISTORY_PAGE_KEY
+from app.dependencies.auth import get_current_active_user
+from app.dependencies.resolvers import BoardContext, resolve_list_conditional, resolve_list_for_update, \
+    resolve_card_conditional, resolve_card_for_update
 from app.schemes import card as card_schema
+from app.utils.pagination import set_next_cursor_header
+from app.utils.serialization import RowsResponse, serialize_row
 
 
 router = APIRouter(prefix="/boards/{board_id}/lists/{list_id}/cards", tags=["cards"])
+# "/cards:batch" can't be declared under "/cards" prefix of main router
+batch_router = APIRouter(prefix="/boards/{board_id}/lists/{list_id}", tags=["cards"])
 
 
 @router.post("/", name="card:create-card")
@@ -20,17 +29,12 @@ async def create_card(
         board_id: int,
         list_id: int,
         current_user: models.User = Depends(get_current_active_user),
+        context: BoardContext = Depends(resolve_list_for_update),
         card: card_schema.CardCreate = Body(..., embed=True),
-        request: Request
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user,
-                                                             request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
     new_card = await card_repo.create_new_card_and_write_history(
         card=card,
-        list_id=lst.id,
+        list_id=context.list.id,
         user_id=current_user.id
     )
 
@@ -42,23 +46,18 @@ async def get_cards(
         *,
         board_id: int,
         list_id: int,
-        current_user: models.User = Depends(get_current_active_or_unauthenticated_user),
+        context: BoardContext = Depends(resolve_list_conditional),
         offset: int = 0,
         limit: int = 25,
-        request: Request
+        cursor: Optional[str] = None,
+        response: Response
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
-    cards = await card_repo.get_list_cards(list_id=lst.id, offset=offset, limit=limit)
-
-    response = []
-
-    for card in cards:
-        response.append(card_schema.Card(**card.to_dict()))
+    cards = await card_repo.get_list_cards(
+        list_id=context.list.id, board_version=context.board.version, offset=offset, limit=limit, cursor=cursor
+    )
+    set_next_cursor_header(response, cards, columns=CARDS_PAGE_KEY, limit=limit)
 
-    return response
+    return RowsResponse([serialize_row(card, card_schema.Card) for card in cards], response=response)
 
 
 @router.get("/{card_id}", name="card:get-card")
@@ -67,17 +66,10 @@ async def get_card(
         board_id: int,
         list_id: int,
         card_id: int,
-        current_user: models.User = Depends(get_current_active_or_unauthenticated_user),
-        request: Request
+        context: BoardContext = Depends(resolve_card_conditional),
+        response: Response,
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user,
-                                                             request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
-    card = await card_repo.get_card_by_id_and_check_list_foreign_key(card_id=card_id, lst=lst)
-
-    return card_schema.Card(**card.to_dict())
+    return RowsResponse(serialize_row(context.card, card_schema.Card), response=response)
 
 
 @router.patch("/{card_id}", name="card:update-card")
@@ -86,46 +78,54 @@ async def update_card(
         board_id: int,
         list_id: int,
         card_id: int,
-        current_user: models.User = Depends(get_current_active_user),
+        context: BoardContext = Depends(resolve_card_for_update),
         updated_card: card_schema.CardUpdate = Body(..., embed=True),
-        request: Request
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user,
-                                                             request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
-    card = await card_repo.get_card_by_id_and_check_list_foreign_key(card_id=card_id, lst=lst)
+    card = context.card
 
     await card_repo.update_and_write_history(card=card, updated_card=updated_card)
 
     return card_schema.Card(**card.to_dict())
 
 
-@router.get("/{card_id}/history", name="card:get-card-history")
-async def get_card_history(
+@router.post("/{card_id}/move", name="card:move-card")
+async def move_card(
         *,
         board_id: int,
         list_id: int,
         card_id: int,
-        current_user: models.User = Depends(get_current_active_or_unauthenticated_user),
-        request: Request
+        current_user: models.User = Depends(get_current_active_user),
+        context: BoardContext = Depends(resolve_card_for_update),
+        move: card_schema.CardMove = Body(..., embed=True),
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user,
-                                                             request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
-    card = await card_repo.get_card_by_id_and_check_list_foreign_key(card_id=card_id, lst=lst)
+    card = await card_repo.move_and_write_history(
+        card=context.card,
+        move=move,
+        board_id=context.board.id,
+        user_id=current_user.id
+    )
 
-    card_history = await card_repo.get_history(card_id=card.id)
+    return card_schema.Card(**card.to_dict())
 
-    response = []
 
-    for record in card_history:
-        response.append(card_schema.CardHistoryRetrieve(**record.to_dict()))
+@router.get("/{card_id}/history", name="card:get-card-history")
+async def get_card_history(
+        *,
+        board_id: int,
+        list_id: int,
+        card_id: int,
+        context: BoardContext = Depends(resolve_card_conditional),
+        offset: int = 0,
+        limit: int = 25,
+        cursor: Optional[str] = None,
+        response: Response
+):
+    card_history = await card_repo.get_history(card_id=context.card.id, offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor_header(response, card_history, columns=CARD_HISTORY_PAGE_KEY, limit=limit)
 
-    return response
+    return RowsResponse(
+        [serialize_row(record, card_schema.CardHistoryRetrieve) for record in card_history], response=response
+    )
 
 
 @router.delete("/{card_id}", name="card:delete-card")
@@ -134,18 +134,32 @@ async def delete_card(
         board_id: int,
         list_id: int,
         card_id: int,
-        current_user: models.User = Depends(get_current_active_user),
-        request: Request
+        context: BoardContext = Depends(resolve_card_for_update),
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user,
-                                                             request=request)
+    deleted_card = await card_repo.delete_and_write_history(card=context.card)
 
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
+    return card_schema.Card(
+        **deleted_card.to_dict()
+    )
 
-    card = await card_repo.get_card_by_id_and_check_list_foreign_key(card_id=card_id, lst=lst)
 
-    deleted_card = await card_repo.delete_and_write_history(card=card)
+@batch_router.post("/cards:batch", name="card:batch", response_model=card_schema.CardBatchResult)
+async def batch_cards(
+        *,
+        board_id: int,
+        list_id: int,
+        current_user: models.User = Depends(get_current_active_user),
+        context: BoardContext = Depends(resolve_list_for_update),
+        batch: card_schema.CardBatch = Body(..., embed=True),
+):
+    created, updated, deleted = await card_repo.apply_batch_and_write_history(
+        batch=batch,
+        lst=context.list,
+        user_id=current_user.id
+    )
 
-    return card_schema.Card(
-        **deleted_card.to_dict()
+    return card_schema.CardBatchResult(
+        created=[card_schema.Card(**card.to_dict()) for card in created],
+        updated=[card_schema.Card(**card.to_dict()) for card in updated],
+        deleted=[card_schema.Card(**card.to_dict()) for card in deleted],
     )
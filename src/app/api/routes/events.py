@@ -0,0 +1,145 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.status import (
+    WS_1008_POLICY_VIOLATION,
+    WS_1013_TRY_AGAIN_LATER,
+)
+
+from app.core import config
+from app.db import models
+from app.db.database import release_request_connection
+from app.db.repositories import card_repo
+from app.db.repositories.boards import board_repo
+from app.dependencies.auth import get_websocket_user
+from app.dependencies.resolvers import BoardContext, resolve_board
+from app.schemes import card as card_schema
+from app.services.board_events import SlowConsumer, Subscription, board_event_hub
+from app.utils.serialization import dump_json
+
+
+# router prefix is not applied to websocket routes, so paths are declared in full
+router = APIRouter(tags=["events"])
+
+
+async def send_board_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        message = await subscription.get()
+        # client which doesn't read its socket is disconnected, instead of buffering events for it
+        await asyncio.wait_for(websocket.send_json(message), timeout=config.BOARD_EVENTS_SEND_TIMEOUT)
+
+
+async def wait_for_disconnect(websocket: WebSocket):
+    # messages from client are ignored
+    while (await websocket.receive())['type'] != 'websocket.disconnect':
+        pass
+
+
+@router.websocket("/boards/{board_id}/ws", name="board:events-ws")
+async def board_events_ws(
+        websocket: WebSocket,
+        board_id: int,
+        current_user: Optional[models.User] = Depends(get_websocket_user),
+):
+    board = await board_repo.get_board(board_id)
+
+    user_is_collaborator = current_user is not None and await board_repo.check_user_is_board_collaborator(
+        board_id=board_id, user_id=current_user.id
+    )
+
+    if not board or not (board.public or user_is_collaborator):
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+
+    async with await board_event_hub.subscribe(board_id) as subscription:
+        # client compares version with its state, changes after it are pushed by subscription
+        await websocket.send_json({'board_id': board.id, 'version': board.version, 'events': []})
+
+        sender = asyncio.create_task(send_board_events(websocket, subscription))
+        receiver = asyncio.create_task(wait_for_disconnect(websocket))
+
+        done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+        if sender in done and isinstance(sender.exception(), (SlowConsumer, asyncio.TimeoutError)):
+            await websocket.close(code=WS_1013_TRY_AGAIN_LATER)
+
+
+def format_sse(*, data: bytes, event: str = None, event_id: int = None) -> bytes:
+    message = b''
+    if event_id is not None:
+        message += b'id: %d\n' % event_id
+    if event is not None:
+        message += b'event: %s\n' % event.encode()
+    return message + b'data: ' + data + b'\n\n'
+
+
+async def board_history_stream(request: Request, *, board_id: int, after_id: int):
+    """
+    Send history records of the board after after_id, then wait for new changes and send them.
+    """
+    # subscribe before catch up query, so changes committed during it are not missed
+    subscription = await board_event_hub.subscribe(board_id)
+
+    try:
+        while True:
+            records = await card_repo.get_board_history(
+                board_id=board_id, after_id=after_id, limit=config.BOARD_EVENTS_REPLAY_BATCH
+            )
+            await release_request_connection(request)
+
+            for record in records:
+                yield format_sse(
+                    data=dump_json(card_schema.CardHistoryRetrieve(**record.to_dict()).dict()),
+                    event=str(record.action),
+                    event_id=record.id,
+                )
+                after_id = record.id
+
+            if len(records) == config.BOARD_EVENTS_REPLAY_BATCH:
+                continue
+
+            if await request.is_disconnected():
+                break
+
+            try:
+                # content of notification is not needed, new records are read from history
+                await asyncio.wait_for(subscription.get(), timeout=config.BOARD_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+            except SlowConsumer:
+                # missed notifications are covered by next history query
+                subscription = await board_event_hub.subscribe(board_id)
+    finally:
+        subscription.close()
+
+
+@router.get("/boards/{board_id}/events", name="board:events-stream")
+async def board_events_stream(
+        *,
+        board_id: int,
+        context: BoardContext = Depends(resolve_board),
+        request: Request,
+        last_event_id: Optional[int] = Header(None),
+        after_id: Optional[int] = None,
+):
+    """
+    Server-sent events fallback of board websocket. Reconnecting client sends Last-Event-ID header
+    (or after_id query parameter) and receives all history records it missed. New clients receive
+    only changes made after connection.
+    """
+    if last_event_id is None:
+        last_event_id = after_id
+    if last_event_id is None:
+        last_event_id = await card_repo.get_last_history_id()
+
+    return StreamingResponse(
+        board_history_stream(request, board_id=context.board.id, after_id=last_event_id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -1,16 +1,17 @@
-from typing import List
+from typing import Optional
 
-from fastapi import APIRouter, Body, Depends, Request
+from fastapi import APIRouter, Body, Depends, Response
 
-from pydantic import parse_obj_as
-
-from app.db.database import db
 from app.db.models import User, Board, BoardUsers
-from app.db.repositories.boards import board_repo
-from app.db.repositories.lists import list_repo
-from app.dependencies.auth import get_current_active_user, get_user_from_token, get_current_active_or_unauthenticated_user
+from app.db.repositories.lists import list_repo, LISTS_PAGE_KEY, LIST_HISTORY_PAGE_KEY
+from app.dependencies.auth import get_current_active_user, get_user_from_token
+from app.dependencies.resolvers import BoardContext, resolve_board_conditional, resolve_board_for_update, \
+    resolve_list_conditional, resolve_list_for_update
 from app.schemes import list as list_schema
 from app.schemes import card as card_schema
+from app.utils.links import LIST_LINKS, link_builder
+from app.utils.pagination import set_next_cursor_header
+from app.utils.serialization import RowsResponse, serialize_row
 
 
 router = APIRouter(prefix="/boards", tags=["lists"])
@@ -21,22 +22,17 @@ async def create_list(
         *,
         board_id: int,
         current_user: User = Depends(get_current_active_user),
+        context: BoardContext = Depends(resolve_board_for_update),
         title: str = Body(..., embed=True),
-        request: Request
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
     new_list = await list_repo.create_new_list(
         created_by=current_user,
-        list_obj=list_schema.ListCreate(**{'title': title, 'board_id': board.id})
+        list_obj=list_schema.ListCreate(**{'title': title, 'board_id': context.board.id})
     )
 
     return list_schema.ListModel(
         **new_list.to_dict(),
-        **{
-            'url': await list_repo.get_list_url(board_id=board_id, list_id=new_list.id),
-            'cards_url': await list_repo.get_cards_url(board_id=board_id, list_id=new_list.id),
-        }
+        **link_builder.resolve_one(new_list, LIST_LINKS),
     )
 
 
@@ -44,30 +40,24 @@ async def create_list(
 async def get_lists(
         *,
         board_id: int,
-        current_user: User = Depends(get_current_active_or_unauthenticated_user),
+        context: BoardContext = Depends(resolve_board_conditional),
         offset: int = 0,
         limit: int = 25,
-        request: Request
+        cursor: Optional[str] = None,
+        response: Response
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
-    lists = await list_repo.get_multiple_lists(board_id=board_id, offset=offset, limit=limit)
-
-    response = []
-
-    # TODO: create separate function to convert model objects to json list
-    for lst in lists:
-        response.append(
-            list_schema.ListModel(
-                **lst.to_dict(),
-                **{
-                    'url': await list_repo.get_list_url(board_id=board_id, list_id=lst.id),
-                    'cards_url': await list_repo.get_cards_url(board_id=board_id, list_id=lst.id)
-                }
-            )
+    lists = await list_repo.get_multiple_lists(board_id=board_id, offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor_header(response, lists, columns=LISTS_PAGE_KEY, limit=limit)
+
+    result = [
+        serialize_row(
+            lst, list_schema.ListModel,
+            **list_links,
         )
+        for lst, list_links in zip(lists, link_builder.resolve(lists, LIST_LINKS))
+    ]
 
-    return response
+    return RowsResponse(result, response=response)
 
 
 @router.get("/{board_id}/lists/{list_id}", name="list:get-list-by-id")
@@ -75,43 +65,51 @@ async def get_list(
         *,
         board_id: int,
         list_id: int,
-        current_user: User = Depends(get_current_active_or_unauthenticated_user),
-        request: Request
+        context: BoardContext = Depends(resolve_list_conditional),
+        response: Response,
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
+    requested_list = context.list
 
-    requested_list = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
-    return list_schema.ListModel(
-        **requested_list.to_dict(),
-        **{
-            'url': await list_repo.get_list_url(board_id=board_id, list_id=requested_list.id),
-            'cards_url': await list_repo.get_cards_url(board_id=board_id, list_id=requested_list.id),
-        }
+    result = serialize_row(
+        requested_list, list_schema.ListModel, **link_builder.resolve_one(requested_list, LIST_LINKS)
     )
 
+    return RowsResponse(result, response=response)
+
 
 @router.patch("/{board_id}/lists/{list_id}", name="list:update-list")
 async def update_list(
         *,
         board_id: int,
         list_id: int,
-        current_user: User = Depends(get_current_active_user),
+        context: BoardContext = Depends(resolve_list_for_update),
         updated_list: list_schema.ListUpdate = Body(..., embed=True),
-        request: Request
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
+    lst = context.list
 
     await list_repo.update(lst=lst, updated_list=updated_list)
 
     return list_schema.ListModel(
         **lst.to_dict(),
-        **{
-            'url': await list_repo.get_list_url(board_id=board_id, list_id=lst.id),
-            'cards_url': await list_repo.get_cards_url(board_id=board_id, list_id=lst.id),
-        }
+        **link_builder.resolve_one(lst, LIST_LINKS),
+    )
+
+
+@router.post("/{board_id}/lists/{list_id}/move", name="list:move-list")
+async def move_list(
+        *,
+        board_id: int,
+        list_id: int,
+        context: BoardContext = Depends(resolve_list_for_update),
+        move: list_schema.ListMove = Body(..., embed=True),
+):
+    lst = context.list
+
+    await list_repo.move(lst=lst, move=move)
+
+    return list_schema.ListModel(
+        **lst.to_dict(),
+        **link_builder.resolve_one(lst, LIST_LINKS),
     )
 
 
@@ -120,18 +118,15 @@ async def get_list(
         *,
         board_id: int,
         list_id: int,
-        current_user: User = Depends(get_current_active_or_unauthenticated_user),
-        request: Request,
+        context: BoardContext = Depends(resolve_list_conditional),
+        response: Response,
         offset: int = 0,
         limit: int = 25,
+        cursor: Optional[str] = None,
 ):
-    board = await board_repo.get_board_and_check_permissions(board_id=board_id, current_user=current_user, request=request)
-
-    lst = await list_repo.get_list_by_id_and_check_board_foreign_key(list_id=list_id, board=board)
-
-    history_list = await list_repo.get_cards_history(list_id=lst.id, offset=offset, limit=limit)
+    history_list = await list_repo.get_cards_history(list_id=context.list.id, offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor_header(response, history_list, columns=LIST_HISTORY_PAGE_KEY, limit=limit)
 
-    return parse_obj_as(
-        List[card_schema.CardHistoryRetrieve],
-        list(map(db.Model.to_dict, history_list))
+    return RowsResponse(
+        [serialize_row(record, card_schema.CardHistoryRetrieve) for record in history_list], response=response
     )
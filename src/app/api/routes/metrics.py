@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+
+from app.db.models import User
+from app.db.repositories.users import user_cache
+from app.dependencies.auth import get_current_superuser
+from app.services.board_events import board_event_hub
+from app.services.history_sink import history_sink
+from app.services.authentication import password_hasher, token_payload_cache
+from app.services.outbox import outbox_dispatcher
+from app.services.read_cache import read_cache
+from app.utils.single_flight import read_flight
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/", name="metrics:get-metrics")
+async def get_metrics(current_user: User = Depends(get_current_superuser)):
+    """
+    Internal counters of caches, queues and background services, available to superusers only.
+    """
+    return {
+        'password_hasher': password_hasher.stats(),
+        'user_cache': user_cache.stats(),
+        'token_cache': token_payload_cache.stats(),
+        'outbox_dispatcher': outbox_dispatcher.stats(),
+        'board_events': board_event_hub.stats(),
+        'history_sink': history_sink.stats(),
+        'read_cache': read_cache.stats(),
+        'read_flight': read_flight.stats(),
+    }
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Path, Body, Depends, File, UploadFile
+from typing import List, Optional
+
+from fastapi import APIRouter, Path, Body, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from starlette.status import (
@@ -8,19 +10,20 @@ from starlette.status import (
     HTTP_401_UNAUTHORIZED,
     HTTP_404_NOT_FOUND,
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
-from app.core.config import PROFILE_PICTURE_PATH, MEDIA_PATH
-from app.db.repositories.users import user_repo
+from app.core.config import PROFILE_PICTURE_PATH, MEDIA_PATH, USERS_EXPORT_BATCH_SIZE
+from app.db.repositories.users import user_repo, USERS_SEARCH_PAGE_KEY
 from app.db.models import User
-from app.dependencies.auth import get_current_active_user
+from app.dependencies.auth import get_current_active_user, get_current_superuser
 from app.schemes import user as user_schema
 from app.services import auth_service
 from app.schemes.token import AccessToken
 
-from app.celery.worker import send_sign_up_email
-
 from app.utils.image_loading import upload_image, delete_image
+from app.utils.links import USER_LINKS, link_builder
+from app.utils.pagination import set_next_cursor_header
+from app.utils.serialization import dump_json, pick_fields
 
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -54,6 +57,39 @@ async def user_login_with_email_and_password(
     return access_token
 
 
+@router.get("/search", name="users:search-users", response_model=List[user_schema.UserPublicList])
+async def search_users(
+        *,
+        q: str = Query(..., min_length=3, max_length=100),
+        limit: int = Query(10, ge=1, le=50),
+        cursor: Optional[str] = None,
+        current_user: User = Depends(get_current_active_user),
+        response: Response,
+):
+    """
+    Find users to add as collaborators: username contains `q` or email starts with it.
+    """
+    users = await user_repo.search_users(text=q, limit=limit, cursor=cursor)
+    set_next_cursor_header(response, users, columns=USERS_SEARCH_PAGE_KEY, limit=limit)
+
+    return [
+        user_schema.UserPublicList(username=user.username, **user_links)
+        for user, user_links in zip(users, link_builder.resolve(users, USER_LINKS))
+    ]
+
+
+@router.get("/export", name="users:export-users")
+async def export_users(current_user: User = Depends(get_current_superuser)):
+    """
+    All users as newline delimited json, streamed while they are read from database.
+    """
+    async def generate_lines():
+        async for user in user_repo.iterate_all_users(batch_size=USERS_EXPORT_BATCH_SIZE):
+            yield dump_json(pick_fields(user.to_dict(), user_schema.User)) + b'\n'
+
+    return StreamingResponse(generate_lines(), media_type='application/x-ndjson')
+
+
 @router.get("/user/{username}", name="user:get-user-by-username")
 async def get_user_by_username(username: str = Path(..., min_length=3, regex="^[a-zA-Z0-9_-]+$")) -> user_schema.User:
     user = await user_repo.get_user_by_username(username)
@@ -63,7 +99,7 @@ async def get_user_by_username(username: str = Path(..., min_length=3, regex="^[
 
     return user_schema.UserPublic(
         **user.to_dict(),
-        profile_url=await user_repo.get_user_profile_url(username=user.username)
+        **link_builder.resolve_one(user, USER_LINKS)
     )
 
 
@@ -71,10 +107,6 @@ async def get_user_by_username(username: str = Path(..., min_length=3, regex="^[
 async def register_new_user(new_user: user_schema.UserCreate = Body(..., embed=True)) -> user_schema.User:
     created_user = await user_repo.register_new_user(new_user)
 
-    a = send_sign_up_email.delay(email=new_user.email)
-    print(a)
-    print(a.get())
-
     access_token = AccessToken(
         access_token=auth_service.create_access_token_for_user(user=user_schema.User(**created_user.to_dict())), token_type="bearer"
     )
@@ -106,8 +138,11 @@ async def update_password(
 
 
 @router.post("/profile_picture")
-async def upload_profile_picture(file: UploadFile = File(...), current_user: User = Depends(get_current_active_user)):
-    image_async_res_id = await upload_image(file=file, user=current_user)
+async def upload_profile_picture(request: Request, current_user: User = Depends(get_current_active_user)):
+    """
+    Multipart form with image in file field. Body is streamed to spool file, not parsed as form by FastAPI.
+    """
+    image_async_res_id = await upload_image(request=request, user=current_user)
 
     return {
         'task_id': str(image_async_res_id)
@@ -1,19 +1,30 @@
+import datetime
 import os
 
 from celery import Celery
+from celery.schedules import crontab
 from fastapi.exceptions import HTTPException
-from io import BytesIO
 from PIL import Image, UnidentifiedImageError
+from sqlalchemy import create_engine
 from starlette.status import (
     HTTP_400_BAD_REQUEST
 )
 
-from app.core.config import PROFILE_PICTURE_PATH, MEDIA_PATH
+from app.core.config import PROFILE_PICTURE_PATH, MEDIA_PATH, DB_DSN, HISTORY_ARCHIVE_PATH, \
+    HISTORY_PARTITIONS_AHEAD, HISTORY_RETENTION_MONTHS
+from app.db import history_partitions, rank_maintenance
+from app.services.read_cache import cards_namespace, invalidate_from_worker
 
 
 celery = Celery(__name__)
 celery.conf.broker_url = os.environ.get("CELERY_BROKER_URL", "redis://redis:6379")
 celery.conf.result_backend = os.environ.get("CELERY_RESULT_BACKEND", "redis://redis:6379")
+celery.conf.beat_schedule = {
+    'maintain-history-partitions': {
+        'task': 'maintain_history_partitions',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
 
 
 def mock_up_send_email(email, message):
@@ -33,14 +44,16 @@ def send_sign_up_email(*, email: str):
 
 
 @celery.task(name="upload_image_task", soft_time_limit=60)
-def upload_image_task(*, file: str, username: str):
+def upload_image_task(*, path: str, username: str):
+    # path points to spooled upload on shared media volume
     try:
-        img = Image.open(BytesIO(bytes.fromhex(file)))
+        with Image.open(path) as img:
+            img.thumbnail((100, 100))
+            img.save(f'{PROFILE_PICTURE_PATH}{username}.jpg')
     except UnidentifiedImageError:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail='Invalid image file or format')
-
-    img.thumbnail((100, 100))
-    img.save(f'{PROFILE_PICTURE_PATH}{username}.jpg')
+    finally:
+        os.remove(path)
 
     return username
 
@@ -50,3 +63,39 @@ def delete_image_task(*, username: str):
     os.remove(f'{PROFILE_PICTURE_PATH}{username}.jpg')
 
     return True
+
+
+@celery.task(name="maintain_history_partitions", soft_time_limit=60 * 60)
+def maintain_history_partitions():
+    today = datetime.date.today()
+    engine = create_engine(DB_DSN)
+
+    try:
+        with engine.connect() as connection:
+            created = history_partitions.create_future_partitions(
+                connection, today=today, months_ahead=HISTORY_PARTITIONS_AHEAD
+            )
+            archived = history_partitions.archive_old_partitions(
+                connection, today=today, retention_months=HISTORY_RETENTION_MONTHS, archive_path=HISTORY_ARCHIVE_PATH
+            )
+    finally:
+        engine.dispose()
+
+    return {'created': created, 'archived': archived}
+
+
+@celery.task(name="rebalance_ranks", soft_time_limit=60)
+def rebalance_ranks(*, list_id: int = None, board_id: int = None):
+    engine = create_engine(DB_DSN)
+
+    try:
+        with engine.connect() as connection:
+            rebalanced = rank_maintenance.rebalance_ranks(connection, list_id=list_id, board_id=board_id)
+
+            # ranks are committed, cached cards with old ranks are dropped (pages of lists are not cached)
+            if rebalanced and list_id is not None:
+                invalidate_from_worker(cards_namespace(list_id))
+    finally:
+        engine.dispose()
+
+    return rebalanced
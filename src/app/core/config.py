@@ -12,10 +12,13 @@ config = Config(env_path)
 PROJECT_NAME = "Kanban"
 VERSION = "1.0.0"
 API_PREFIX = "/api"
-BASE_URL = 'http://127.0.0.1:8000'
+# start of links in responses, empty for relative links
+BASE_URL = config("BASE_URL", default='http://127.0.0.1:8000')
 
 MEDIA_PATH = '/usr/src/media/'
 PROFILE_PICTURE_PATH = '/usr/src/media/profile_pic/'
+# uploads are copied here before celery worker processes them
+UPLOAD_SPOOL_PATH = '/usr/src/media/spool/'
 
 # openssl rand -hex 32
 SECRET_KEY = config("SECRET_KEY", cast=Secret, default=None)
@@ -29,6 +32,83 @@ JWT_ALGORITHM = config("JWT_ALGORITHM", cast=str, default="HS256")
 JWT_AUDIENCE = config("JWT_AUDIENCE", cast=str, default='fastapi:auth')
 JWT_TOKEN_PREFIX = config("JWT_TOKEN_PREFIX", cast=str, default="Bearer")
 
+# decoded JWT payloads, cached per token (never longer than token expiration)
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", cast=int, default=4096)
+TOKEN_CACHE_TTL = config("TOKEN_CACHE_TTL", cast=float, default=300)
+# authenticated users, cached per username in every process. Set size or ttl to 0 to disable cache.
+# Entries are checked against read cache (see READ_CACHE_REDIS_URL), so user changes are seen by all processes
+# at once. Without it other processes may authenticate with previous user row for up to USER_CACHE_TTL seconds
+USER_CACHE_SIZE = config("USER_CACHE_SIZE", cast=int, default=1024)
+USER_CACHE_TTL = config("USER_CACHE_TTL", cast=float, default=5)
+
+# identical concurrent reads of boards, lists and cards in one process share one query
+READ_SINGLE_FLIGHT_ENABLED = config("READ_SINGLE_FLIGHT_ENABLED", cast=bool, default=True)
+
+# pages of list cards shared by all processes in redis, disabled if url is empty.
+# Errors are not retried for READ_CACHE_RETRY_INTERVAL seconds, reads go to database meanwhile
+READ_CACHE_REDIS_URL = config("READ_CACHE_REDIS_URL", default="")
+READ_CACHE_TTL = config("READ_CACHE_TTL", cast=int, default=60)
+READ_CACHE_TIMEOUT = config("READ_CACHE_TIMEOUT", cast=float, default=0.1)
+READ_CACHE_RETRY_INTERVAL = config("READ_CACHE_RETRY_INTERVAL", cast=float, default=5.0)
+READ_CACHE_PREFIX = config("READ_CACHE_PREFIX", default="kanban")
+
+# bcrypt runs in separate thread pool, calls above max queue are rejected (0 - unbounded queue)
+PASSWORD_HASHER_WORKERS = config("PASSWORD_HASHER_WORKERS", cast=int, default=min(4, os.cpu_count() or 1))
+PASSWORD_HASHER_MAX_QUEUE = config("PASSWORD_HASHER_MAX_QUEUE", cast=int, default=512)
+
+# outbox dispatcher sends queued celery tasks in batches, polls outbox table when it is empty
+OUTBOX_DISPATCHER_ENABLED = config("OUTBOX_DISPATCHER_ENABLED", cast=bool, default=True)
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", cast=int, default=100)
+OUTBOX_POLL_INTERVAL = config("OUTBOX_POLL_INTERVAL", cast=float, default=1.0)
+
+MAX_PROFILE_PICTURE_SIZE = config("MAX_PROFILE_PICTURE_SIZE", cast=int, default=5 * 1024 * 1024)
+MAX_CONCURRENT_UPLOADS = config("MAX_CONCURRENT_UPLOADS", cast=int, default=16)
+
+# board change events are sent with pg_notify and fanned out to websocket clients by one listener per process
+BOARD_EVENTS_ENABLED = config("BOARD_EVENTS_ENABLED", cast=bool, default=True)
+BOARD_EVENTS_CHANNEL = config("BOARD_EVENTS_CHANNEL", default="board_events")
+# subscriber with more unsent changed objects, or which doesn't accept message in time, is disconnected
+BOARD_EVENTS_MAX_PENDING = config("BOARD_EVENTS_MAX_PENDING", cast=int, default=1000)
+BOARD_EVENTS_SEND_TIMEOUT = config("BOARD_EVENTS_SEND_TIMEOUT", cast=float, default=5.0)
+BOARD_EVENTS_COALESCE_DELAY = config("BOARD_EVENTS_COALESCE_DELAY", cast=float, default=0.05)
+# seconds between attempts to restore lost listen connection
+BOARD_EVENTS_RECONNECT_INTERVAL = config("BOARD_EVENTS_RECONNECT_INTERVAL", cast=float, default=1.0)
+# server-sent events stream: history records read per query, and interval of keepalive comments
+BOARD_EVENTS_REPLAY_BATCH = config("BOARD_EVENTS_REPLAY_BATCH", cast=int, default=500)
+BOARD_EVENTS_KEEPALIVE = config("BOARD_EVENTS_KEEPALIVE", cast=float, default=15.0)
+
+# history stores only changed title and description of card, and full copy every N revisions
+HISTORY_SNAPSHOT_INTERVAL = config("HISTORY_SNAPSHOT_INTERVAL", cast=int, default=10)
+
+# "strict" writes history in transaction of the change, "buffered" writes it in background in batches
+HISTORY_SINK_MODE = config("HISTORY_SINK_MODE", default="strict")
+HISTORY_SINK_BATCH_SIZE = config("HISTORY_SINK_BATCH_SIZE", cast=int, default=500)
+HISTORY_SINK_FLUSH_INTERVAL = config("HISTORY_SINK_FLUSH_INTERVAL", cast=float, default=0.2)
+HISTORY_SINK_MAX_BUFFER = config("HISTORY_SINK_MAX_BUFFER", cast=int, default=10000)
+
+# cards_history is partitioned by month, partitions older than retention are exported to archive path and dropped
+HISTORY_PARTITIONS_AHEAD = config("HISTORY_PARTITIONS_AHEAD", cast=int, default=2)
+HISTORY_RETENTION_MONTHS = config("HISTORY_RETENTION_MONTHS", cast=int, default=12)
+HISTORY_ARCHIVE_PATH = config("HISTORY_ARCHIVE_PATH", default='/usr/src/media/history_archive/')
+
+# max number of history records compacted by one request of board changes
+BOARD_CHANGES_MAX_RECORDS = config("BOARD_CHANGES_MAX_RECORDS", cast=int, default=5000)
+
+# rows fetched from cursor and sent as one chunk of board export
+BOARD_EXPORT_BATCH_SIZE = config("BOARD_EXPORT_BATCH_SIZE", cast=int, default=1000)
+
+# rows buffered by board import before they are written with COPY
+BOARD_IMPORT_BATCH_SIZE = config("BOARD_IMPORT_BATCH_SIZE", cast=int, default=5000)
+
+# users read by one query of users export
+USERS_EXPORT_BATCH_SIZE = config("USERS_EXPORT_BATCH_SIZE", cast=int, default=1000)
+
+# max number of cards in each operation of cards batch request
+CARDS_BATCH_MAX_SIZE = config("CARDS_BATCH_MAX_SIZE", cast=int, default=500)
+
+# ranks of list cards (or board lists) are rewritten in background, when moves make any of them longer
+RANK_REBALANCE_LENGTH = config("RANK_REBALANCE_LENGTH", cast=int, default=16)
+
 # TESTING = config("TESTING", cast=bool, default=False)
 
 # DEBUG = 1  # (0, 1, 2)
@@ -1,4 +1,5 @@
 from gino.ext.starlette import Gino
+from starlette.requests import Request
 
 from app.core import config
 
@@ -12,3 +13,13 @@ db = Gino(
     retry_limit=config.DB_RETRY_LIMIT,
     retry_interval=config.DB_RETRY_INTERVAL,
 )
+
+
+async def release_request_connection(request: Request):
+    """
+    Return connection of the request to pool, it's acquired again lazily by next query.
+    Streams should not hold pool connection while they wait for events or read with their own connection.
+    """
+    connection = request.scope.get('connection')
+    if connection is not None:
+        await connection.release(permanent=False)
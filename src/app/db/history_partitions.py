@@ -0,0 +1,138 @@
+"""
+Maintenance of monthly partitions of cards_history table.
+
+Functions are synchronous, they are run by celery beat (see app.celery.worker) with psycopg2 connection.
+"""
+import datetime
+import gzip
+import os
+
+from sqlalchemy.engine import Connection
+
+
+PARENT_TABLE = 'cards_history'
+DEFAULT_PARTITION = 'cards_history_default'
+PARTITION_NAME_FORMAT = 'cards_history_y%Ym%m'
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime.date(year, month_index + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return month.strftime(PARTITION_NAME_FORMAT)
+
+
+def get_partitions(connection: Connection) -> dict:
+    """
+    Return {month: partition name} of attached monthly partitions (default partition is skipped).
+    """
+    rows = connection.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = %s',
+        (PARENT_TABLE,)
+    )
+
+    partitions = {}
+    for name, in rows:
+        try:
+            partitions[datetime.datetime.strptime(name, PARTITION_NAME_FORMAT).date()] = name
+        except ValueError:
+            continue
+
+    return partitions
+
+
+def create_partition(connection: Connection, month: datetime.date) -> str:
+    """
+    Create partition of month. Postgres refuses to create it while default partition holds records of the month
+    (written before partitions job ran), so then default partition is detached, records are moved to the new
+    partition and default partition is attached back, in one transaction.
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    in_month = 'last_change_at >= %s AND last_change_at < %s'
+
+    with connection.begin():
+        has_default_records = connection.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month})', (start, end)
+        ).scalar()
+
+        if has_default_records:
+            connection.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+
+        if has_default_records:
+            connection.execute(f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_month}', (start, end))
+            connection.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}', (start, end))
+            connection.execute(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+
+    return name
+
+
+def create_future_partitions(connection: Connection, *, today: datetime.date, months_ahead: int) -> list:
+    """
+    Create partitions of current and next months ahead, so new records never land in default partition.
+    """
+    existing = get_partitions(connection)
+    created = []
+
+    for months in range(months_ahead + 1):
+        month = add_months(month_start(today), months)
+        if month not in existing:
+            created.append(create_partition(connection, month))
+
+    return created
+
+
+def archive_partition(connection: Connection, name: str, archive_path: str) -> str:
+    """
+    Export partition to gzipped csv file, then detach and drop it.
+    Partition stays attached until the file is written, so failed run is safely repeated.
+    """
+    os.makedirs(archive_path, exist_ok=True)
+    path = os.path.join(archive_path, f'{name}.csv.gz')
+    tmp_path = f'{path}.tmp'
+
+    cursor = connection.connection.cursor()
+    try:
+        with gzip.open(tmp_path, 'wb') as file:
+            cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', file)
+    finally:
+        cursor.close()
+    os.replace(tmp_path, path)
+
+    with connection.begin():
+        connection.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+        connection.execute(f'DROP TABLE {name}')
+
+    return path
+
+
+def archive_old_partitions(
+        connection: Connection,
+        *,
+        today: datetime.date,
+        retention_months: int,
+        archive_path: str,
+) -> list:
+    """
+    Archive partitions of months which ended more than retention_months ago.
+    """
+    oldest_kept = add_months(month_start(today), -retention_months)
+
+    return [
+        archive_partition(connection, name, archive_path)
+        for month, name in sorted(get_partitions(connection).items())
+        if month < oldest_kept
+    ]
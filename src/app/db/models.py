@@ -1,6 +1,8 @@
 import datetime
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Enum, Table, inspect
+from sqlalchemy import Boolean, Column, DDL, ForeignKey, Integer, String, Text, DateTime, Enum, Index, Table, event, \
+    inspect, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -51,12 +53,41 @@ class Card(db.Model):
     created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
     last_change_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
 
+    # number of changes after creation, history keeps full copy of card every HISTORY_SNAPSHOT_INTERVAL revisions
+    revision = Column(Integer, nullable=False, default=0, server_default='0')
+
     list_id = Column(Integer, ForeignKey("lists.id"))
     list = relationship("List", backref="cards")
 
+    # position in list, see app.utils.ranking
+    rank = Column(String(collation='C'), nullable=False)
+
     last_change_by_id = Column(Integer, ForeignKey("users.id"))
     last_change_by = relationship("User", backref="cards", foreign_keys=[last_change_by_id])
 
+    # list cards in rank order
+    __table_args__ = (
+        Index('ix_cards_list_id_rank_id', 'list_id', 'rank', 'id'),
+    )
+
+
+# Full text search over title and description. Generated column isn't mapped to model, so cards are loaded
+# without it, search queries refer to cards_search_vector. Migration creates the same column and GIN index.
+CARDS_SEARCH_CONFIG = 'english'
+
+event.listen(
+    Card.__table__,
+    'after_create',
+    DDL(
+        f"ALTER TABLE cards ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('{CARDS_SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{CARDS_SEARCH_CONFIG}', coalesce(description, '')), 'B')) STORED; "
+        f"CREATE INDEX ix_cards_search_vector ON cards USING gin (search_vector)"
+    ),
+)
+
+cards_search_vector = literal_column('cards.search_vector', TSVECTOR)
+
 
 class List(db.Model):
     __tablename__ = "lists"
@@ -71,12 +102,32 @@ class List(db.Model):
     created_by_id = Column(Integer, ForeignKey("users.id"))
     created_by = relationship("User", backref="lists")
 
+    # position in board, see app.utils.ranking
+    rank = Column(String(collation='C'), nullable=False)
+
+    # board lists in rank order
+    __table_args__ = (
+        Index('ix_lists_board_id_rank_id', 'board_id', 'rank', 'id'),
+    )
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._cards = list()
+
+    @property
+    def cards(self):
+        return self._cards
+
+    def add_card(self, card):
+        self._cards.append(card)
+
 
 class BoardUsers(db.Model):
     __tablename__ = 'board_users'
 
-    board_id = Column(Integer, ForeignKey('boards.id'), nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    # composite primary key (board_id, user_id) also serves lookups by board
+    board_id = Column(Integer, ForeignKey('boards.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True)
 
 
 class Board(db.Model):
@@ -91,6 +142,15 @@ class Board(db.Model):
 
     created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
 
+    # bumped by every change of board's lists and cards, used as ETag of board resources
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+
+    # keyset pagination of public and user's boards
+    __table_args__ = (
+        Index('ix_boards_public_created_at_id', 'public', 'created_at', 'id'),
+        Index('ix_boards_owner_id_created_at_id', 'owner_id', 'created_at', 'id'),
+    )
+
     def __init__(self, **kw):
         super().__init__(**kw)
         self._users = list()
@@ -107,22 +167,62 @@ class Board(db.Model):
 
 
 class CardHistory(db.Model):
+    """
+    Partitioned by month of last_change_at (app/db/history_partitions.py creates and archives partitions),
+    so primary key has to include it
+    """
     __tablename__ = "cards_history"
 
-    id = Column(Integer, primary_key=True)
-    card_id = Column(Integer, index=True)
-    title = Column(Text, nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    card_id = Column(Integer)
+    # title and description are stored only if they are in changed_fields, null changed_fields means full copy
+    title = Column(Text)
     description = Column(Text)
+    changed_fields = Column(ARRAY(String))
+    revision = Column(Integer, nullable=False, default=0, server_default='0')
 
     action = Column(Enum(enums.CardHistoryActions), nullable=False)
 
-    list_id = Column(Integer, ForeignKey("lists.id", ondelete="NO ACTION"), index=True)
+    list_id = Column(Integer, ForeignKey("lists.id", ondelete="NO ACTION"))
     list = relationship("List", backref="cards")
 
+    # copied from list, so board's history is read without join
+    board_id = Column(Integer, ForeignKey("boards.id", ondelete="NO ACTION"), nullable=False)
+
     last_change_by_id = Column(Integer, ForeignKey("users.id", ondelete="NO ACTION"))
     last_change_by = relationship("User", backref="cards", foreign_keys=[last_change_by_id])
 
-    last_change_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    last_change_at = Column(DateTime, primary_key=True, nullable=False, default=datetime.datetime.now)
+
+    # keyset pagination of card and list history (newest records first, index is scanned backward),
+    # board's changes after given history id
+    __table_args__ = (
+        Index('ix_cards_history_card_id_last_change_at_id', 'card_id', 'last_change_at', 'id'),
+        Index('ix_cards_history_list_id_last_change_at_id', 'list_id', 'last_change_at', 'id'),
+        Index('ix_cards_history_board_id_id', 'board_id', 'id'),
+        {'postgresql_partition_by': 'RANGE (last_change_at)'},
+    )
+
+
+# records without monthly partition (created by db.create_all, before partitions job runs) go to default one
+event.listen(
+    CardHistory.__table__,
+    'after_create',
+    DDL('CREATE TABLE cards_history_default PARTITION OF cards_history DEFAULT'),
+)
+
+
+class OutboxMessage(db.Model):
+    """
+    Celery task written in the same transaction as data it's about, sent to broker by outbox dispatcher
+    """
+    __tablename__ = "outbox_messages"
+
+    id = Column(Integer, primary_key=True)
+    task_name = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
 
 
 # class ListHistory(db.Model):
@@ -0,0 +1,68 @@
+"""
+Rebalancing of card and list ranks.
+
+Moves between close neighbours make ranks longer (see app.utils.ranking). When a rank gets longer than
+RANK_REBALANCE_LENGTH, request queues rebalance_ranks task (see app.celery.worker), which rewrites ranks
+of all cards of the list (or all lists of the board) evenly spaced, keeping their order.
+"""
+import json
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import BOARD_EVENTS_CHANNEL
+from app.utils.ranking import spread_ranks
+
+
+def rewrite_ranks(connection: Connection, *, table: str, parent_column: str, parent_id: int) -> int:
+    ids = [
+        row[0] for row in connection.execute(
+            f'SELECT id FROM {table} WHERE {parent_column} = %s ORDER BY rank, id', (parent_id,)
+        )
+    ]
+
+    if ids:
+        connection.execute(
+            text(
+                f'UPDATE {table} SET rank = data.rank '
+                f'FROM (SELECT unnest(CAST(:ids AS int[])) AS id, unnest(CAST(:ranks AS text[])) AS rank) AS data '
+                f'WHERE {table}.id = data.id'
+            ),
+            ids=ids, ranks=spread_ranks(len(ids))
+        )
+
+    return len(ids)
+
+
+def rebalance_ranks(connection: Connection, *, list_id: int = None, board_id: int = None) -> int:
+    """
+    Rewrite ranks of list cards, or of board lists if list is not given. Rows are locked in the same order
+    as requests lock them: lists in id order, then cards, then board. Ranks are visible in board snapshot,
+    so board version is bumped and board events listeners are notified, like BoardsRepository.increment_version
+    does, without events list, so clients reload the board.
+    Return number of rewritten rows.
+    """
+    with connection.begin():
+        if list_id is not None:
+            board_id = connection.execute(
+                'SELECT board_id FROM lists WHERE id = %s FOR UPDATE', (list_id,)
+            ).scalar()
+        elif board_id is not None:
+            connection.execute('SELECT id FROM lists WHERE board_id = %s ORDER BY id FOR UPDATE', (board_id,))
+
+        if board_id is None:
+            return 0
+
+        if list_id is not None:
+            rewritten = rewrite_ranks(connection, table='cards', parent_column='list_id', parent_id=list_id)
+        else:
+            rewritten = rewrite_ranks(connection, table='lists', parent_column='board_id', parent_id=board_id)
+
+        version = connection.execute(
+            'UPDATE boards SET version = version + 1 WHERE id = %s RETURNING version', (board_id,)
+        ).scalar()
+        if version is not None:
+            payload = json.dumps({'board_id': board_id, 'version': version, 'events': None})
+            connection.execute('SELECT pg_notify(%s, %s)', (BOARD_EVENTS_CHANNEL, payload))
+
+        return rewritten
@@ -1,4 +1,7 @@
+import json
+
 from fastapi import Depends, Request, HTTPException
+from sqlalchemy import and_, func
 from starlette.status import (
     HTTP_404_NOT_FOUND,
 )
@@ -9,18 +12,44 @@ from app.db.database import db
 from app.dependencies.auth import get_current_active_user, get_current_active_or_unauthenticated_user
 from app.schemes import board as board_schema
 from app.services import auth_service
+from app.utils.pagination import DEFAULT_PAGE_SIZE, paginate
+from app.utils.single_flight import read_flight
+
+
+# notification payload is limited to 8000 bytes, bigger changes are sent without events list
+MAX_NOTIFY_EVENTS = 100
+
+# sort key of board pages, backed by ix_boards_public_created_at_id and ix_boards_owner_id_created_at_id
+BOARDS_PAGE_KEY = (models.Board.created_at, models.Board.id)
+
+
+def make_event(obj, action) -> dict:
+    """
+    Describe change of list or card for board events feed.
+    """
+    if isinstance(obj, models.Card):
+        return {'type': 'card', 'action': str(action), 'id': obj.id, 'list_id': obj.list_id}
+    return {'type': 'list', 'action': str(action), 'id': obj.id}
+
+
+def get_collaborators_memo(request: Request = None) -> dict:
+    """
+    Return {(board_id, user_id): is_collaborator} memo stored in request state, so repeated
+    permission checks during one request don't query database again.
+    """
+    if request is None:
+        return {}
+
+    memo = getattr(request.state, 'board_collaborators', None)
+    if memo is None:
+        memo = request.state.board_collaborators = {}
+    return memo
 
 
 class BoardsRepository:
     def __init__(self):
         self.auth_service = auth_service
 
-    async def get_board_url(self, board_id: int):
-        return f'{config.BASE_URL}{config.API_PREFIX}/boards/{board_id}'
-
-    async def get_board_collaborators_url(self, board_id: int):
-        return f'{config.BASE_URL}{config.API_PREFIX}/boards/{board_id}/users'
-
     async def get_board_collaborators(self, *, board_id: int):
         query = models.User.outerjoin(models.BoardUsers).outerjoin(models.Board).select().where(models.Board.id == board_id)
 
@@ -34,15 +63,14 @@ class BoardsRepository:
 
         return users
 
-    async def check_user_is_board_collaborator(self, *, board_id: int, user_id: int):
-        board_users_record = await models.BoardUsers.query.where(
-            models.BoardUsers.board_id == board_id and
-            models.BoardUsers.user_id == user_id
-        ).gino.first()
+    async def check_user_is_board_collaborator(self, *, board_id: int, user_id: int, request: Request = None):
+        memo = get_collaborators_memo(request)
+
+        if (board_id, user_id) not in memo:
+            board_users_record = await models.BoardUsers.get((board_id, user_id))
+            memo[(board_id, user_id)] = board_users_record is not None
 
-        if board_users_record:
-            return True
-        return False
+        return memo[(board_id, user_id)]
 
     async def add_user_to_board_collaborators(self, *, board_id: int, user_id: int):
         return await models.BoardUsers.create(board_id=board_id, user_id=user_id)
@@ -53,27 +81,55 @@ class BoardsRepository:
     async def create_new_board(self, *, board: board_schema.BoardCreate, owner: models.User):
         return await models.Board.create(**board.dict(), **{'owner_id': owner.id})
 
-    async def get_all_public_boards(self, *, offset=0, limit=25):
+    async def increment_version(self, *, board_id: int = None, list_id: int = None, events=()):
+        """
+        Bump version of the board after change of its lists or cards and notify board listeners.
+        Board can be given by one of its lists. Should be called in transaction of the change,
+        notification is delivered on commit. Return board with id and new version loaded.
+        """
+        if board_id is None:
+            board_id = db.select([models.List.board_id]).where(models.List.id == list_id).as_scalar()
+
+        board = await models.Board.update.values(version=models.Board.version + 1)\
+            .where(models.Board.id == board_id)\
+            .returning(models.Board.id, models.Board.version).gino.first()
+
+        if board is None:
+            return None
+
+        await self.notify(board_id=board.id, version=board.version, events=events)
+
+        return board
+
+    async def notify(self, *, board_id: int, version: int, events):
+        events = list(events)
+        payload = json.dumps({
+            'board_id': board_id,
+            'version': version,
+            'events': events if len(events) <= MAX_NOTIFY_EVENTS else None,
+        })
+
+        await db.scalar(db.select([func.pg_notify(config.BOARD_EVENTS_CHANNEL, payload)]))
+
+    async def get_all_public_boards(self, *, offset=0, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
         if not limit:
-            limit = 25
+            limit = DEFAULT_PAGE_SIZE
 
-        async with db.transaction():
-            cursor = await models.Board.query.where(models.Board.public == True).gino.iterate()
-            if offset:
-                await cursor.forward(offset)
-            boards = await cursor.many(limit)
-        return boards
+        query = paginate(
+            models.Board.query.where(models.Board.public == True),
+            columns=BOARDS_PAGE_KEY, cursor=cursor, offset=offset, limit=limit,
+        )
+        return await query.gino.all()
 
-    async def get_my_boards(self, *, user: models.User, offset=0, limit=25):
+    async def get_my_boards(self, *, user: models.User, offset=0, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
         if not limit:
-            limit = 25
+            limit = DEFAULT_PAGE_SIZE
 
-        async with db.transaction():
-            cursor = await models.Board.query.where(models.Board.owner_id == user.id).gino.iterate()
-            if offset:
-                await cursor.forward(offset)
-            boards = await cursor.many(limit)
-        return boards
+        query = paginate(
+            models.Board.query.where(models.Board.owner_id == user.id),
+            columns=BOARDS_PAGE_KEY, cursor=cursor, offset=offset, limit=limit,
+        )
+        return await query.gino.all()
 
     async def get_board_and_check_permissions(
             self,
@@ -82,7 +138,67 @@ class BoardsRepository:
             current_user: models.User,
             request: Request,
     ):
-        board = await self.get_board(board_id)
+        board, _, _ = await self.get_board_list_card_and_check_permissions(
+            board_id=board_id, current_user=current_user, request=request
+        )
+
+        return board
+
+    async def get_board_list_card_and_check_permissions(
+            self,
+            *,
+            board_id: int,
+            current_user: models.User,
+            request: Request,
+            list_id: int = None,
+            card_id: int = None,
+            shared: bool = False,
+    ):
+        """
+        Load board, user's collaborator record, list and card with one joined query and check that
+        user can access board and that list and card belong to it. Return (board, list, card) tuple.
+        Shared rows are loaded once for concurrent requests with the same arguments, they should not be modified.
+        """
+        memo = get_collaborators_memo(request)
+        # membership may be already known from previous check in this request
+        join_collaborator = current_user is not None and (board_id, current_user.id) not in memo
+
+        query = models.Board.__table__
+        loaders = [models.Board]
+
+        if join_collaborator:
+            query = query.outerjoin(models.BoardUsers, and_(
+                models.BoardUsers.board_id == models.Board.id,
+                models.BoardUsers.user_id == current_user.id,
+            ))
+            loaders.append(models.BoardUsers.user_id)
+        if list_id is not None:
+            query = query.outerjoin(models.List, and_(
+                models.List.id == list_id,
+                models.List.board_id == models.Board.id,
+            ))
+            loaders.append(models.List)
+        if card_id is not None:
+            query = query.outerjoin(models.Card, and_(
+                models.Card.id == card_id,
+                models.Card.list_id == models.List.id,
+            ))
+            loaders.append(models.Card)
+
+        load = query.select().where(models.Board.id == board_id).gino.load(tuple(loaders)).first
+        if shared:
+            collaborator_id = current_user.id if join_collaborator else None
+            row = await read_flight.run(('board_access', board_id, collaborator_id, list_id, card_id), load)
+        else:
+            row = await load()
+        row = list(row) if row else [None] * len(loaders)
+
+        board = row.pop(0)
+        if join_collaborator:
+            memo[(board_id, current_user.id)] = row.pop(0) is not None
+        user_is_collaborator = current_user is not None and memo[(board_id, current_user.id)]
+        lst = row.pop(0) if list_id is not None else None
+        card = row.pop(0) if card_id is not None else None
 
         # if board not found
         if not board:
@@ -90,24 +206,27 @@ class BoardsRepository:
                 status_code=HTTP_404_NOT_FOUND,
                 detail="Board not found."
             )
-        # Check if board is public and request's method is safe
-        if board.public and request.method == 'GET':
-            return board
-
-        # Check if user in board collaborator
-        user_is_collaborator = False
-        if current_user:
-            user_is_collaborator = await self.check_user_is_board_collaborator(
-                user_id=current_user.id, board_id=board.id
-            )
-        if not user_is_collaborator:
+
+        # Board is available if it is public and request's method is safe, or user is board collaborator
+        if not (board.public and request.method == 'GET') and not user_is_collaborator:
             raise HTTPException(
                 status_code=HTTP_404_NOT_FOUND,
                 detail="Board not found."
             )
 
-        # If all check pass, return board
-        return board
+        if list_id is not None and not lst:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"List ({list_id}) not found."
+            )
+
+        if card_id is not None and not card:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"Card ({card_id}) not found"
+            )
 
+        # If all check pass, return board, list and card
+        return board, lst, card
 
 board_repo = BoardsRepository()
@@ -1,6 +1,7 @@
 import datetime
 
 from fastapi import HTTPException
+from sqlalchemy import Float, Integer, and_, case, column, func, literal, tuple_, union_all
 from starlette.status import (
     HTTP_404_NOT_FOUND,
     HTTP_400_BAD_REQUEST,
@@ -9,17 +10,63 @@ from starlette.status import (
 from app.core import config
 from app.db import models, enums
 from app.db.database import db
+from app.db.history_partitions import month_start
+from app.db.repositories.boards import board_repo, make_event
+from app.db.repositories.ranks import rank_repo
 from app.schemes import card as card_schema
 from app.services import auth_service
+from app.services.history_sink import history_sink
+from app.services.read_cache import cards_namespace, read_cache
+from app.utils.pagination import DEFAULT_PAGE_SIZE, paginate
+from app.utils.ranking import rank_between, spread_ranks
+
+
+# ix_cards_list_id_rank_id
+CARDS_PAGE_KEY = (models.Card.rank, models.Card.id)
+# newest records first (ix_cards_history_card_id_last_change_at_id)
+CARD_HISTORY_PAGE_KEY = (models.CardHistory.last_change_at, models.CardHistory.id)
+# best matches first, score is computed by search query
+CARD_SEARCH_PAGE_KEY = (column('score', Float), column('id', Integer))
+# matches are wrapped in <b></b>, text is html escaped before (see html_escape)
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<b>, StopSel=</b>, MaxWords=35, MinWords=15, MaxFragments=2'
+# same replacements as html.escape, & goes first
+HTML_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'), ("'", '&#x27;'))
+# history records of update keep only changed values of these fields
+HISTORY_DIFF_FIELDS = ('title', 'description')
+# values of card before change, which history record is built against
+DIFF_BASE_FIELDS = (*HISTORY_DIFF_FIELDS, 'last_change_at')
+
+
+def html_escape(text):
+    """
+    Escape text column in query, so highlight built from it is safe html. Parser of ts_headline keeps entities
+    as whole tokens, so fragments never cut them.
+    """
+    for character, entity in HTML_ESCAPES:
+        text = func.replace(text, character, entity)
+    return text
+
+
+def get_diff_base(card: models.Card) -> dict:
+    return {field: getattr(card, field) for field in DIFF_BASE_FIELDS}
+
+
+def is_full_copy_needed(history_data: dict, diff_base: dict) -> bool:
+    """
+    Full copy is written every HISTORY_SNAPSHOT_INTERVAL revisions and by the first change of card in a month.
+    History is partitioned by month, so every partition has full copy of card before its diffs, and diffs stay
+    readable when older partitions are archived.
+    """
+    return (
+        not history_data['revision'] % config.HISTORY_SNAPSHOT_INTERVAL
+        or month_start(history_data['last_change_at']) != month_start(diff_base['last_change_at'])
+    )
 
 
 class CardsRepository:
     def __init__(self):
         self.auth_service = auth_service
 
-    async def get_card_url(self, board_id: int, list_id: int, card_id: int):
-        return f'{config.BASE_URL}{config.API_PREFIX}/boards/{board_id}/lists/{list_id}/card/{card_id}'
-
     async def get_card_by_id(self, card_id: int):
         return await models.Card.get(card_id)
 
@@ -44,13 +91,45 @@ class CardsRepository:
 
         return card
 
+    async def lock_lists(self, list_ids, *, board_id: int = None):
+        """
+        Lock lists (of the board) before ranks of their cards are read and written. Rows are locked in id order,
+        so requests, which move cards between the same lists, don't deadlock.
+        """
+        query = db.select([models.List.id]).where(models.List.id.in_(set(list_ids)))
+        if board_id is not None:
+            query = query.where(models.List.board_id == board_id)
+
+        await query.order_by(models.List.id).with_for_update().gino.all()
+
+    async def lock_cards(self, card_ids) -> dict:
+        """
+        Lock cards before they are changed and return {card id: diff base} read from locked rows. Rows loaded
+        before could be changed by concurrent writer since, and its change would look unchanged in history.
+        Cards are locked after their lists, in id order.
+        """
+        columns = [getattr(models.Card, field) for field in DIFF_BASE_FIELDS]
+        rows = await db.select([models.Card.id, *columns])\
+            .where(models.Card.id.in_(set(card_ids)))\
+            .order_by(models.Card.id)\
+            .with_for_update()\
+            .gino.all()
+
+        return {row[0]: dict(zip(DIFF_BASE_FIELDS, row[1:])) for row in rows}
+
+    async def get_last_rank(self, *, list_id: int):
+        return await rank_repo.get_last_rank(models.Card, parent_column=models.Card.list_id, parent_id=list_id)
+
     async def create_new_card(self, *, card: card_schema.CardCreate, list_id: int, user_id: int):
         now = datetime.datetime.now()
+        rank = rank_between(await self.get_last_rank(list_id=list_id), None)
+        await rank_repo.schedule_rebalance([rank], list_id=list_id)
 
         return await models.Card.create(
             **card.dict(),
             **{
                 'list_id': list_id,
+                'rank': rank,
                 'last_change_by_id': user_id,
                 'last_change_at': now,
                 'created_at': now
@@ -58,28 +137,109 @@ class CardsRepository:
         )
 
     async def create_new_card_and_write_history(self, *, card: card_schema.CardCreate, list_id: int, user_id: int):
-        new_card = await self.create_new_card(
-            card=card,
-            list_id=list_id,
-            user_id=user_id
-        )
+        async with read_cache.invalidating(), history_sink.collecting(), db.transaction():
+            await self.lock_lists([list_id])
+            new_card = await self.create_new_card(
+                card=card,
+                list_id=list_id,
+                user_id=user_id
+            )
 
-        await self.write_history(card=new_card, action=enums.CardHistoryActions.create)
+            await self.write_history(card=new_card, action=enums.CardHistoryActions.create)
 
         return new_card
 
-    async def get_list_cards(self, *, list_id: int, offset=0, limit=25):
+    async def get_list_cards(
+            self,
+            *,
+            list_id: int,
+            board_version: int,
+            offset=0,
+            limit=DEFAULT_PAGE_SIZE,
+            cursor: str = None,
+    ):
+        """
+        Page of list cards, cached by version of the board, which is ETag of the response. Page cached before
+        a change is not read under version of the change, even if invalidation after commit is late or fails.
+        """
+        if not limit:
+            limit = DEFAULT_PAGE_SIZE
+
+        query = paginate(
+            models.Card.query.where(models.Card.list_id == list_id),
+            columns=CARDS_PAGE_KEY, cursor=cursor, offset=offset, limit=limit,
+        )
+        return await read_cache.get_rows(
+            cards_namespace(list_id), f'{board_version}:{offset}:{limit}:{cursor or ""}', models.Card, query.gino.all
+        )
+
+    async def search_board_cards(
+            self,
+            *,
+            board_id: int,
+            text: str,
+            offset=0,
+            limit=DEFAULT_PAGE_SIZE,
+            cursor: str = None,
+    ):
+        """
+        Find board cards matching web search style query (words, "quoted phrases", -excluded words), best matches
+        first, title matches rank higher than description ones. Matches are found with GIN index on
+        cards.search_vector, highlighted fragments are built only for cards of the page.
+        Cards get score, title_highlight and description_highlight attributes.
+        """
         if not limit:
-            limit = 25
+            limit = DEFAULT_PAGE_SIZE
+
+        query = func.websearch_to_tsquery(models.CARDS_SEARCH_CONFIG, text)
+
+        matches = db.select([
+            models.Card.id,
+            func.ts_rank(models.cards_search_vector, query).label('score'),
+        ]).select_from(models.Card.join(models.List)).where(and_(
+            models.List.board_id == board_id,
+            models.cards_search_vector.op('@@')(query),
+        )).alias('matches')
+
+        page = paginate(
+            db.select(CARD_SEARCH_PAGE_KEY).select_from(matches),
+            columns=CARD_SEARCH_PAGE_KEY, cursor=cursor, offset=offset, limit=limit, descending=True,
+        ).alias('page')
+
+        highlight_columns = (
+            func.ts_headline(
+                models.CARDS_SEARCH_CONFIG, html_escape(models.Card.title), query, SEARCH_HEADLINE_OPTIONS
+            ).label('title_highlight'),
+            func.ts_headline(
+                models.CARDS_SEARCH_CONFIG, html_escape(models.Card.description), query, SEARCH_HEADLINE_OPTIONS
+            ).label('description_highlight'),
+        )
+
+        score = page.c.score.label('score')
+        query = db.select([*models.Card, score, *highlight_columns])\
+            .select_from(models.Card.join(page, page.c.id == models.Card.id))\
+            .order_by(page.c.score.desc(), models.Card.id.desc())
 
         async with db.transaction():
-            cursor = await models.Card.query.where(models.Card.list_id == list_id).gino.iterate()
-            if offset:
-                await cursor.forward(offset)
-            cards = await cursor.many(limit)
+            # Statement is prepared, after a few runs postgres would switch to generic plan, which doesn't know
+            # how common searched words are and scans GIN index for all cards of all boards. Custom plan reads
+            # board cards by list index for common words and uses GIN index only for rare ones.
+            await db.status('SET LOCAL plan_cache_mode = force_custom_plan')
+            rows = await query.gino.load((models.Card, score, *highlight_columns)).all()
+
+        cards = []
+        for card, score, title_highlight, description_highlight in rows:
+            card.score = score
+            card.title_highlight = title_highlight
+            card.description_highlight = description_highlight
+            cards.append(card)
+
         return cards
 
-    async def update(self, *, card: models.Card, updated_card: card_schema.CardUpdate):
+    async def update(self, *, card: models.Card, updated_card: card_schema.CardUpdate) -> dict:
+        """
+        Return diff base of card before update, read from locked row.
+        """
         updated_card = updated_card.dict()
 
         if 'list_id' in updated_card and updated_card.get('list_id'):
@@ -94,46 +254,244 @@ class CardsRepository:
                     status_code=HTTP_400_BAD_REQUEST,
                     detail=f"List ({updated_card.get('list_id')}) not exists"
                 )
+
+            if new_list.id != card.list_id:
+                # moved card goes to the end of new list
+                await self.lock_lists([card.list_id, new_list.id])
+                updated_card['rank'] = rank_between(await self.get_last_rank(list_id=new_list.id), None)
+                await rank_repo.schedule_rebalance([updated_card['rank']], list_id=new_list.id)
         else:
             del updated_card['list_id']
 
+        previous = await self.lock_cards([card.id])
+
         await card.update(
             **updated_card |
-            {'last_change_at': datetime.datetime.now()}
+            {'last_change_at': datetime.datetime.now(), 'revision': models.Card.revision + 1}
         ).apply()
 
+        return previous
+
     async def update_and_write_history(self, *, card: models.Card, updated_card: card_schema.CardUpdate):
-        await self.update(card=card, updated_card=updated_card)
+        async with read_cache.invalidating(), history_sink.collecting(), db.transaction():
+            # card can be moved from its list, new list is invalidated with history
+            await read_cache.invalidate(cards_namespace(card.list_id))
+
+            previous = await self.update(card=card, updated_card=updated_card)
+
+            updated_card = updated_card.dict()
+            if 'list_id' in updated_card and updated_card.get('list_id'):
+                action = enums.CardHistoryActions.move
+
+            await self.write_history(card=card, action=enums.CardHistoryActions.update, previous=previous)
+
+    async def move_and_write_history(
+            self,
+            *,
+            card: models.Card,
+            move: card_schema.CardMove,
+            board_id: int,
+            user_id: int,
+    ):
+        """
+        Place card right before or after other card, or at the end of the list. Only the moved card is written,
+        it can be moved to other list of the board.
+        """
+        list_id = move.list_id or card.list_id
+
+        async with read_cache.invalidating(), history_sink.collecting(), db.transaction():
+            if list_id != card.list_id:
+                new_list = await models.List.get(list_id)
+
+                if not new_list or new_list.board_id != board_id:
+                    raise HTTPException(
+                        status_code=HTTP_400_BAD_REQUEST,
+                        detail=f"List ({list_id}) not exists"
+                    )
+
+            await self.lock_lists([card.list_id, list_id])
+            await read_cache.invalidate(cards_namespace(card.list_id))
+
+            rank = await rank_repo.get_move_rank(
+                models.Card,
+                parent_column=models.Card.list_id,
+                parent_id=list_id,
+                moved_id=card.id,
+                before_id=move.before_id,
+                after_id=move.after_id,
+            )
+            await rank_repo.schedule_rebalance([rank], list_id=list_id)
 
-        updated_card = updated_card.dict()
-        if 'list_id' in updated_card and updated_card.get('list_id'):
-            action = enums.CardHistoryActions.move
+            previous = await self.lock_cards([card.id])
 
-        await self.write_history(card=card, action=enums.CardHistoryActions.update)
+            await card.update(
+                list_id=list_id,
+                rank=rank,
+                last_change_by_id=user_id,
+                last_change_at=datetime.datetime.now(),
+                revision=models.Card.revision + 1,
+            ).apply()
 
-    async def write_history(self, *, card: models.Card, action: enums.CardHistoryActions):
-        # Merge card with new fields, rewrite last_change_at field (used python3.9 syntax **{d1 | d1})
-        history_data = card_schema.CardHistory(
-            **card.to_dict() |
-            {
-                'card_id': card.to_dict().get('id'),
-                'action': action
-            }
-        )
+            await self.write_history(card=card, action=enums.CardHistoryActions.move, previous=previous)
 
-        await models.CardHistory.create(**history_data.dict())
+        return card
 
-    async def get_history(self, *, card_id: int, offset=0, limit=25):
+    async def write_history(self, *, card: models.Card, action: enums.CardHistoryActions, previous: dict = None):
+        await self.write_history_many(changes=[(card, action)], previous=previous)
+
+    async def write_history_many(self, *, changes, previous: dict = None):
+        """
+        Write history records for list of (card, action) pairs with single multi-row insert,
+        bump board version, send change events and invalidate cached cards. All cards should belong to one board.
+
+        previous is {card id: diff base (values of DIFF_BASE_FIELDS before change)}, it should be read from
+        locked rows. For these cards only changed fields are stored, unless full copy is needed
+        (see is_full_copy_needed).
+        """
+        if not changes:
+            return
+
+        # Board row is locked by version bump before history ids are taken from sequence, so writers of one
+        # board are serialized and history ids of the board become visible in increasing order.
+        # Event streams rely on it when they resume from last seen history id.
+        # Cards are moved only within board, so any card's list points to the board.
+        board = await board_repo.increment_version(
+            list_id=changes[0][0].list_id,
+            events=[make_event(card, action) for card, action in changes],
+        )
+        # cached pages of lists, which cards are in now (lists they left are invalidated by callers)
+        await read_cache.invalidate(*{cards_namespace(card.list_id) for card, _ in changes})
+
+        previous = previous or {}
+        records = []
+
+        for card, action in changes:
+            # Merge card with new fields, rewrite last_change_at field (used python3.9 syntax **{d1 | d1})
+            history_data = card_schema.CardHistory(
+                **card.to_dict() |
+                {
+                    'card_id': card.id,
+                    'action': action
+                }
+            ).dict() | {'board_id': board.id, 'revision': card.revision, 'changed_fields': None}
+
+            if card.id in previous and not is_full_copy_needed(history_data, previous[card.id]):
+                changed_fields = [
+                    field for field in HISTORY_DIFF_FIELDS if previous[card.id][field] != history_data[field]
+                ]
+                for field in HISTORY_DIFF_FIELDS:
+                    if field not in changed_fields:
+                        history_data[field] = None
+                history_data['changed_fields'] = changed_fields
+
+            records.append(history_data)
+
+        await history_sink.write(records)
+
+    async def get_history(self, *, card_id: int, offset=0, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
         if not limit:
-            limit = 25
-
-        async with db.transaction():
-            cursor = await models.CardHistory.query.where(models.CardHistory.card_id == card_id).order_by(models.CardHistory.last_change_at.desc()).gino.iterate()
-            if offset:
-                await cursor.forward(offset)
-            history_records = await cursor.many(limit)
+            limit = DEFAULT_PAGE_SIZE
 
-        return history_records
+        query = paginate(
+            models.CardHistory.query.where(models.CardHistory.card_id == card_id),
+            columns=CARD_HISTORY_PAGE_KEY, cursor=cursor, offset=offset, limit=limit, descending=True,
+        )
+        return await self.rebuild_history(await query.gino.all())
+
+    async def rebuild_history(self, records):
+        """
+        Fill in title and description of records, which keep only changed fields, from preceding records
+        of the same card. Every card needs at most HISTORY_SNAPSHOT_INTERVAL preceding records, they are read
+        for all cards with one query. Every monthly partition starts with full copy of card, values stay None only
+        for records written before that, if their full copy was archived already.
+        """
+        chains = {}
+        for record in sorted(records, key=lambda record: (record.last_change_at, record.id)):
+            chains.setdefault(record.card_id, []).append(record)
+
+        incomplete = [chain for chain in chains.values() if chain[0].changed_fields is not None]
+
+        while incomplete:
+            queries = [
+                models.CardHistory.query.where(and_(
+                    models.CardHistory.card_id == chain[0].card_id,
+                    tuple_(*CARD_HISTORY_PAGE_KEY) < (chain[0].last_change_at, chain[0].id),
+                )).order_by(*[column.desc() for column in CARD_HISTORY_PAGE_KEY])
+                .limit(chain[0].revision % config.HISTORY_SNAPSHOT_INTERVAL or config.HISTORY_SNAPSHOT_INTERVAL)
+                for chain in incomplete
+            ]
+            rows = await db.all(union_all(*queries) if len(queries) > 1 else queries[0])
+
+            found = {}
+            for row in rows:
+                found.setdefault(row.card_id, []).append(row)
+
+            for chain in incomplete:
+                # preceding rows are read newest first
+                chain[0:0] = reversed(found.get(chain[0].card_id, []))
+
+            # snapshot interval could be changed since records were written, read further
+            incomplete = [
+                chain for chain in incomplete
+                if chain[0].changed_fields is not None and chain[0].card_id in found
+            ]
+
+        for chain in chains.values():
+            state = dict.fromkeys(HISTORY_DIFF_FIELDS)
+
+            for record in chain:
+                changed_fields = HISTORY_DIFF_FIELDS if record.changed_fields is None else record.changed_fields
+                state.update({field: getattr(record, field) for field in changed_fields})
+
+                if isinstance(record, models.CardHistory):
+                    for field, value in state.items():
+                        setattr(record, field, value)
+
+        return records
+
+    async def get_board_history(self, *, board_id: int, after_id: int, limit=DEFAULT_PAGE_SIZE):
+        """
+        History records of all board cards with id greater than after_id, oldest first.
+        Range scan of ix_cards_history_board_id_id, so catching up on recent changes is cheap.
+        """
+        query = models.CardHistory.query.where(and_(
+            models.CardHistory.board_id == board_id,
+            models.CardHistory.id > after_id,
+        )).order_by(models.CardHistory.id).limit(limit)
+
+        return await self.rebuild_history(await query.gino.all())
+
+    async def get_board_changes(self, *, board_id: int, since: int, limit: int):
+        """
+        Compact board history after since into net change of every card: card created and then updated
+        is returned as created with last state, created and deleted card is omitted, moves are updates.
+        Return (changes, id of last read history record, whether there are more records to read).
+        """
+        records = await self.get_board_history(board_id=board_id, after_id=since, limit=limit)
+
+        changes = {}
+        for record in records:
+            # card is moved to the end, changes are ordered by last change of card
+            previous = changes.pop(record.card_id, None)
+            created = previous is not None and previous[1] == enums.CardHistoryActions.create
+
+            if record.action == enums.CardHistoryActions.delete:
+                if created:
+                    continue
+                action = enums.CardHistoryActions.delete
+            elif created or record.action == enums.CardHistoryActions.create:
+                action = enums.CardHistoryActions.create
+            else:
+                action = enums.CardHistoryActions.update
+
+            changes[record.card_id] = (record, action)
+
+        last_history_id = records[-1].id if records else since
+
+        return list(changes.values()), last_history_id, len(records) == limit
+
+    async def get_last_history_id(self):
+        return await db.select([db.func.max(models.CardHistory.id)]).gino.scalar() or 0
 
     async def delete_by_id(self, *, card_id):
         return await models.Card.delete.returning().where(models.Card.id == card_id).gino.first()
@@ -144,13 +502,167 @@ class CardsRepository:
         return card
 
     async def delete_and_write_history(self, *, card: models.Card):
-        await card.delete()
+        async with read_cache.invalidating(), history_sink.collecting(), db.transaction():
+            # returned row is current, card could be changed since it was loaded
+            deleted = await models.Card.delete.where(models.Card.id == card.id)\
+                .returning(*models.Card).gino.load(models.Card).all()
+            self.check_all_cards_found([card.id], deleted)
+            card = deleted[0]
 
-        await self.write_history(card=card, action=enums.CardHistoryActions.delete)
+            previous = {card.id: get_diff_base(card)}
+            card.revision += 1
+            await self.write_history(card=card, action=enums.CardHistoryActions.delete, previous=previous)
 
         card.last_change_at = datetime.datetime.now()
 
         return card
 
+    async def apply_batch_and_write_history(
+            self,
+            *,
+            batch: card_schema.CardBatch,
+            lst: models.List,
+            user_id: int,
+    ):
+        """
+        Create, update and delete cards of the list with one statement per operation,
+        write history of all changes with one insert. Everything is applied in one transaction.
+        """
+        async with read_cache.invalidating(), history_sink.collecting(), db.transaction():
+            now = datetime.datetime.now()
+
+            # new ranks are appended to the list and to lists, which cards are moved to
+            await self.lock_lists(
+                [lst.id, *[card.list_id for card in batch.update if card.list_id]], board_id=lst.board_id
+            )
+            await read_cache.invalidate(cards_namespace(lst.id))
+
+            created = await self.create_many(cards=batch.create, list_id=lst.id, user_id=user_id, now=now)
+            updated, previous = await self.update_many(cards=batch.update, lst=lst, user_id=user_id, now=now)
+            deleted = await self.delete_many(card_ids=batch.delete, list_id=lst.id)
+
+            for card in deleted:
+                previous[card.id] = get_diff_base(card)
+                card.last_change_by_id = user_id
+                card.last_change_at = now
+                card.revision += 1
+
+            await self.write_history_many(changes=[
+                *[(card, enums.CardHistoryActions.create) for card in created],
+                *[
+                    (card, enums.CardHistoryActions.move if card.list_id != lst.id else enums.CardHistoryActions.update)
+                    for card in updated
+                ],
+                *[(card, enums.CardHistoryActions.delete) for card in deleted],
+            ], previous=previous)
+
+        return created, updated, deleted
+
+    async def create_many(self, *, cards, list_id: int, user_id: int, now: datetime.datetime):
+        if not cards:
+            return []
+
+        ranks = spread_ranks(len(cards), after=await self.get_last_rank(list_id=list_id))
+        await rank_repo.schedule_rebalance(ranks, list_id=list_id)
+
+        values = [
+            card.dict() |
+            {
+                'list_id': list_id,
+                'rank': rank,
+                'last_change_by_id': user_id,
+                'last_change_at': now,
+                'created_at': now
+            }
+            for card, rank in zip(cards, ranks)
+        ]
+
+        return await models.Card.insert().values(values).returning(*models.Card)\
+            .gino.load(models.Card).all()
+
+    async def update_many(self, *, cards, lst: models.List, user_id: int, now: datetime.datetime):
+        """
+        Update cards of the list in one UPDATE statement, each column is set with CASE over card id.
+        Only fields present in request are changed; title and list can't be set to null.
+        Return updated cards and {card id: diff base before update}.
+        """
+        if not cards:
+            return [], {}
+
+        new_list_ids = {card.list_id for card in cards if card.list_id and card.list_id != lst.id}
+        if new_list_ids:
+            board_list_ids = await db.select([models.List.id]).where(and_(
+                models.List.board_id == lst.board_id,
+                models.List.id.in_(new_list_ids),
+            )).gino.all()
+
+            not_found_ids = new_list_ids - {row[0] for row in board_list_ids}
+            if not_found_ids:
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST,
+                    detail=f"List ({min(not_found_ids)}) not exists"
+                )
+
+        values = {'last_change_by_id': user_id, 'last_change_at': now, 'revision': models.Card.revision + 1}
+
+        for field, nullable in (('title', False), ('description', True), ('list_id', False)):
+            column = getattr(models.Card, field)
+            whens = [
+                (models.Card.id == card.id, literal(getattr(card, field), column.type))
+                for card in cards
+                if field in card.__fields_set__ and (nullable or getattr(card, field) is not None)
+            ]
+            if whens:
+                values[field] = case(whens, else_=column)
+
+        # cards moved to other list are appended to it
+        new_ranks = {}
+        for list_id in new_list_ids:
+            moved_ids = [card.id for card in cards if card.list_id == list_id]
+            ranks = spread_ranks(len(moved_ids), after=await self.get_last_rank(list_id=list_id))
+            await rank_repo.schedule_rebalance(ranks, list_id=list_id)
+            new_ranks.update(zip(moved_ids, ranks))
+
+        if new_ranks:
+            values['rank'] = case(
+                [(models.Card.id == card_id, literal(rank, models.Card.rank.type)) for card_id, rank in new_ranks.items()],
+                else_=models.Card.rank
+            )
+
+        card_ids = [card.id for card in cards]
+        previous = await self.lock_cards(card_ids)
+
+        updated = await models.Card.update.values(**values).where(and_(
+            models.Card.id.in_(card_ids),
+            models.Card.list_id == lst.id,
+        )).returning(*models.Card).gino.load(models.Card).all()
+
+        self.check_all_cards_found(card_ids, updated)
+
+        return updated, {card.id: previous[card.id] for card in updated}
+
+    async def delete_many(self, *, card_ids, list_id: int):
+        if not card_ids:
+            return []
+
+        deleted = await models.Card.delete.where(and_(
+            models.Card.id.in_(card_ids),
+            models.Card.list_id == list_id,
+        )).returning(*models.Card).gino.load(models.Card).all()
+
+        self.check_all_cards_found(card_ids, deleted)
+
+        return deleted
+
+    @staticmethod
+    def check_all_cards_found(card_ids, cards):
+        not_found_ids = set(card_ids) - {card.id for card in cards}
+
+        if not_found_ids:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"Card ({min(not_found_ids)}) not found"
+            )
+
 
 card_repo = CardsRepository()
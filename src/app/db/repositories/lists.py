@@ -1,22 +1,31 @@
 from fastapi import HTTPException
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from starlette.status import (
     HTTP_404_NOT_FOUND,
 )
 
 
-from app.core import config
 from app.db import models
 from app.db.database import db
+from app.db import enums
+from app.db.repositories.boards import board_repo, make_event
+from app.db.repositories.cards import card_repo
+from app.db.repositories.ranks import rank_repo
 from app.schemes import list as list_schema
+from app.services.read_cache import read_cache
+from app.utils.pagination import DEFAULT_PAGE_SIZE, paginate
+from app.utils.single_flight import read_flight
+from app.utils.ranking import rank_between
 
 
-class ListsRepository:
-    async def get_list_url(self, board_id: int, list_id: int):
-        return f'{config.BASE_URL}{config.API_PREFIX}/boards/{board_id}/lists/{list_id}'
+# ix_lists_board_id_rank_id
+LISTS_PAGE_KEY = (models.List.rank, models.List.id)
+# newest records first (ix_cards_history_list_id_last_change_at_id)
+LIST_HISTORY_PAGE_KEY = (models.CardHistory.last_change_at, models.CardHistory.id)
 
-    async def get_cards_url(self, board_id: int, list_id: int):
-        return f'{config.BASE_URL}{config.API_PREFIX}/boards/{board_id}/lists/{list_id}/cards'
 
+class ListsRepository:
     async def get_list_by_id(self, list_id: int):
         return await models.List.get(list_id)
 
@@ -41,35 +50,105 @@ class ListsRepository:
 
         return lst
 
+    async def lock_list(self, *, list_id: int):
+        await db.select([models.List.id]).where(models.List.id == list_id).with_for_update().gino.scalar()
+
+    async def lock_board(self, *, board_id: int):
+        """
+        Lock board before ranks of its lists are read and written. Writers lock lists (in id order) and cards
+        before the board, so a written list must be locked before this.
+        """
+        await db.select([models.Board.id]).where(models.Board.id == board_id).with_for_update().gino.scalar()
+
     async def create_new_list(self, *, list_obj: list_schema.ListCreate, created_by: models.User):
-        return await models.List.create(**list_obj.dict(), **{'created_by_id': created_by.id})
+        async with read_cache.invalidating(), db.transaction():
+            await self.lock_board(board_id=list_obj.board_id)
 
-    async def get_multiple_lists(self, *, board_id: int, offset=0, limit=25):
+            last_rank = await rank_repo.get_last_rank(
+                models.List, parent_column=models.List.board_id, parent_id=list_obj.board_id
+            )
+            rank = rank_between(last_rank, None)
+            await rank_repo.schedule_rebalance([rank], board_id=list_obj.board_id)
+
+            new_list = await models.List.create(
+                **list_obj.dict(), **{'created_by_id': created_by.id, 'rank': rank}
+            )
+            await board_repo.increment_version(
+                board_id=new_list.board_id, events=[make_event(new_list, enums.CardHistoryActions.create)]
+            )
+
+        return new_list
+
+    async def get_multiple_lists(self, *, board_id: int, offset=0, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
         if not limit:
-            limit = 25
+            limit = DEFAULT_PAGE_SIZE
+
+        query = paginate(
+            models.List.query.where(models.List.board_id == board_id),
+            columns=LISTS_PAGE_KEY, cursor=cursor, offset=offset, limit=limit,
+        )
+        return await read_flight.run(('lists', board_id, offset, limit, cursor), query.gino.all)
+
+    async def get_board_lists_with_cards(self, *, board_id: int):
+        """
+        Load all lists of the board, then cards of all of them with second query, and group cards by list.
+        List row is not repeated for every card, as in outer join of lists and cards. Both queries read one snapshot.
+        """
+        async with db.transaction(isolation='repeatable_read', readonly=True):
+            lists = await models.List.query.where(models.List.board_id == board_id)\
+                .order_by(*LISTS_PAGE_KEY).gino.all()
+            if not lists:
+                return lists
+
+            list_ids = [lst.id for lst in lists]
+            cards = await models.Card.query\
+                .where(models.Card.list_id == any_(bindparam('list_ids', list_ids, type_=ARRAY(Integer))))\
+                .order_by(models.Card.list_id, models.Card.rank, models.Card.id).gino.all()
+
+        lists_by_id = {lst.id: lst for lst in lists}
+        for card in cards:
+            lists_by_id[card.list_id].add_card(card)
 
-        async with db.transaction():
-            cursor = await models.List.query.where(models.List.board_id == board_id).gino.iterate()
-            if offset:
-                await cursor.forward(offset)
-            lists = await cursor.many(limit)
         return lists
 
     async def update(self, *, lst: models.List, updated_list: list_schema.ListUpdate):
-        await lst.update(**updated_list.dict()).apply()
+        async with read_cache.invalidating(), db.transaction():
+            await lst.update(**updated_list.dict()).apply()
+            await board_repo.increment_version(
+                board_id=lst.board_id, events=[make_event(lst, enums.CardHistoryActions.update)]
+            )
 
-    async def get_cards_history(self, list_id: int, offset=0, limit=25):
-        if not limit:
-            limit = 25
+    async def move(self, *, lst: models.List, move: list_schema.ListMove):
+        """
+        Place list right before or after other list of the board, or at the end. Only the moved list is written.
+        """
+        async with read_cache.invalidating(), db.transaction():
+            await self.lock_list(list_id=lst.id)
+            await self.lock_board(board_id=lst.board_id)
+
+            rank = await rank_repo.get_move_rank(
+                models.List,
+                parent_column=models.List.board_id,
+                parent_id=lst.board_id,
+                moved_id=lst.id,
+                before_id=move.before_id,
+                after_id=move.after_id,
+            )
+            await rank_repo.schedule_rebalance([rank], board_id=lst.board_id)
 
-        async with db.transaction():
-            cursor = await models.CardHistory.query.where(models.CardHistory.list_id == list_id)\
-                .order_by(models.CardHistory.last_change_at.desc()).gino.iterate()
-            if offset:
-                await cursor.forward(offset)
-            records = await cursor.many(limit)
+            await lst.update(rank=rank).apply()
+            await board_repo.increment_version(
+                board_id=lst.board_id, events=[make_event(lst, enums.CardHistoryActions.move)]
+            )
 
-        return records
+    async def get_cards_history(self, list_id: int, offset=0, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
+        if not limit:
+            limit = DEFAULT_PAGE_SIZE
 
+        query = paginate(
+            models.CardHistory.query.where(models.CardHistory.list_id == list_id),
+            columns=LIST_HISTORY_PAGE_KEY, cursor=cursor, offset=offset, limit=limit, descending=True,
+        )
+        return await card_repo.rebuild_history(await query.gino.all())
 
 list_repo = ListsRepository()
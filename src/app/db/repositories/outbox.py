@@ -0,0 +1,21 @@
+from app.db import models
+from app.db.database import db
+
+
+class OutboxRepository:
+    async def add_message(self, *, task_name: str, payload: dict):
+        return await models.OutboxMessage.create(task_name=task_name, payload=payload)
+
+    async def pop_messages(self, *, limit: int):
+        """
+        Delete and return oldest messages. Rows locked by other dispatchers are skipped,
+        call inside transaction, so messages are restored if sending fails.
+        """
+        pending = db.select([models.OutboxMessage.id])\
+            .order_by(models.OutboxMessage.id).limit(limit).with_for_update(skip_locked=True)
+
+        return await models.OutboxMessage.delete.where(models.OutboxMessage.id.in_(pending))\
+            .returning(*models.OutboxMessage).gino.load(models.OutboxMessage).all()
+
+
+outbox_repo = OutboxRepository()
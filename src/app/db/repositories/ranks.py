@@ -0,0 +1,68 @@
+from fastapi import HTTPException
+from sqlalchemy import and_, tuple_
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+)
+
+from app.core import config
+from app.db.database import db
+from app.db.repositories.outbox import outbox_repo
+from app.utils.ranking import rank_between
+
+
+class RanksRepository:
+    """
+    Ranks of cards in list and lists in board. Callers lock parent row (list of cards, board of lists)
+    before reading ranks, so concurrent writers and rebalancing task never compute the same rank.
+    """
+
+    async def get_last_rank(self, model, *, parent_column, parent_id: int, exclude_id: int = None):
+        # backward scan of (parent, rank, id) index
+        query = db.select([db.func.max(model.rank)]).where(parent_column == parent_id)
+        if exclude_id is not None:
+            query = query.where(model.id != exclude_id)
+        return await query.gino.scalar()
+
+    async def get_move_rank(self, model, *, parent_column, parent_id: int, moved_id: int, before_id=None, after_id=None):
+        """
+        Return rank, which places moved row right before before_id row or right after after_id row
+        of the parent, or at the end if neither is given. Reads at most two rows.
+        """
+        neighbour_id = before_id if before_id is not None else after_id
+
+        if neighbour_id is None:
+            last_rank = await self.get_last_rank(
+                model, parent_column=parent_column, parent_id=parent_id, exclude_id=moved_id
+            )
+            return rank_between(last_rank, None)
+
+        neighbour = await model.get(neighbour_id)
+        if not neighbour or neighbour.id == moved_id or getattr(neighbour, parent_column.name) != parent_id:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"{model.__name__} ({neighbour_id}) can't be used as position"
+            )
+
+        key = tuple_(model.rank, model.id)
+        neighbour_key = (neighbour.rank, neighbour.id)
+        query = db.select([model.rank]).where(and_(parent_column == parent_id, model.id != moved_id)).limit(1)
+
+        if before_id is not None:
+            previous_rank = await query.where(key < neighbour_key)\
+                .order_by(model.rank.desc(), model.id.desc()).gino.scalar()
+            return rank_between(previous_rank, neighbour.rank)
+
+        next_rank = await query.where(key > neighbour_key).order_by(model.rank, model.id).gino.scalar()
+        return rank_between(neighbour.rank, next_rank)
+
+    async def schedule_rebalance(self, ranks, *, list_id: int = None, board_id: int = None):
+        """
+        Queue rewrite of cards ranks of the list (or lists ranks of the board), if any of new ranks is too long.
+        """
+        if any(len(rank) > config.RANK_REBALANCE_LENGTH for rank in ranks):
+            await outbox_repo.add_message(
+                task_name='rebalance_ranks', payload={'list_id': list_id} if list_id else {'board_id': board_id}
+            )
+
+
+rank_repo = RanksRepository()
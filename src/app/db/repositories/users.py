@@ -2,26 +2,114 @@ from typing import Optional
 
 from fastapi import HTTPException, status, Body
 from pydantic import EmailStr
+from sqlalchemy import and_, or_
 
 from app.core import config
 from app.db import models
+from app.db.database import db
+from app.db.repositories.outbox import outbox_repo
 from app.schemes import user as user_schema
 from app.services import auth_service
+from app.services.read_cache import read_cache, user_namespace
+from app.utils.cache import TTLCache
+from app.utils.pagination import DEFAULT_PAGE_SIZE, paginate
+
+
+# username -> (generation of user namespace in read cache, user), used to authenticate requests without querying
+# database every time. Entry of previous generation was invalidated by other process (see USER_CACHE_TTL)
+user_cache = TTLCache(maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+# number of user cache invalidations, rows read while one happened are not cached (see get_cached_user_by_username)
+user_cache_invalidations = 0
+
+# primary key order, used to page through all users
+USERS_PAGE_KEY = (models.User.id,)
+# search results are sorted by username (unique)
+USERS_SEARCH_PAGE_KEY = (models.User.username, models.User.id)
+
+
+LIKE_ESCAPE = '!'
+
+
+def escape_like(value: str) -> str:
+    """
+    Match value literally in LIKE pattern.
+    """
+    for char in (LIKE_ESCAPE, '%', '_'):
+        value = value.replace(char, LIKE_ESCAPE + char)
+    return value
 
 
 class UsersRepository:
     def __init__(self):
         self.auth_service = auth_service
 
-    async def get_all_users(self):
-        return await models.User.query.gino.all()
-
-    async def get_user_profile_url(self, username: str):
-        return f'{config.BASE_URL}{config.API_PREFIX}/users/user/{username}'
+    async def get_all_users(self, *, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
+        query = paginate(models.User.query, columns=USERS_PAGE_KEY, cursor=cursor, limit=limit)
+        return await query.gino.all()
+
+    async def iterate_all_users(self, *, batch_size: int):
+        """
+        Yield all users in id order, batch by batch. Every batch is read with separate keyset query,
+        so export doesn't hold connection or whole table in memory.
+        """
+        last_id = 0
+
+        while True:
+            batch = await models.User.query.where(models.User.id > last_id)\
+                .order_by(models.User.id).limit(batch_size).gino.all()
+
+            for user in batch:
+                yield user
+
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1].id
+
+    async def search_users(self, *, text: str, limit=DEFAULT_PAGE_SIZE, cursor: str = None):
+        """
+        Active users, whose username contains text or email starts with it, case insensitive.
+        Both patterns are served by trigram GIN indexes (ix_users_username_trgm, ix_users_email_trgm),
+        if text is at least 3 characters long.
+        """
+        pattern = escape_like(text)
+
+        query = models.User.query.where(and_(
+            models.User.is_active.is_(True),
+            or_(
+                models.User.username.ilike(f'%{pattern}%', escape=LIKE_ESCAPE),
+                models.User.email.ilike(f'{pattern}%', escape=LIKE_ESCAPE),
+            ),
+        ))
+
+        return await paginate(query, columns=USERS_SEARCH_PAGE_KEY, cursor=cursor, limit=limit).gino.all()
 
     async def get_user_by_username(self, username: str):
         return await models.User.query.where(models.User.username == username).gino.first()
 
+    async def get_cached_user_by_username(self, username: str):
+        generation = await read_cache.get_generation(user_namespace(username))
+        entry = user_cache.get(username)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        invalidations = user_cache_invalidations
+        user = await self.get_user_by_username(username)
+        # row read before concurrent update could be cached after its invalidation
+        if user and invalidations == user_cache_invalidations:
+            user_cache.set(username, (generation, user))
+
+        return user
+
+    async def invalidate_cached_user(self, username: str):
+        """
+        Should be called after user row is written, so concurrent requests can't cache previous row again.
+        Other processes drop their entries, when generation of user namespace changes.
+        """
+        global user_cache_invalidations
+        user_cache_invalidations += 1
+        user_cache.pop(username)
+        await read_cache.invalidate(user_namespace(username))
+
     async def get_user_by_email(self, email: EmailStr):
         return await models.User.query.where(models.User.email == email).gino.first()
 
@@ -38,16 +126,23 @@ class UsersRepository:
                 detail="That username is already taken. Please try another one."
             )
 
-        user_password_update = self.auth_service.create_salt_and_hashed_password(plaintext_password=new_user.password)
+        user_password_update = await self.auth_service.create_salt_and_hashed_password_async(
+            plaintext_password=new_user.password
+        )
         new_user_params = new_user.copy(update=user_password_update.dict())
 
-        return await models.User.create(**new_user_params.dict())
+        # sign up email is sent by outbox dispatcher after transaction commits
+        async with db.transaction():
+            user = await models.User.create(**new_user_params.dict())
+            await outbox_repo.add_message(task_name='send_email', payload={'email': user.email})
+
+        return user
 
     async def authenticate_user(self, *, username: str, password: str) -> Optional[user_schema.User]:
         user = await self.get_user_by_username(username=username)
         if not user:
             return None
-        if not self.auth_service.verify_password(password=password, salt=user.salt, hashed_pw=user.password):
+        if not await self.auth_service.verify_password_async(password=password, salt=user.salt, hashed_pw=user.password):
             return None
         return user
 
@@ -70,20 +165,29 @@ class UsersRepository:
 
         # filter None value in optional fields
         patched_fields = {k: v for k, v in profile_update.dict().items() if v is not None}
-        if patched_fields:
-            await current_user.update(**patched_fields).apply()
+        if not patched_fields:
+            return current_user
+
+        # current user can be shared by concurrent requests through user cache, so it's not changed
+        user = await models.User.get(current_user.id)
+        await user.update(**patched_fields).apply()
+        await self.invalidate_cached_user(current_user.username)
 
-        return current_user
+        return user
 
     async def update_password(self, *,
         current_user: user_schema.User,
         password_update: user_schema.InputPasswordUpdate,
     ) -> Optional[models.User]:
 
-        updated_password_and_salt = self.auth_service.create_salt_and_hashed_password(plaintext_password=password_update.password)
-        await current_user.update(**dict(updated_password_and_salt)).apply()
+        updated_password_and_salt = await self.auth_service.create_salt_and_hashed_password_async(
+            plaintext_password=password_update.password
+        )
+        user = await models.User.get(current_user.id)
+        await user.update(**dict(updated_password_and_salt)).apply()
+        await self.invalidate_cached_user(current_user.username)
 
-        return current_user
+        return user
 
 
 user_repo = UsersRepository()
@@ -1,13 +1,14 @@
 from typing import Optional, Union
 
 
-from fastapi import Depends, Request
+from fastapi import Depends, Request, WebSocket
 from fastapi.exceptions import HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.security.utils import get_authorization_scheme_param
 
 from starlette.status import (
     HTTP_401_UNAUTHORIZED,
+    HTTP_403_FORBIDDEN,
 )
 
 from app.core.config import SECRET_KEY, API_PREFIX
@@ -26,7 +27,7 @@ async def get_user_from_token(
 ) -> Optional[User]:
     try:
         username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
-        user = await UsersRepository().get_user_by_username(username=username)
+        user = await UsersRepository().get_cached_user_by_username(username=username)
     except Exception as e:
         raise e
     return user
@@ -48,6 +49,15 @@ def get_current_active_user(current_user: User = Depends(get_user_from_token)) -
     return current_user
 
 
+def get_current_superuser(current_user: User = Depends(get_current_active_user)) -> User:
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=HTTP_403_FORBIDDEN,
+            detail="Not enough permissions.",
+        )
+    return current_user
+
+
 async def get_current_active_or_unauthenticated_user(request: Request) -> Union[None, User]:
     """
     Return user object if request user if authenticated, else return none.
@@ -60,6 +70,24 @@ async def get_current_active_or_unauthenticated_user(request: Request) -> Union[
 
     username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
 
-    user = await UsersRepository().get_user_by_username(username=username)
+    user = await UsersRepository().get_cached_user_by_username(username=username)
 
     return user
+
+
+async def get_websocket_user(websocket: WebSocket, token: Optional[str] = None) -> Optional[User]:
+    """
+    Browsers can't set headers of websocket handshake, so token is passed in query string.
+    Return None for anonymous or invalid token, websocket route decides whether to close connection.
+    """
+    if not token:
+        return None
+
+    try:
+        username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
+    except HTTPException:
+        return None
+
+    user = await UsersRepository().get_cached_user_by_username(username=username)
+
+    return user if user and user.is_active else None
@@ -0,0 +1,105 @@
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, Request, Response
+
+from app.db import models
+from app.db.repositories.boards import board_repo
+from app.dependencies.auth import get_current_active_user, get_current_active_or_unauthenticated_user
+from app.utils.etag import NotModified, etag_matches, make_board_etag
+
+
+class BoardContext(NamedTuple):
+    """
+    Board (and list, card) requested in route path, with permissions already checked
+    """
+    board: models.Board
+    list: Optional[models.List] = None
+    card: Optional[models.Card] = None
+
+
+def board_resolver(user_dependency=get_current_active_or_unauthenticated_user, shared=False):
+    async def resolve_board(
+            *,
+            board_id: int,
+            current_user: models.User = Depends(user_dependency),
+            request: Request,
+    ) -> BoardContext:
+        board, _, _ = await board_repo.get_board_list_card_and_check_permissions(
+            board_id=board_id, current_user=current_user, request=request,
+            shared=shared,
+        )
+        return BoardContext(board=board)
+
+    return resolve_board
+
+
+def list_resolver(user_dependency=get_current_active_or_unauthenticated_user, shared=False):
+    async def resolve_list(
+            *,
+            board_id: int,
+            list_id: int,
+            current_user: models.User = Depends(user_dependency),
+            request: Request,
+    ) -> BoardContext:
+        board, lst, _ = await board_repo.get_board_list_card_and_check_permissions(
+            board_id=board_id, list_id=list_id, current_user=current_user, request=request,
+            shared=shared,
+        )
+        return BoardContext(board=board, list=lst)
+
+    return resolve_list
+
+
+def card_resolver(user_dependency=get_current_active_or_unauthenticated_user, shared=False):
+    async def resolve_card(
+            *,
+            board_id: int,
+            list_id: int,
+            card_id: int,
+            current_user: models.User = Depends(user_dependency),
+            request: Request,
+    ) -> BoardContext:
+        board, lst, card = await board_repo.get_board_list_card_and_check_permissions(
+            board_id=board_id, list_id=list_id, card_id=card_id, current_user=current_user, request=request,
+            shared=shared,
+        )
+        return BoardContext(board=board, list=lst, card=card)
+
+    return resolve_card
+
+
+def conditional(resolver):
+    """
+    Wrap read resolver: answer 304 if client already has current board version (only board row is
+    loaded at this point), otherwise set ETag header of the response.
+    """
+    async def resolve_conditional(
+            *,
+            context: BoardContext = Depends(resolver),
+            request: Request,
+            response: Response,
+    ) -> BoardContext:
+        etag = make_board_etag(context.board)
+
+        if etag_matches(request, etag):
+            raise NotModified(etag)
+
+        response.headers['ETag'] = etag
+        return context
+
+    return resolve_conditional
+
+
+# Read routes allow anonymous users (public boards), write routes require active user.
+# Route should depend on the same user dependency, so FastAPI resolves user only once per request.
+# Read routes don't modify resolved rows, so they are shared with concurrent requests.
+resolve_board = board_resolver(shared=True)
+resolve_board_for_update = board_resolver(get_current_active_user)
+resolve_list = list_resolver(shared=True)
+resolve_list_for_update = list_resolver(get_current_active_user)
+resolve_card = card_resolver(shared=True)
+resolve_card_for_update = card_resolver(get_current_active_user)
+
+resolve_board_conditional = conditional(resolve_board)
+resolve_list_conditional = conditional(resolve_list)
+resolve_card_conditional = conditional(resolve_card)
@@ -1,5 +1,7 @@
 from pydantic import BaseModel,  constr
-from typing import List, Optional
+from typing import List, Optional, Union
+
+from app.schemes.list import ListSnapshot
 
 
 class BoardBase(BaseModel):
@@ -16,6 +18,7 @@ class Board(BoardBase):
     id: int
     owner_id: int
     public: bool
+    version: Optional[int]
     url: Optional[str]
     collaborators_url: Optional[str]
 
@@ -23,6 +26,13 @@ class Board(BoardBase):
         orm_mode = True
 
 
+class BoardSnapshot(Board):
+    """
+    Model to return board with all lists and cards
+    """
+    lists: List[ListSnapshot]
+
+
 class BoardList(BoardBase):
     """
     Model to return list of boards
@@ -36,6 +46,14 @@ class BoardList(BoardBase):
         orm_mode = True
 
 
+class BoardImport(BoardBase):
+    """
+    Board row of import, id is given by client, lists of the board refer to it
+    """
+    id: Union[int, str]
+    public: bool = False
+
+
 class BoardCreate(BoardBase):
     """
     Model to create new board
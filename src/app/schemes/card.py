@@ -1,9 +1,10 @@
 from datetime import datetime
 
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional, Union
+from pydantic import BaseModel, conlist, root_validator
 
 
+from app.core.config import CARDS_BATCH_MAX_SIZE
 from app.db import enums
 
 
@@ -19,6 +20,7 @@ class CardCreate(CardBase):
 class Card(CardBase):
     id: int
     list_id: int
+    rank: str
     created_at: datetime
     last_change_at: datetime
     last_change_by_id: int
@@ -27,6 +29,23 @@ class Card(CardBase):
         orm_mode = True
 
 
+class CardSearchResult(Card):
+    """
+    Card found by search, highlights are html escaped title and description fragments with matched words
+    wrapped in <b></b>
+    """
+    score: float
+    title_highlight: str
+    description_highlight: Optional[str] = None
+
+
+class CardImport(CardBase):
+    """
+    Card row of import, list_id is given by client
+    """
+    list_id: Union[int, str]
+
+
 class CardUpdate(CardBase):
     title: Optional[str]
     description: Optional[str] = None
@@ -34,6 +53,59 @@ class CardUpdate(CardBase):
     list_id: Optional[int]
 
 
+class Move(BaseModel):
+    """
+    Position to move to: right before or right after other item, at the end if neither is set
+    """
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_single_position(cls, values):
+        if values.get('before_id') is not None and values.get('after_id') is not None:
+            raise ValueError('Only one of before_id and after_id can be set')
+
+        return values
+
+
+class CardMove(Move):
+    """
+    Position in list of the card or in other list of the board
+    """
+    list_id: Optional[int] = None
+
+
+class CardBatchUpdate(CardUpdate):
+    id: int
+
+
+class CardBatch(BaseModel):
+    """
+    Cards to create, update (or move to other list) and delete with one request
+    """
+    create: conlist(CardCreate, max_items=CARDS_BATCH_MAX_SIZE) = []
+    update: conlist(CardBatchUpdate, max_items=CARDS_BATCH_MAX_SIZE) = []
+    delete: conlist(int, max_items=CARDS_BATCH_MAX_SIZE) = []
+
+    @root_validator(skip_on_failure=True)
+    def check_card_ids(cls, values):
+        update_ids = [card.id for card in values.get('update')]
+        delete_ids = values.get('delete')
+
+        if len(set(update_ids)) != len(update_ids) or len(set(delete_ids)) != len(delete_ids):
+            raise ValueError('Card ids must be unique')
+        if set(update_ids) & set(delete_ids):
+            raise ValueError('Card can not be updated and deleted in one batch')
+
+        return values
+
+
+class CardBatchResult(BaseModel):
+    created: List[Card]
+    updated: List[Card]
+    deleted: List[Card]
+
+
 class CardHistory(BaseModel):
     card_id: int
     title: str
@@ -47,3 +119,19 @@ class CardHistory(BaseModel):
 
 class CardHistoryRetrieve(CardHistory):
     id: int
+    # history records are rebuilt from changes, title is unknown if full copy of card was archived
+    title: Optional[str]
+
+
+class CardChange(CardHistoryRetrieve):
+    """
+    Net change of card: action is create, update or delete, id is the last history record of the card
+    """
+    pass
+
+
+class BoardChanges(BaseModel):
+    since: int
+    last_history_id: int
+    has_more: bool
+    changes: List[CardChange]
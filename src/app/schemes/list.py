@@ -1,6 +1,8 @@
 from datetime import datetime
 from pydantic import BaseModel,  constr
-from typing import Optional
+from typing import List, Optional, Union
+
+from app.schemes.card import Card, Move
 
 
 class ListBase(BaseModel):
@@ -17,6 +19,7 @@ class ListModel(ListBase):
     """
     id: int
     created_by_id: int
+    rank: str
     url: Optional[str]
     cards_url: Optional[str]
 
@@ -35,6 +38,13 @@ class MultipleList(ListBase):
         orm_mode = True
 
 
+class ListSnapshot(ListModel):
+    """
+    Model to return list with all its cards
+    """
+    cards: List[Card]
+
+
 class ListCreate(ListBase):
     """
     Model to create new list
@@ -42,8 +52,24 @@ class ListCreate(ListBase):
     pass
 
 
+class ListImport(BaseModel):
+    """
+    List row of import, id and board_id are given by client
+    """
+    id: Union[int, str]
+    board_id: Union[int, str]
+    title: constr(min_length=1, max_length=100)
+
+
 class ListUpdate(BaseModel):
     """
     Update list object
     """
     title: constr(min_length=1, max_length=100)
+
+
+class ListMove(Move):
+    """
+    Position in board
+    """
+    pass
@@ -4,6 +4,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as api_router
 from app.core import config
 from app.db.database import db
+from app.services.authentication import password_hasher
+from app.services.board_events import board_event_hub
+from app.services.history_sink import history_sink
+from app.services.outbox import outbox_dispatcher
+from app.services.read_cache import read_cache
+from app.utils.etag import NotModified, not_modified_handler
+from app.utils.links import link_builder
 
 
 def get_application():
@@ -19,6 +26,27 @@ def get_application():
         allow_headers=["*"]
     )
     app.include_router(api_router, prefix=config.API_PREFIX)
+    link_builder.compile(app.router)
+
+    app.add_exception_handler(NotModified, not_modified_handler)
+
+    app.add_event_handler("shutdown", password_hasher.shutdown)
+
+    if config.OUTBOX_DISPATCHER_ENABLED:
+        # registered after db.init_app, so database is connected when dispatcher starts
+        app.add_event_handler("startup", outbox_dispatcher.start)
+        app.add_event_handler("shutdown", outbox_dispatcher.stop)
+
+    app.add_event_handler("startup", read_cache.start)
+    app.add_event_handler("shutdown", read_cache.stop)
+
+    # buffered records are written on shutdown, before database is disconnected
+    app.add_event_handler("startup", history_sink.start)
+    app.add_event_handler("shutdown", history_sink.stop)
+
+    if config.BOARD_EVENTS_ENABLED:
+        app.add_event_handler("startup", board_event_hub.start)
+        app.add_event_handler("shutdown", board_event_hub.stop)
 
     return app
 
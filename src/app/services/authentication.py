@@ -1,10 +1,14 @@
 import jwt
 import bcrypt
+import time
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 
-from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES, \
+    TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, PASSWORD_HASHER_WORKERS, PASSWORD_HASHER_MAX_QUEUE
 from app.schemes import token as token_sheme, user as user_scheme
+from app.services.password_hasher import PasswordHasher
+from app.utils.cache import TTLCache
 
 from typing import Optional
 from fastapi import HTTPException, status
@@ -13,6 +17,11 @@ from pydantic import ValidationError
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+password_hasher = PasswordHasher(max_workers=PASSWORD_HASHER_WORKERS, max_queue=PASSWORD_HASHER_MAX_QUEUE)
+
+# (token, secret_key) -> validated payload, skips signature verification for repeated requests
+token_payload_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
 
 # class AuthException(BaseException):from app.db.schemas import user
 #     pass
@@ -33,6 +42,12 @@ class AuthService:
     def verify_password(self, *, password: str, salt: str, hashed_pw: str) -> bool:
         return pwd_context.verify(password + salt, hashed_pw)
 
+    async def create_salt_and_hashed_password_async(self, *, plaintext_password: str) -> user_scheme.UserPasswordUpdate:
+        return await password_hasher.run(self.create_salt_and_hashed_password, plaintext_password=plaintext_password)
+
+    async def verify_password_async(self, *, password: str, salt: str, hashed_pw: str) -> bool:
+        return await password_hasher.run(self.verify_password, password=password, salt=salt, hashed_pw=hashed_pw)
+
     def create_access_token_for_user(
             self,
             *,
@@ -57,6 +72,13 @@ class AuthService:
         return access_token
 
     def get_username_from_token(self, *, token: str, secret_key: str) -> Optional[str]:
+        return self.get_payload_from_token(token=token, secret_key=secret_key).username
+
+    def get_payload_from_token(self, *, token: str, secret_key: str) -> token_sheme.JWTPayload:
+        payload = token_payload_cache.get((token, str(secret_key)))
+        if payload is not None:
+            return payload
+
         try:
             decoded_token = jwt.decode(token, str(secret_key), audience=JWT_AUDIENCE, algorithms=[JWT_ALGORITHM])
             payload = token_sheme.JWTPayload(**decoded_token)
@@ -66,4 +88,8 @@ class AuthService:
                 detail="Could not validate token credentials.",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return payload.username
+
+        # cached payload must expire together with token
+        token_payload_cache.set((token, str(secret_key)), payload, ttl=payload.exp - time.time())
+
+        return payload
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import asyncpg
+
+from app.core import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class SlowConsumer(Exception):
+    """
+    Subscriber was dropped, because it didn't read its events in time or listen connection was lost and events
+    could be missed. Client should reconnect and resync.
+    """
+
+
+class Subscription:
+    """
+    Events of one board for one client. Pending events are kept until client reads them,
+    events of the same list or card are coalesced, so burst of changes is sent as one message.
+    """
+
+    def __init__(self, hub: 'BoardEventHub', board_id: int):
+        self.hub = hub
+        self.board_id = board_id
+        self.dropped = False
+
+        self._version = None
+        self._truncated = False
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, message: dict):
+        if self.dropped:
+            return
+
+        self._version = message['version']
+
+        if message['events'] is None:
+            # too many events in one change, client has to reload board
+            self._truncated = True
+        else:
+            for event in message['events']:
+                # same object changed several times, only last state matters
+                self._pending.pop((event['type'], event['id']), None)
+                self._pending[(event['type'], event['id'])] = event
+
+        if len(self._pending) > self.hub.max_pending:
+            self.drop()
+
+        self._ready.set()
+
+    def drop(self):
+        self.dropped = True
+        self.hub.unsubscribe(self)
+        # waiting reader raises SlowConsumer
+        self._ready.set()
+
+    async def get(self) -> dict:
+        """
+        Wait for changes of board, return them as one message.
+        """
+        await self._ready.wait()
+        if self.hub.coalesce_delay and not self.dropped:
+            # let rest of the burst arrive
+            await asyncio.sleep(self.hub.coalesce_delay)
+        self._ready.clear()
+
+        if self.dropped:
+            raise SlowConsumer
+
+        message = {
+            'board_id': self.board_id,
+            'version': self._version,
+            'events': None if self._truncated else list(self._pending.values()),
+        }
+        self._pending = {}
+        self._truncated = False
+        return message
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BoardEventHub:
+    """
+    Fan out board change notifications to subscribers of this process.
+
+    Repositories publish changes with pg_notify in the transaction of the change, so events are
+    delivered only after commit. One LISTEN connection is used for all subscribers. If it's lost, notifications
+    sent until it's reconnected are missed, so all subscribers are dropped and connection is restored in background.
+    """
+
+    def __init__(self, *, dsn, channel: str, max_pending: int, coalesce_delay: float, reconnect_interval: float = 1.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.max_pending = max_pending
+        self.coalesce_delay = coalesce_delay
+        self.reconnect_interval = reconnect_interval
+
+        self._connection = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task = None
+        self._subscriptions = defaultdict(set)
+        self._received = 0
+        self._dropped = 0
+        self._reconnects = 0
+
+    async def start(self):
+        async with self._lock:
+            if self._connection is not None and not self._connection.is_closed():
+                return
+
+            self._connection = await asyncpg.connect(str(self.dsn))
+            self._connection.add_termination_listener(self._on_termination)
+            await self._connection.add_listener(self.channel, self._on_notification)
+
+    async def stop(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        async with self._lock:
+            # closed connection is not reconnected, see _on_termination
+            connection, self._connection = self._connection, None
+            if connection is not None:
+                await connection.close()
+
+    async def subscribe(self, board_id: int) -> Subscription:
+        # reconnect, if listen connection was lost
+        await self.start()
+
+        subscription = Subscription(self, board_id)
+        self._subscriptions[board_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.board_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.board_id]
+
+        if subscription.dropped:
+            self._dropped += 1
+
+    def _on_termination(self, connection):
+        if connection is not self._connection:
+            return
+
+        logger.warning("Board events listen connection is lost, subscribers are dropped")
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.drop()
+
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while True:
+            await asyncio.sleep(self.reconnect_interval)
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError, asyncio.TimeoutError):
+                logger.warning("Failed to reconnect board events listener", exc_info=True)
+            else:
+                self._reconnects += 1
+                return
+
+    def _on_notification(self, connection, pid, channel, payload):
+        self._received += 1
+
+        try:
+            message = json.loads(payload)
+            subscriptions = self._subscriptions.get(message['board_id'], ())
+        except (ValueError, KeyError, TypeError):
+            logger.exception("Invalid board event %r", payload)
+            return
+
+        for subscription in list(subscriptions):
+            subscription.push(message)
+
+    def stats(self) -> dict:
+        return {
+            'connected': self._connection is not None and not self._connection.is_closed(),
+            'boards': len(self._subscriptions),
+            'subscribers': sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            'received': self._received,
+            'dropped_subscribers': self._dropped,
+            'reconnects': self._reconnects,
+        }
+
+
+board_event_hub = BoardEventHub(
+    dsn=config.DB_DSN,
+    channel=config.BOARD_EVENTS_CHANNEL,
+    max_pending=config.BOARD_EVENTS_MAX_PENDING,
+    coalesce_delay=config.BOARD_EVENTS_COALESCE_DELAY,
+    reconnect_interval=config.BOARD_EVENTS_RECONNECT_INTERVAL,
+)
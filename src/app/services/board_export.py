@@ -0,0 +1,117 @@
+"""
+Export of a board with its lists, cards and cards history.
+
+Rows are read with server-side cursors, batch by batch, and every batch is encoded and sent before the next one
+is fetched, so memory use doesn't depend on board size. All tables are read in one repeatable read transaction,
+export is a consistent snapshot of the board.
+"""
+import csv
+import enum
+import io
+import json
+
+from app.core import config
+from app.db import models
+from app.db.database import db
+from app.utils.serialization import dump_json
+
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+
+# (type of exported row, columns, filter by board, sort key), tables are exported in this order
+EXPORT_TABLES = (
+    (
+        'board',
+        (models.Board.id, models.Board.title, models.Board.public, models.Board.owner_id, models.Board.created_at,
+         models.Board.version),
+        lambda board_id: models.Board.id == board_id,
+        (models.Board.id,),
+    ),
+    (
+        'list',
+        (models.List.id, models.List.board_id, models.List.title, models.List.rank, models.List.created_by_id),
+        lambda board_id: models.List.board_id == board_id,
+        (models.List.rank, models.List.id),
+    ),
+    (
+        'card',
+        (models.Card.id, models.Card.list_id, models.Card.title, models.Card.description, models.Card.rank,
+         models.Card.revision, models.Card.created_at, models.Card.last_change_at, models.Card.last_change_by_id),
+        # ix_lists_board_id_rank_id, then ix_cards_list_id_rank_id for every list
+        lambda board_id: models.Card.list_id.in_(
+            db.select([models.List.id]).where(models.List.board_id == board_id)
+        ),
+        (models.Card.list_id, models.Card.rank, models.Card.id),
+    ),
+    (
+        # records with changed_fields keep only these fields, others are null (see CardsRepository.write_history_many)
+        'history',
+        (models.CardHistory.id, models.CardHistory.card_id, models.CardHistory.list_id, models.CardHistory.action,
+         models.CardHistory.title, models.CardHistory.description, models.CardHistory.changed_fields,
+         models.CardHistory.revision, models.CardHistory.last_change_at, models.CardHistory.last_change_by_id),
+        # ix_cards_history_board_id_id
+        lambda board_id: models.CardHistory.board_id == board_id,
+        (models.CardHistory.id,),
+    ),
+)
+
+# every csv row has all columns, unused by row type are empty
+CSV_COLUMNS = ['type'] + list(dict.fromkeys(
+    column.name for _, columns, _, _ in EXPORT_TABLES for column in columns
+))
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, list):
+        return json.dumps(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def encode_ndjson(row_type: str, rows) -> bytes:
+    return b''.join(dump_json({'type': row_type, **row}) + b'\n' for row in rows)
+
+
+def encode_csv(row_type: str, rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    for row in rows:
+        writer.writerow({'type': row_type, **{name: csv_value(value) for name, value in row.items()}})
+    return buffer.getvalue().encode()
+
+
+def get_csv_header() -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_COLUMNS)
+    return buffer.getvalue().encode()
+
+
+async def iterate_board_export(*, board_id: int, export_format: str, batch_size: int = None):
+    """
+    Yield encoded chunks of export, one chunk per batch of rows.
+    """
+    batch_size = batch_size or config.BOARD_EXPORT_BATCH_SIZE
+    encode = encode_csv if export_format == CSV else encode_ndjson
+
+    if export_format == CSV:
+        yield get_csv_header()
+
+    async with db.acquire() as connection:
+        async with connection.transaction(isolation='repeatable_read', readonly=True):
+            for row_type, columns, board_filter, sort_key in EXPORT_TABLES:
+                query = db.select(columns).where(board_filter(board_id)).order_by(*sort_key)
+                names = [column.name for column in columns]
+
+                cursor = await connection.iterate(query)
+                while True:
+                    rows = await cursor.many(batch_size)
+                    if not rows:
+                        break
+
+                    yield encode(row_type, [dict(zip(names, row)) for row in rows])
@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import contextvars
+import enum
+import logging
+import time
+
+from app.core import config
+from app.db import models
+from app.db.database import db
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistorySink:
+    """
+    Writes cards history records.
+
+    In strict mode records are inserted right away, in transaction of the change. In buffered mode they are kept
+    in process and written by background task with COPY, every batch_size records or flush_interval seconds.
+    Buffered records are collected by transaction of the change and buffered after its commit (see collecting).
+    Buffered mode takes history write out of request, but records of the last interval are lost if process dies,
+    and history ids are not ordered with board version any more (event streams may skip records written by other
+    processes at the same time).
+    """
+
+    STRICT = 'strict'
+    BUFFERED = 'buffered'
+
+    def __init__(self, *, mode: str, batch_size: int, flush_interval: float, max_buffer: int):
+        if mode not in (self.STRICT, self.BUFFERED):
+            raise ValueError(f'Unknown history sink mode: {mode}')
+
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer = []
+        self._task = None
+        self._flush_needed = None
+        self._flush_lock = None
+        # records of current transaction, see collecting
+        self._pending = contextvars.ContextVar('history_sink_pending', default=None)
+
+        self._peak_depth = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._flushed_records = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+
+    @property
+    def buffered(self) -> bool:
+        return self.mode == self.BUFFERED
+
+    async def write(self, records: list):
+        if not records:
+            return
+
+        if not self.buffered:
+            await models.CardHistory.insert().values(records).gino.status()
+            return
+
+        pending = self._pending.get()
+        if pending is None:
+            raise RuntimeError('Buffered history should be written in collecting block')
+        pending.extend(records)
+
+    @contextlib.asynccontextmanager
+    async def collecting(self):
+        """
+        Buffer records written in the block when it's finished. Should wrap transaction of the change, so history
+        of rolled back changes is not written, and flush doesn't write it before change is visible.
+        Nothing is buffered if block fails. In strict mode records are inserted by write, in the transaction.
+        """
+        if not self.buffered or self._pending.get() is not None:
+            # nested block, outer one buffers
+            yield
+            return
+
+        if len(self._buffer) >= self.max_buffer:
+            # database can't keep up, slow writers down instead of growing buffer. Flush happens before
+            # transaction of the writer, so writer doesn't hold one pool connection while waiting for another.
+            await self.flush()
+
+        pending = []
+        token = self._pending.set(pending)
+        try:
+            yield
+        finally:
+            self._pending.reset(token)
+
+        if not pending:
+            return
+
+        self._buffer.extend(pending)
+        self._peak_depth = max(self._peak_depth, len(self._buffer))
+
+        if len(self._buffer) >= self.batch_size and self._flush_needed is not None:
+            self._flush_needed.set()
+
+    async def start(self):
+        if self.buffered and self._task is None:
+            self._flush_needed = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # write the rest before shutdown
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to write cards history")
+                # records are returned to buffer, try again after interval
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self) -> int:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            records, self._buffer = self._buffer, []
+            if not records:
+                return 0
+
+            started_at = time.monotonic()
+            try:
+                await self._copy(records)
+            except BaseException:
+                self._failed_flushes += 1
+                self._buffer[0:0] = records
+                raise
+
+            self._last_flush_ms = (time.monotonic() - started_at) * 1000
+            self._max_flush_ms = max(self._max_flush_ms, self._last_flush_ms)
+            self._flushes += 1
+            self._flushed_records += len(records)
+
+            return len(records)
+
+    async def _copy(self, records: list):
+        columns = list(records[0])
+        rows = [
+            tuple(value.value if isinstance(value, enum.Enum) else value for value in record.values())
+            for record in records
+        ]
+
+        async with db.acquire() as connection:
+            await connection.raw_connection.copy_records_to_table(
+                models.CardHistory.__tablename__, records=rows, columns=columns
+            )
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.mode,
+            'running': self._task is not None and not self._task.done(),
+            'buffer_depth': len(self._buffer),
+            'peak_buffer_depth': self._peak_depth,
+            'flushes': self._flushes,
+            'failed_flushes': self._failed_flushes,
+            'flushed_records': self._flushed_records,
+            'last_flush_ms': round(self._last_flush_ms, 3),
+            'max_flush_ms': round(self._max_flush_ms, 3),
+        }
+
+
+history_sink = HistorySink(
+    mode=config.HISTORY_SINK_MODE,
+    batch_size=config.HISTORY_SINK_BATCH_SIZE,
+    flush_interval=config.HISTORY_SINK_FLUSH_INTERVAL,
+    max_buffer=config.HISTORY_SINK_MAX_BUFFER,
+)
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+from app.celery.worker import celery
+from app.core import config
+from app.db.database import db
+from app.db.repositories.outbox import outbox_repo
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Background task, which moves messages from outbox table to celery broker in batches.
+
+    Request handlers only insert outbox row in their transaction and never wait for broker or workers.
+    Message is deleted in the same transaction it is sent in, so it is delivered at least once.
+    """
+
+    def __init__(self, *, batch_size: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._task = None
+        self._dispatched = 0
+        self._failed_batches = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                dispatched = await self.dispatch_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._failed_batches += 1
+                logger.exception("Failed to dispatch outbox messages")
+                dispatched = 0
+
+            # drain backlog without waiting, poll when outbox is empty
+            if dispatched < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch_batch(self) -> int:
+        async with db.transaction():
+            messages = await outbox_repo.pop_messages(limit=self.batch_size)
+
+            if messages:
+                # kombu publishing is blocking, keep it out of event loop
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._publish, messages)
+
+        self._dispatched += len(messages)
+        return len(messages)
+
+    def _publish(self, messages):
+        for message in messages:
+            celery.send_task(message.task_name, kwargs=message.payload)
+
+    def stats(self) -> dict:
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'dispatched': self._dispatched,
+            'failed_batches': self._failed_batches,
+        }
+
+
+outbox_dispatcher = OutboxDispatcher(batch_size=config.OUTBOX_BATCH_SIZE, poll_interval=config.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,91 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from starlette.status import (
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+
+
+class PasswordHasher:
+    """
+    Run CPU heavy password hashing in dedicated thread pool, so it doesn't block event loop.
+
+    Pool size limits number of hashes computed at the same time, excess calls wait in pool queue.
+    If queue is full, call is rejected with 503, so login storm can't pile up unbounded work.
+    Queued call, which caller stopped waiting for (e.g. client disconnected), leaves the queue and is not run.
+    """
+
+    def __init__(self, *, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # tokens of calls waiting for worker
+        self._waiting = set()
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._peak_queued = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hasher')
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        with self._lock:
+            if self.max_queue and len(self._waiting) >= self.max_queue:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy. Please, try again later.",
+                )
+            token = object()
+            self._waiting.add(token)
+            self._peak_queued = max(self._peak_queued, len(self._waiting))
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.executor, functools.partial(self._call, token, func, *args, **kwargs)
+            )
+        finally:
+            # cancelled before worker took the call, executor job is cancelled or skips it
+            with self._lock:
+                self._waiting.discard(token)
+
+    def _call(self, token, func, *args, **kwargs):
+        with self._lock:
+            if token not in self._waiting:
+                return None
+            self._waiting.discard(token)
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': len(self._waiting),
+                'running': self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'peak_queued': self._peak_queued,
+            }
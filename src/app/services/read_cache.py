@@ -0,0 +1,240 @@
+"""
+Cache of list cards pages in redis, shared by all application processes.
+
+Entries are grouped in namespaces (cards pages of one list), every namespace has generation
+counter in redis, which is part of keys of its entries. Write increments generations of changed namespaces
+after its transaction is committed, entries of previous generations are not read anymore and expire by ttl.
+Reader takes generation before it reads database, so reader racing with a write can store stale rows only
+under previous generation.
+
+Concurrent misses of the same entry in one process share one database query. Redis errors don't fail
+requests: rows are read from database, and redis is not tried again for a while. Entries, which could not be
+invalidated because of error, may be read until they expire.
+"""
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import logging
+import time
+from typing import Optional
+
+import aioredis
+import orjson
+import redis
+from sqlalchemy import DateTime
+
+from app.core import config
+from app.utils.single_flight import read_flight
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_ERRORS = (aioredis.RedisError, OSError, asyncio.TimeoutError)
+
+# generation counters outlive entries of their generations, so counter expired after long idle time
+# starts from 0 again safely
+GENERATION_TTL = 24 * 60 * 60
+
+
+def generation_key(namespace: str, prefix: str = config.READ_CACHE_PREFIX) -> str:
+    return f'{prefix}:generation:{namespace}'
+
+
+def cards_namespace(list_id: int) -> str:
+    return f'cards:{list_id}'
+
+
+def user_namespace(username: str) -> str:
+    return f'user:{username}'
+
+
+def dump_rows(rows) -> bytes:
+    return orjson.dumps([row.__values__ for row in rows])
+
+
+def load_rows(model, data: bytes) -> list:
+    datetime_columns = [column.key for column in model.__table__.columns if isinstance(column.type, DateTime)]
+
+    rows = []
+    for values in orjson.loads(data):
+        for key in datetime_columns:
+            if values.get(key) is not None:
+                values[key] = datetime.datetime.fromisoformat(values[key])
+        rows.append(model(**values))
+
+    return rows
+
+
+class ReadCache:
+    def __init__(self, *, url: str, prefix: str, ttl: int, timeout: float, retry_interval: float):
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+
+        self._redis = None
+        self._retry_at = 0.0
+        # namespaces changed by current transaction, see invalidating
+        self._pending = contextvars.ContextVar('read_cache_pending', default=None)
+
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+        self._invalidations = 0
+
+    async def start(self):
+        if self.url and self._redis is None:
+            self._redis = aioredis.from_url(
+                self.url, socket_timeout=self.timeout, socket_connect_timeout=self.timeout
+            )
+
+    async def stop(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    @property
+    def available(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._retry_at
+
+    def _failed(self):
+        self._errors += 1
+        self._retry_at = time.monotonic() + self.retry_interval
+        logger.warning('Read cache is not available', exc_info=True)
+
+    async def get_rows(self, namespace: str, key: str, model, load) -> list:
+        """
+        Return cached rows of model, or rows returned by load() coroutine function, which are cached.
+        """
+        if not self.available:
+            return await read_flight.run((namespace, key), load)
+
+        try:
+            generation = int(await self._redis.get(generation_key(namespace, self.prefix)) or 0)
+            entry_key = f'{self.prefix}:{namespace}:{generation}:{key}'
+            data = await self._redis.get(entry_key)
+        except REDIS_ERRORS:
+            self._failed()
+            return await read_flight.run((namespace, key), load)
+
+        if data is not None:
+            self._hits += 1
+            return load_rows(model, data)
+
+        self._misses += 1
+        return await read_flight.run(entry_key, self._load_and_store, entry_key, load)
+
+    async def get_generation(self, namespace: str) -> Optional[int]:
+        """
+        Current generation of namespace, for entries cached outside of redis. None if redis is not available.
+        """
+        if not self.available:
+            return None
+
+        try:
+            return int(await self._redis.get(generation_key(namespace, self.prefix)) or 0)
+        except REDIS_ERRORS:
+            self._failed()
+            return None
+
+    async def _load_and_store(self, entry_key: str, load) -> list:
+        rows = await load()
+
+        if rows is not None and self.available:
+            try:
+                await self._redis.set(entry_key, dump_rows(rows), ex=self.ttl)
+            except REDIS_ERRORS:
+                self._failed()
+
+        return rows
+
+    @contextlib.asynccontextmanager
+    async def invalidating(self):
+        """
+        Collect invalidations of the block and apply them when it's finished. Should wrap transaction of
+        the change, so entries are invalidated after commit. Nothing is invalidated if block fails.
+        """
+        if self._pending.get() is not None:
+            # nested block, outer one invalidates
+            yield
+            return
+
+        pending = set()
+        token = self._pending.set(pending)
+        try:
+            yield
+        finally:
+            self._pending.reset(token)
+
+        await self._increment_generations(pending)
+
+    async def invalidate(self, *namespaces: str):
+        """
+        Drop cached entries of namespaces, at the end of invalidating block if there is one.
+        """
+        pending = self._pending.get()
+        if pending is not None:
+            pending.update(namespaces)
+        else:
+            await self._increment_generations(namespaces)
+
+    async def _increment_generations(self, namespaces):
+        # invalidation is attempted even when reads skip redis after error, entries outlive short outages
+        if not namespaces or self._redis is None:
+            return
+
+        try:
+            async with self._redis.pipeline(transaction=False) as pipeline:
+                for namespace in namespaces:
+                    pipeline.incr(generation_key(namespace, self.prefix))
+                    pipeline.expire(generation_key(namespace, self.prefix), GENERATION_TTL)
+                await pipeline.execute()
+        except REDIS_ERRORS:
+            self._failed()
+        else:
+            self._invalidations += len(namespaces)
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self._redis is not None,
+            'available': self.available,
+            'hits': self._hits,
+            'misses': self._misses,
+            'errors': self._errors,
+            'invalidations': self._invalidations,
+        }
+
+
+def invalidate_from_worker(*namespaces: str):
+    """
+    Increment generations of namespaces with blocking client, for celery tasks, which change rows
+    outside of request handlers.
+    """
+    if not config.READ_CACHE_REDIS_URL or not namespaces:
+        return
+
+    client = redis.Redis.from_url(
+        config.READ_CACHE_REDIS_URL,
+        socket_timeout=config.READ_CACHE_TIMEOUT, socket_connect_timeout=config.READ_CACHE_TIMEOUT,
+    )
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for namespace in namespaces:
+            pipeline.incr(generation_key(namespace))
+            pipeline.expire(generation_key(namespace), GENERATION_TTL)
+        pipeline.execute()
+    except (redis.RedisError, OSError):
+        logger.warning('Read cache is not invalidated', exc_info=True)
+    finally:
+        client.close()
+
+
+read_cache = ReadCache(
+    url=config.READ_CACHE_REDIS_URL,
+    prefix=config.READ_CACHE_PREFIX,
+    ttl=config.READ_CACHE_TTL,
+    timeout=config.READ_CACHE_TIMEOUT,
+    retry_interval=config.READ_CACHE_RETRY_INTERVAL,
+)
@@ -0,0 +1,48 @@
+from fastapi import Request, Response
+from starlette.status import (
+    HTTP_304_NOT_MODIFIED,
+)
+
+from app.db import models
+
+
+class NotModified(Exception):
+    """
+    Raised by dependencies to answer 304 before route runs any queries.
+    """
+
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def make_board_etag(board: models.Board) -> str:
+    """
+    Strong ETag of board resources: board version changes with every change of its lists and cards.
+    """
+    return f'"{board.id}-{board.version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Check If-None-Match request header against etag (weak comparison, as for GET requests).
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == '*':
+        return True
+
+    def strip_weak(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+
+    return strip_weak(etag) in {strip_weak(tag) for tag in if_none_match.split(',')}
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return not_modified_response(exc.etag)
@@ -1,16 +1,181 @@
 import aiofiles
+import asyncio
+import functools
+import multipart
 import os
+import uuid
 
-from fastapi import UploadFile
+from fastapi import HTTPException, Request
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+)
 
-from app.celery.worker import upload_image_task, send_sign_up_email, delete_image_task
+from app.celery.worker import upload_image_task, delete_image_task
+from app.core.config import UPLOAD_SPOOL_PATH, MAX_PROFILE_PICTURE_SIZE, MAX_CONCURRENT_UPLOADS
 from app.db.models import User
 
 
-async def upload_image(*, file: UploadFile, user: User):
-    image_bytes = await file.read()
-    hex_bytes = image_bytes.hex()
-    image_async_res = upload_image_task.delay(username=user.username, file=hex_bytes)
+# boundaries, part headers and other fields allowed in multipart body on top of file size
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class UploadSlots:
+    """
+    Limit number of files copied to spool at the same time, other uploads wait for free slot.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._loop = None
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # semaphore is bound to event loop it was created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.size)
+        return self._semaphore
+
+
+upload_slots = UploadSlots(MAX_CONCURRENT_UPLOADS)
+
+
+class MultipartFileField:
+    """
+    Callbacks of multipart parser, which collect data of the first file sent in field name. Collected data is
+    taken after every chunk of body is parsed, so only one chunk is kept in memory.
+    """
+
+    def __init__(self, name: str):
+        self.name = name.encode()
+        self.found = False
+        self.size = 0
+
+        self._data = []
+        self._in_file = False
+        self._header_field = b''
+        self._header_value = b''
+        self._disposition = b''
+
+    def callbacks(self) -> dict:
+        return {
+            'on_part_begin': self.on_part_begin,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+            'on_part_data': self.on_part_data,
+        }
+
+    def on_part_begin(self):
+        self._in_file = False
+        self._disposition = b''
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_field.lower() == b'content-disposition':
+            self._disposition = self._header_value
+        self._header_field = self._header_value = b''
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._in_file = not self.found and options.get(b'name') == self.name and b'filename' in options
+        self.found = self.found or self._in_file
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.size += end - start
+            self._data.append(data[start:end])
+
+    def take(self) -> bytes:
+        data, self._data = b''.join(self._data), []
+        return data
+
+
+def remove_spooled_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def file_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is too large. Maximum size is {max_size} bytes."
+    )
+
+
+async def spool_upload(*, request: Request, field: str = 'file', max_size: int = MAX_PROFILE_PICTURE_SIZE) -> str:
+    """
+    Parse multipart request body while it arrives and copy file of the field chunk by chunk to spool directory
+    on shared media volume, return file path. Body is not read by form parser before, so only one chunk is kept
+    in memory and file is written once. Raise 413 as soon as Content-Length or read part of body shows that
+    file is larger than max_size, partial file is removed.
+    """
+    max_body_size = max_size + MULTIPART_OVERHEAD
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > max_body_size:
+        raise file_too_large(max_size)
+
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or not options.get(b'boundary'):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Expected multipart/form-data body.")
+
+    file_field = MultipartFileField(field)
+    parser = multipart.MultipartParser(options[b'boundary'], file_field.callbacks())
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, functools.partial(os.makedirs, UPLOAD_SPOOL_PATH, exist_ok=True))
+
+    path = os.path.join(UPLOAD_SPOOL_PATH, uuid.uuid4().hex)
+    body_size = 0
+
+    # body is read only when slot is free, so waiting uploads are not received
+    async with upload_slots.semaphore:
+        try:
+            async with aiofiles.open(path, 'wb') as spool_file:
+                async for chunk in request.stream():
+                    body_size += len(chunk)
+                    if body_size > max_body_size:
+                        raise file_too_large(max_size)
+
+                    parser.write(chunk)
+                    if file_field.size > max_size:
+                        raise file_too_large(max_size)
+
+                    if data := file_field.take():
+                        await spool_file.write(data)
+
+                parser.finalize()
+
+            if not file_field.found:
+                raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=f"File ({field}) is not uploaded.")
+        except MultipartParseError:
+            await loop.run_in_executor(None, remove_spooled_file, path)
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid multipart/form-data body.")
+        except BaseException:
+            await loop.run_in_executor(None, remove_spooled_file, path)
+            raise
+
+    return path
+
+
+async def upload_image(*, request: Request, user: User):
+    path = await spool_upload(request=request)
+
+    # only path goes through broker, worker reads file from shared volume
+    image_async_res = upload_image_task.delay(username=user.username, path=path)
 
     return image_async_res
 
@@ -0,0 +1,69 @@
+"""
+Links of API resources in responses.
+
+Path templates are taken from the router once, when application is created, links of a page of rows are then
+formatted from templates without route lookup.
+"""
+from app.core import config
+
+
+# field of response -> (route name, {path parameter: attribute of row})
+BOARD_LINKS = {
+    'url': ('board:get-board-by-id', {'board_id': 'id'}),
+    'collaborators_url': ('board:get-board-users', {'board_id': 'id'}),
+}
+LIST_LINKS = {
+    'url': ('list:get-list-by-id', {'board_id': 'board_id', 'list_id': 'id'}),
+    'cards_url': ('card:get-cards', {'board_id': 'board_id', 'list_id': 'id'}),
+}
+USER_LINKS = {
+    'profile_url': ('user:get-user-by-username', {'username': 'username'}),
+}
+
+
+class LinkBuilder:
+    """
+    Absolute links start with base_url, relative links are paths only. Empty base_url makes all links relative.
+    """
+
+    def __init__(self, base_url: str = ''):
+        self.base_url = base_url.rstrip('/')
+        # route name -> path with path parameters as format fields
+        self._paths = {}
+
+    def compile(self, router):
+        for route in router.routes:
+            params = getattr(route, 'param_convertors', None)
+            if params is None or route.name in self._paths:
+                continue
+
+            # url_path_for puts given values into path, so parameters are left as format fields
+            self._paths[route.name] = str(router.url_path_for(route.name, **{param: f'{{{param}}}' for param in params}))
+
+    def url(self, name: str, *, relative: bool = False, **params) -> str:
+        path = self._paths[name].format(**params)
+        return path if relative else self.base_url + path
+
+    def resolve(self, rows, links: dict, *, relative: bool = False) -> list:
+        """
+        Links of every row, [{field: url}], in one pass over rows.
+        """
+        base_url = '' if relative else self.base_url
+        templates = [
+            (field, (base_url + self._paths[name]).format, tuple(params.items()))
+            for field, (name, params) in links.items()
+        ]
+
+        return [
+            {
+                field: format_url(**{param: getattr(row, attribute) for param, attribute in params})
+                for field, format_url, params in templates
+            }
+            for row in rows
+        ]
+
+    def resolve_one(self, row, links: dict, *, relative: bool = False) -> dict:
+        return self.resolve([row], links, relative=relative)[0]
+
+
+link_builder = LinkBuilder(base_url=config.BASE_URL)
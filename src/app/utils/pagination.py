@@ -0,0 +1,83 @@
+import base64
+import binascii
+import datetime
+import json
+
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, tuple_
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+)
+
+
+DEFAULT_PAGE_SIZE = 25
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(values) -> str:
+    """
+    Pack sort key values of the last row on a page into an opaque url-safe token.
+    """
+    payload = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    """
+    Unpack token created by encode_cursor, convert values back to python types of the sort columns.
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+
+        if not isinstance(payload, list) or len(payload) != len(columns):
+            raise ValueError
+
+        values = []
+        for column, value in zip(columns, payload):
+            if isinstance(column.type, DateTime):
+                value = datetime.datetime.fromisoformat(value)
+            values.append(value)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor."
+        )
+
+    return values
+
+
+def paginate(query, *, columns, cursor: str = None, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Order query by columns and apply page window.
+
+    With cursor, rows are filtered by row comparison on sort key, so postgres does index range scan
+    over composite index on the same columns. Offset is kept for old clients.
+    """
+    if cursor:
+        key = tuple_(*columns)
+        values = tuple(decode_cursor(cursor, columns))
+        query = query.where(key < values if descending else key > values)
+    elif offset:
+        query = query.offset(offset)
+
+    order_by = [column.desc() for column in columns] if descending else columns
+
+    return query.order_by(*order_by).limit(limit)
+
+
+def get_next_cursor(rows, *, columns, limit: int):
+    """
+    Return cursor pointing after the last row, or None if page is not full (no more rows).
+    """
+    if not rows or len(rows) < (limit or DEFAULT_PAGE_SIZE):
+        return None
+
+    last_row = rows[-1]
+    return encode_cursor([getattr(last_row, column.name) for column in columns])
+
+
+def set_next_cursor_header(response: Response, rows, *, columns, limit: int):
+    next_cursor = get_next_cursor(rows, columns=columns, limit=limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,74 @@
+"""
+Lexicographic ranks of cards and lists.
+
+Rank is a string of base 36 digits, rows are ordered by comparing ranks as strings (rank columns use "C"
+collation, so database orders them the same way). Between any two ranks there is room for another one, so moved
+row is placed by writing only its own rank. Ranks are compared as fractions: "i" is the same position as "i0",
+trailing zeros are never written, otherwise no rank would fit between "i" and "i0".
+"""
+from typing import Optional
+
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(ALPHABET)
+
+# ranks of new rows have this many digits, appended rows are STEP apart,
+# so about a million rows are appended to a list before ranks become longer
+RANK_WIDTH = 6
+STEP = BASE ** 2
+
+
+def _to_int(rank: str, width: int) -> int:
+    value = 0
+    for digit in rank.ljust(width, ALPHABET[0]):
+        value = value * BASE + ALPHABET.index(digit)
+    return value
+
+
+def _to_rank(value: int, width: int) -> str:
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(ALPHABET[digit])
+    return ''.join(reversed(digits)).rstrip(ALPHABET[0])
+
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """
+    Return rank, which sorts after before and before after. None stands for start or end of the list.
+    Rows are appended and prepended STEP apart, rank between two rows is their midpoint,
+    it gets one digit longer when neighbours are too close.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f'Rank "{before}" must sort before "{after}"')
+
+    width = max(RANK_WIDTH, len(before or ''), len(after or ''))
+    low = _to_int(before, width) if before else 0
+    high = _to_int(after, width) if after else BASE ** width
+
+    while high - low < 2:
+        width += 1
+        low, high = low * BASE, high * BASE
+
+    if before is None and after is None:
+        value = high // 2
+    elif after is None:
+        value = low + min(STEP, (high - low) // 2)
+    elif before is None:
+        value = high - min(STEP, (high - low) // 2)
+    else:
+        value = (low + high) // 2
+
+    return _to_rank(value, width)
+
+
+def spread_ranks(count: int, *, after: Optional[str] = None) -> list:
+    """
+    Return count ascending ranks STEP apart, starting after given rank. Used to append several rows
+    and to rebalance ranks of the whole list.
+    """
+    ranks = []
+    for _ in range(count):
+        after = rank_between(after, None)
+        ranks.append(after)
+    return ranks
@@ -0,0 +1,45 @@
+from typing import Type
+
+import orjson
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+from starlette.responses import Response
+
+
+def pick_fields(data: dict, schema: Type[BaseModel], **extra) -> dict:
+    """
+    Keep only fields declared in response schema, add extra values (urls etc.).
+    """
+    return {name: data.get(name) for name in schema.__fields__} | extra
+
+
+def serialize_row(row, schema: Type[BaseModel], **extra) -> dict:
+    """
+    Fields of response schema taken from GINO model instance as is. Rows come from database and already have
+    types of the schema, so they are not validated by pydantic model.
+    """
+    return pick_fields(row.__values__, schema, **extra)
+
+
+def dump_json(data) -> bytes:
+    # datetimes, enums and uuids are encoded by orjson, pydantic models and other types by pydantic_encoder
+    return orjson.dumps(data, default=pydantic_encoder, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RowsResponse(Response):
+    """
+    JSON response of serialized rows, encoded with orjson without validation by response model and
+    jsonable_encoder. Headers set on `response` dependency (ETag, next page cursor) are kept, FastAPI doesn't
+    merge them into response returned by route.
+    """
+    media_type = 'application/json'
+
+    def __init__(self, content, *, response: Response = None, **kwargs):
+        super().__init__(content, **kwargs)
+        if response is not None:
+            self.raw_headers.extend(
+                (key, value) for key, value in response.raw_headers if key not in (b'content-length', b'content-type')
+            )
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.core import config
+
+
+class SingleFlight:
+    """
+    Coalescing of concurrent identical calls in one process: while a call with some key is running, other
+    callers with the same key wait for its result instead of calling again. Key is released as soon as the
+    call finishes, so results are never reused by later callers.
+
+    Waiters get the same result object, it should not be modified. If the running call is cancelled,
+    one of its waiters makes the call again. Calls should not depend on caller's transaction.
+    """
+
+    def __init__(self, *, enabled: bool = True):
+        self.enabled = enabled
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key, func, *args, **kwargs):
+        if not self.enabled:
+            self.calls += 1
+            return await func(*args, **kwargs)
+
+        while key in self._calls:
+            future = self._calls[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # caller of the running call is cancelled, not this one
+                if future.cancelled():
+                    continue
+                raise
+            finally:
+                if not future.cancelled():
+                    self.coalesced += 1
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        # exception is retrieved even if there are no waiters
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.calls += 1
+
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'in_flight': len(self._calls),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
+
+
+# database reads of request handlers, which are safe to share between concurrent requests
+read_flight = SingleFlight(enabled=config.READ_SINGLE_FLIGHT_ENABLED)
@@ -0,0 +1,70 @@
+"""
+Benchmark of response serialization of a page of rows.
+
+Compares the previous path of routes (pydantic model for every row, then jsonable_encoder and json encoding by
+FastAPI) with serialize_row and RowsResponse. Rows are built in memory, database is not needed.
+
+    python -m benchmarks.serialization --rows 25 --repeat 2000
+"""
+import argparse
+import datetime
+import statistics
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.db import enums, models
+from app.schemes import card as card_schema
+from app.utils.serialization import RowsResponse, serialize_row
+
+
+def make_rows(count: int):
+    now = datetime.datetime.now()
+    cards = [
+        models.Card(
+            id=i, title=f'card {i}', description='description ' * 10, list_id=1, rank=f'{i:06d}', revision=3,
+            created_at=now, last_change_at=now, last_change_by_id=1,
+        )
+        for i in range(count)
+    ]
+    history = [
+        models.CardHistory(
+            id=i, card_id=i, title=f'card {i}', description='description ' * 10, changed_fields=None, revision=0,
+            action=enums.CardHistoryActions.create, list_id=1, board_id=1, last_change_by_id=1, last_change_at=now,
+        )
+        for i in range(count)
+    ]
+    return {card_schema.Card: cards, card_schema.CardHistoryRetrieve: history}
+
+
+def pydantic_path(rows, schema) -> bytes:
+    result = [schema(**row.to_dict()) for row in rows]
+    return JSONResponse(jsonable_encoder(result)).body
+
+
+def fast_path(rows, schema) -> bytes:
+    return RowsResponse([serialize_row(row, schema) for row in rows]).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=25, help='rows in page')
+    parser.add_argument('--repeat', type=int, default=2000, help='pages encoded by every run')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for schema, rows in make_rows(args.rows).items():
+        timings = {}
+        for name, path in (('pydantic', pydantic_path), ('rows', fast_path)):
+            runs = timeit.repeat(lambda: path(rows, schema), number=args.repeat, repeat=args.runs)
+            timings[name] = statistics.median(runs) / args.repeat * 1e6
+
+        print(
+            f'{schema.__name__}, {args.rows} rows: pydantic {timings["pydantic"]:.1f} us, '
+            f'rows {timings["rows"]:.1f} us, {timings["pydantic"] / timings["rows"]:.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
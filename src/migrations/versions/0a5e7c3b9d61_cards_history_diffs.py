@@ -0,0 +1,34 @@
+"""Cards history diffs
+
+Revision ID: 0a5e7c3b9d61
+Revises: f4b0d6e2a813
+Create Date: 2026-10-18 15:47:33.260918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0a5e7c3b9d61'
+down_revision = 'f4b0d6e2a813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cards', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    # existing records are full copies (null changed_fields)
+    op.add_column('cards_history', sa.Column('changed_fields', postgresql.ARRAY(sa.String()), nullable=True))
+    op.add_column('cards_history', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    op.alter_column('cards_history', 'title', existing_type=sa.Text(), nullable=True)
+
+
+def downgrade():
+    # diffs are not expanded back to full copies, records with unchanged title get empty one
+    op.execute("UPDATE cards_history SET title = '' WHERE title IS NULL")
+    op.alter_column('cards_history', 'title', existing_type=sa.Text(), nullable=False)
+    op.drop_column('cards_history', 'revision')
+    op.drop_column('cards_history', 'changed_fields')
+    op.drop_column('cards', 'revision')
@@ -0,0 +1,70 @@
+"""Card and list ranks
+
+Revision ID: 1b8d5f2e6c40
+Revises: 0a5e7c3b9d61
+Create Date: 2026-10-18 16:35:08.642197
+
+"""
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+from app.utils.ranking import spread_ranks
+
+
+# revision identifiers, used by Alembic.
+revision = '1b8d5f2e6c40'
+down_revision = '0a5e7c3b9d61'
+branch_labels = None
+depends_on = None
+
+
+def fill_ranks(table, parent_column, order_by):
+    """
+    Rank existing rows of every parent in their current order.
+    """
+    connection = op.get_bind()
+    rows = connection.execute(f'SELECT id, {parent_column} FROM {table} ORDER BY {parent_column}, {order_by}').fetchall()
+
+    ids, ranks = [], []
+    for _, parent_rows in groupby(rows, key=lambda row: row[1]):
+        parent_ids = [row[0] for row in parent_rows]
+        ids.extend(parent_ids)
+        ranks.extend(spread_ranks(len(parent_ids)))
+
+    if ids:
+        connection.execute(
+            text(
+                f'UPDATE {table} SET rank = data.rank '
+                f'FROM (SELECT unnest(CAST(:ids AS int[])) AS id, unnest(CAST(:ranks AS text[])) AS rank) AS data '
+                f'WHERE {table}.id = data.id'
+            ),
+            ids=ids, ranks=ranks
+        )
+
+
+def upgrade():
+    op.add_column('cards', sa.Column('rank', sa.String(collation='C'), nullable=True))
+    op.add_column('lists', sa.Column('rank', sa.String(collation='C'), nullable=True))
+
+    fill_ranks('cards', 'list_id', 'created_at, id')
+    fill_ranks('lists', 'board_id', 'id')
+
+    op.alter_column('cards', 'rank', existing_type=sa.String(collation='C'), nullable=False)
+    op.alter_column('lists', 'rank', existing_type=sa.String(collation='C'), nullable=False)
+
+    op.create_index('ix_cards_list_id_rank_id', 'cards', ['list_id', 'rank', 'id'], unique=False)
+    op.create_index('ix_lists_board_id_rank_id', 'lists', ['board_id', 'rank', 'id'], unique=False)
+    op.drop_index('ix_cards_list_id_created_at_id', table_name='cards')
+    op.drop_index('ix_lists_board_id_id', table_name='lists')
+
+
+def downgrade():
+    op.create_index('ix_lists_board_id_id', 'lists', ['board_id', 'id'], unique=False)
+    op.create_index('ix_cards_list_id_created_at_id', 'cards', ['list_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_lists_board_id_rank_id', table_name='lists')
+    op.drop_index('ix_cards_list_id_rank_id', table_name='cards')
+    op.drop_column('lists', 'rank')
+    op.drop_column('cards', 'rank')
@@ -0,0 +1,31 @@
+"""Cards search vector
+
+Revision ID: 2c6e9a4f1d83
+Revises: 1b8d5f2e6c40
+Create Date: 2026-10-18 17:21:46.105329
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6e9a4f1d83'
+down_revision = '1b8d5f2e6c40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # stored generated column rewrites cards table once, afterwards it's updated with every insert and update
+    op.execute(
+        "ALTER TABLE cards ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED"
+    )
+    op.create_index('ix_cards_search_vector', 'cards', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_cards_search_vector', table_name='cards')
+    op.drop_column('cards', 'search_vector')
@@ -0,0 +1,34 @@
+"""Users trigram indexes
+
+Revision ID: 3d7f0b5a2e94
+Revises: 2c6e9a4f1d83
+Create Date: 2026-10-18 18:04:12.730541
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d7f0b5a2e94'
+down_revision = '2c6e9a4f1d83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # user search matches username substring and email prefix with ILIKE, both are served by trigram indexes
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_users_username_trgm', 'users', ['username'], unique=False,
+        postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_users_email_trgm', 'users', ['email'], unique=False,
+        postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'}
+    )
+
+
+def downgrade():
+    op.drop_index('ix_users_email_trgm', table_name='users')
+    op.drop_index('ix_users_username_trgm', table_name='users')
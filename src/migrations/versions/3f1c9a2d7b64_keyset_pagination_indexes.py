@@ -0,0 +1,39 @@
+"""Keyset pagination indexes
+
+Revision ID: 3f1c9a2d7b64
+Revises: 8875f1e583e1
+Create Date: 2026-10-18 10:12:41.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2d7b64'
+down_revision = '8875f1e583e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_boards_public_created_at_id', 'boards', ['public', 'created_at', 'id'], unique=False)
+    op.create_index('ix_boards_owner_id_created_at_id', 'boards', ['owner_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_lists_board_id_id', 'lists', ['board_id', 'id'], unique=False)
+    op.create_index('ix_cards_list_id_created_at_id', 'cards', ['list_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_cards_history_card_id_last_change_at_id', 'cards_history', ['card_id', 'last_change_at', 'id'], unique=False)
+    op.create_index('ix_cards_history_list_id_last_change_at_id', 'cards_history', ['list_id', 'last_change_at', 'id'], unique=False)
+    # single column indexes are prefixes of the composite ones
+    op.drop_index('ix_cards_history_card_id', table_name='cards_history')
+    op.drop_index('ix_cards_history_list_id', table_name='cards_history')
+
+
+def downgrade():
+    op.create_index('ix_cards_history_list_id', 'cards_history', ['list_id'], unique=False)
+    op.create_index('ix_cards_history_card_id', 'cards_history', ['card_id'], unique=False)
+    op.drop_index('ix_cards_history_list_id_last_change_at_id', table_name='cards_history')
+    op.drop_index('ix_cards_history_card_id_last_change_at_id', table_name='cards_history')
+    op.drop_index('ix_cards_list_id_created_at_id', table_name='cards')
+    op.drop_index('ix_lists_board_id_id', table_name='lists')
+    op.drop_index('ix_boards_owner_id_created_at_id', table_name='boards')
+    op.drop_index('ix_boards_public_created_at_id', table_name='boards')
@@ -0,0 +1,32 @@
+"""Board users composite primary key
+
+Revision ID: a7e4d2c91b05
+Revises: 3f1c9a2d7b64
+Create Date: 2026-10-18 11:03:27.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e4d2c91b05'
+down_revision = '3f1c9a2d7b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # remove duplicated collaborators before adding primary key
+    op.execute(
+        "DELETE FROM board_users a USING board_users b "
+        "WHERE a.board_id = b.board_id AND a.user_id = b.user_id AND a.ctid > b.ctid"
+    )
+    op.create_primary_key('board_users_pkey', 'board_users', ['board_id', 'user_id'])
+    # primary key index covers lookups by board_id
+    op.drop_index('ix_board_users_board_id', table_name='board_users')
+
+
+def downgrade():
+    op.create_index('ix_board_users_board_id', 'board_users', ['board_id'], unique=False)
+    op.drop_constraint('board_users_pkey', 'board_users', type_='primary')
@@ -0,0 +1,24 @@
+"""Board version
+
+Revision ID: d81f3b6a0c27
+Revises: c52b8e0f4a19
+Create Date: 2026-10-18 13:02:41.208715
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3b6a0c27'
+down_revision = 'c52b8e0f4a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('boards', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('boards', 'version')
@@ -0,0 +1,32 @@
+"""Cards history board id
+
+Revision ID: e3a9c4d17f52
+Revises: d81f3b6a0c27
+Create Date: 2026-10-18 14:21:07.512384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a9c4d17f52'
+down_revision = 'd81f3b6a0c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cards_history', sa.Column('board_id', sa.Integer(), nullable=True))
+    op.execute(
+        'UPDATE cards_history SET board_id = lists.board_id FROM lists WHERE lists.id = cards_history.list_id'
+    )
+    op.alter_column('cards_history', 'board_id', nullable=False)
+    op.create_foreign_key('cards_history_board_id_fkey', 'cards_history', 'boards', ['board_id'], ['id'], ondelete='NO ACTION')
+    op.create_index('ix_cards_history_board_id_id', 'cards_history', ['board_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cards_history_board_id_id', table_name='cards_history')
+    op.drop_constraint('cards_history_board_id_fkey', 'cards_history', type_='foreignkey')
+    op.drop_column('cards_history', 'board_id')
@@ -0,0 +1,94 @@
+"""Partition cards history by month
+
+Revision ID: f4b0d6e2a813
+Revises: e3a9c4d17f52
+Create Date: 2026-10-18 15:04:52.917260
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b0d6e2a813'
+down_revision = 'e3a9c4d17f52'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = 'id, card_id, title, description, action, list_id, board_id, last_change_by_id, last_change_at'
+
+
+def next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def create_indexes():
+    op.create_index('ix_cards_history_card_id_last_change_at_id', 'cards_history', ['card_id', 'last_change_at', 'id'], unique=False)
+    op.create_index('ix_cards_history_list_id_last_change_at_id', 'cards_history', ['list_id', 'last_change_at', 'id'], unique=False)
+    op.create_index('ix_cards_history_board_id_id', 'cards_history', ['board_id', 'id'], unique=False)
+
+
+def rename_old_table(suffix):
+    op.rename_table('cards_history', f'cards_history_{suffix}')
+    op.execute(f'ALTER INDEX cards_history_pkey RENAME TO cards_history_{suffix}_pkey')
+    op.drop_index('ix_cards_history_card_id_last_change_at_id', table_name=f'cards_history_{suffix}')
+    op.drop_index('ix_cards_history_list_id_last_change_at_id', table_name=f'cards_history_{suffix}')
+    op.drop_index('ix_cards_history_board_id_id', table_name=f'cards_history_{suffix}')
+
+
+def create_table(partition_by=None):
+    op.execute(f"""
+        CREATE TABLE cards_history (
+            id INTEGER NOT NULL DEFAULT nextval('cards_history_id_seq'),
+            card_id INTEGER,
+            title TEXT NOT NULL,
+            description TEXT,
+            action cardhistoryactions NOT NULL,
+            list_id INTEGER REFERENCES lists (id) ON DELETE NO ACTION,
+            board_id INTEGER NOT NULL REFERENCES boards (id) ON DELETE NO ACTION,
+            last_change_by_id INTEGER REFERENCES users (id) ON DELETE NO ACTION,
+            last_change_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY ({'id, last_change_at' if partition_by else 'id'})
+        ) {f'PARTITION BY {partition_by}' if partition_by else ''}
+    """)
+    # sequence would be dropped together with old table
+    op.execute('ALTER SEQUENCE cards_history_id_seq OWNED BY cards_history.id')
+
+
+def upgrade():
+    rename_old_table('unpartitioned')
+    create_table(partition_by='RANGE (last_change_at)')
+
+    op.execute('CREATE TABLE cards_history_default PARTITION OF cards_history DEFAULT')
+
+    # monthly partitions for existing records and a couple of months ahead,
+    # later ones are created by maintain_history_partitions task
+    first_change_at = op.get_bind().execute('SELECT min(last_change_at) FROM cards_history_unpartitioned').scalar()
+    today = datetime.date.today()
+    month = datetime.date((first_change_at or today).year, (first_change_at or today).month, 1)
+    last_month = next_month(next_month(datetime.date(today.year, today.month, 1)))
+
+    while month <= last_month:
+        op.execute(
+            f"CREATE TABLE cards_history_y{month:%Y}m{month:%m} PARTITION OF cards_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        )
+        month = next_month(month)
+
+    create_indexes()
+
+    op.execute(f'INSERT INTO cards_history ({COLUMNS}) SELECT {COLUMNS} FROM cards_history_unpartitioned')
+    op.drop_table('cards_history_unpartitioned')
+
+
+def downgrade():
+    rename_old_table('partitioned')
+    create_table()
+    create_indexes()
+
+    op.execute(f'INSERT INTO cards_history ({COLUMNS}) SELECT {COLUMNS} FROM cards_history_partitioned')
+    # partitions are dropped together with parent table
+    op.drop_table('cards_history_partitioned')
@@ -5,7 +5,9 @@ from sqlalchemy.orm import close_all_sessions
 
 from app.core import config as app_config
 from app.db.database import db
+from app.db.repositories.users import user_cache
 from app.server import app
+from app.services.authentication import token_payload_cache
 
 
 def status(self):
@@ -29,12 +31,20 @@ sqlalchemy_engine_test = create_engine(app_config.TEST_DB_DSN, isolation_level='
 async def clear_db_table():
     yield
     with sqlalchemy_engine_test.connect() as conn:
+        conn.execute(f"DELETE FROM cards_history;")
+        conn.execute(f"DELETE FROM cards;")
+        conn.execute(f"DELETE FROM lists;")
         conn.execute(f"DELETE FROM board_users;")
         conn.execute(f"DELETE FROM boards;")
+        conn.execute(f"DELETE FROM outbox_messages;")
         conn.execute(f"DELETE FROM users;")
         conn.close()
     sqlalchemy_engine_test.dispose()
 
+    # users are recreated with same usernames in every test
+    user_cache.clear()
+    token_payload_cache.clear()
+
 
 # def pytest_configure(config):
 #     """
@@ -1,12 +1,21 @@
+import asyncio
+import csv
+import io
 import json
 import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
 
 from app.core import config as app_config
+from app.db import enums, models
 from app.db.database import db
 from app.db.repositories.users import UsersRepository
-from app.db.repositories.boards import BoardsRepository
+from app.db.repositories.boards import BoardsRepository, board_repo
 from app.schemes import user as user_schema
 from app.schemes import board as board_schema
+from app.services.board_export import NDJSON, iterate_board_export
+from app.utils.links import link_builder
+from app.utils.single_flight import SingleFlight, read_flight
 
 
 pytestmark = pytest.mark.asyncio
@@ -185,3 +194,638 @@ class TestGetAll:
 
         assert response.status_code == 200
         assert len(response.json()) == 2
+
+    async def test_cursor_pagination(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            user_payload = {'email': 'user@example.com', 'username': 'username', 'password': 'password'}
+            user = await UsersRepository().register_new_user(
+                user_schema.UserCreate(**user_payload)
+            )
+
+            for i in range(5):
+                await BoardsRepository().create_new_board(
+                    board=board_schema.BoardCreate(**{'title': f'test{i}', 'public': True}),
+                    owner=user
+                )
+
+            titles = []
+            params = {'limit': 2}
+            pages = 0
+
+            while True:
+                response = await client.get("/api/boards", params=params)
+                assert response.status_code == 200
+
+                titles.extend(board['title'] for board in response.json())
+                pages += 1
+
+                if 'X-Next-Cursor' not in response.headers:
+                    break
+                params['cursor'] = response.headers['X-Next-Cursor']
+
+            await client.aclose()
+
+        assert pages == 3
+        assert titles == [f'test{i}' for i in range(5)]
+
+    async def test_invalid_cursor(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            response = await client.get("/api/boards", params={'cursor': 'invalid'})
+
+            await client.aclose()
+
+        assert response.status_code == 400
+
+
+class TestCollaborators:
+    async def test_check_user_is_board_collaborator(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            owner = await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            other_user = await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'other@example.com', 'username': 'other', 'password': 'password'})
+            )
+
+            board = await BoardsRepository().create_new_board(
+                board=board_schema.BoardCreate(**{'title': 'test'}),
+                owner=owner
+            )
+            await BoardsRepository().add_user_to_board_collaborators(board_id=board.id, user_id=owner.id)
+
+            owner_is_collaborator = await BoardsRepository().check_user_is_board_collaborator(
+                board_id=board.id, user_id=owner.id
+            )
+            other_user_is_collaborator = await BoardsRepository().check_user_is_board_collaborator(
+                board_id=board.id, user_id=other_user.id
+            )
+
+        assert owner_is_collaborator is True
+        assert other_user_is_collaborator is False
+
+    async def test_private_board_is_hidden_from_other_user(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            for username in ('username', 'other'):
+                await UsersRepository().register_new_user(
+                    user_schema.UserCreate(**{'email': f'{username}@example.com', 'username': username, 'password': 'password'})
+                )
+
+            tokens = {}
+            for username in ('username', 'other'):
+                token_response = await client.post(
+                    "/api/users/login/token",
+                    data={'username': username, 'password': 'password'}
+                )
+                tokens[username] = token_response.json()['access_token']
+
+            board_response = await client.post(
+                "/api/boards",
+                content=json.dumps({'board': {'title': 'title'}}),
+                headers={'Authorization': f'Bearer {tokens["username"]}'}
+            )
+            board_id = board_response.json()['id']
+
+            owner_response = await client.get(
+                f"/api/boards/{board_id}",
+                headers={'Authorization': f'Bearer {tokens["username"]}'}
+            )
+            other_user_response = await client.get(
+                f"/api/boards/{board_id}",
+                headers={'Authorization': f'Bearer {tokens["other"]}'}
+            )
+
+            await client.aclose()
+
+        assert owner_response.status_code == 200
+        assert other_user_response.status_code == 404
+
+
+
+class TestResolvers:
+    @staticmethod
+    async def create_users_and_get_headers(client):
+        headers = {}
+        for username in ('username', 'other'):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': f'{username}@example.com', 'username': username, 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': username, 'password': 'password'}
+            )
+            headers[username] = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+        return headers
+
+    @staticmethod
+    async def create_board_with_card(client, headers, public=False):
+        board_response = await client.post(
+            "/api/boards",
+            content=json.dumps({'board': {'title': 'title', 'public': public}}),
+            headers=headers
+        )
+        board_id = board_response.json()['id']
+
+        list_ids, card_ids = [], []
+        for i in range(2):
+            list_response = await client.post(
+                f"/api/boards/{board_id}/lists", content=json.dumps({'title': f'list{i}'}), headers=headers
+            )
+            list_ids.append(list_response.json()['id'])
+            card_response = await client.post(
+                f"/api/boards/{board_id}/lists/{list_ids[-1]}/cards",
+                content=json.dumps({'card': {'title': f'card{i}'}}),
+                headers=headers
+            )
+            card_ids.append(card_response.json()['id'])
+
+        return board_id, list_ids, card_ids
+
+    async def test_list_and_card_must_belong_to_path(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await self.create_users_and_get_headers(client)
+            board_id, (list_id, other_list_id), (card_id, other_card_id) = await self.create_board_with_card(
+                client, headers['username']
+            )
+            _, (foreign_list_id, _), _ = await self.create_board_with_card(client, headers['username'])
+
+            list_response = await client.get(f"/api/boards/{board_id}/lists/{list_id}", headers=headers['username'])
+            foreign_list_response = await client.get(
+                f"/api/boards/{board_id}/lists/{foreign_list_id}", headers=headers['username']
+            )
+            foreign_list_update_response = await client.patch(
+                f"/api/boards/{board_id}/lists/{foreign_list_id}",
+                content=json.dumps({'updated_list': {'title': 'new title'}}),
+                headers=headers['username']
+            )
+            card_response = await client.get(
+                f"/api/boards/{board_id}/lists/{list_id}/cards/{card_id}", headers=headers['username']
+            )
+            other_list_card_response = await client.get(
+                f"/api/boards/{board_id}/lists/{list_id}/cards/{other_card_id}", headers=headers['username']
+            )
+            other_list_card_delete_response = await client.delete(
+                f"/api/boards/{board_id}/lists/{list_id}/cards/{other_card_id}", headers=headers['username']
+            )
+            other_card_response = await client.get(
+                f"/api/boards/{board_id}/lists/{other_list_id}/cards/{other_card_id}", headers=headers['username']
+            )
+
+            await client.aclose()
+
+        assert list_response.status_code == 200
+        assert foreign_list_response.status_code == 404
+        assert foreign_list_update_response.status_code == 404
+        assert card_response.status_code == 200
+        assert other_list_card_response.status_code == 404
+        assert other_list_card_delete_response.status_code == 404
+        assert other_card_response.status_code == 200
+
+    async def test_private_board_is_hidden_from_non_collaborator(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await self.create_users_and_get_headers(client)
+            board_id, (list_id, _), (card_id, _) = await self.create_board_with_card(client, headers['username'])
+
+            urls = [
+                f"/api/boards/{board_id}",
+                f"/api/boards/{board_id}/lists/{list_id}",
+                f"/api/boards/{board_id}/lists/{list_id}/cards/{card_id}",
+            ]
+            other_user_responses = [await client.get(url, headers=headers['other']) for url in urls]
+            anonymous_responses = [await client.get(url) for url in urls]
+
+            await client.aclose()
+
+        assert [response.status_code for response in other_user_responses] == [404, 404, 404]
+        assert [response.status_code for response in anonymous_responses] == [404, 404, 404]
+
+    async def test_public_board_is_not_writable_by_non_collaborator(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await self.create_users_and_get_headers(client)
+            board_id, (list_id, _), (card_id, _) = await self.create_board_with_card(
+                client, headers['username'], public=True
+            )
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.get(f"{cards_url}/{card_id}", headers=headers['other'])
+            list_update_response = await client.patch(
+                f"/api/boards/{board_id}/lists/{list_id}",
+                content=json.dumps({'updated_list': {'title': 'new title'}}),
+                headers=headers['other']
+            )
+            card_create_response = await client.post(
+                cards_url, content=json.dumps({'card': {'title': 'title'}}), headers=headers['other']
+            )
+            card_update_response = await client.patch(
+                f"{cards_url}/{card_id}",
+                content=json.dumps({'updated_card': {'title': 'new title'}}),
+                headers=headers['other']
+            )
+            card_delete_response = await client.delete(f"{cards_url}/{card_id}", headers=headers['other'])
+            anonymous_update_response = await client.patch(
+                f"{cards_url}/{card_id}", content=json.dumps({'updated_card': {'title': 'new title'}})
+            )
+            owner_card_response = await client.get(f"{cards_url}/{card_id}", headers=headers['username'])
+
+            await client.aclose()
+
+        assert card_response.status_code == 200
+        assert list_update_response.status_code == 404
+        assert card_create_response.status_code == 404
+        assert card_update_response.status_code == 404
+        assert card_delete_response.status_code == 404
+        assert anonymous_update_response.status_code == 401
+        assert owner_card_response.json()['title'] == 'card0'
+
+    async def test_collaborators_memo_is_kept_per_board(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await self.create_users_and_get_headers(client)
+            board_id, _, _ = await self.create_board_with_card(client, headers['username'])
+            other_board_id, _, _ = await self.create_board_with_card(client, headers['other'])
+            user = await UsersRepository().get_user_by_username('username')
+
+            results = {}
+            for board_ids in ((board_id, other_board_id), (other_board_id, board_id)):
+                # one request checks both boards
+                request = Request({'type': 'http', 'method': 'GET', 'headers': []})
+                for checked_board_id in board_ids:
+                    try:
+                        board, _, _ = await board_repo.get_board_list_card_and_check_permissions(
+                            board_id=checked_board_id, current_user=user, request=request
+                        )
+                        results[board_ids, checked_board_id] = board.id
+                    except HTTPException as e:
+                        results[board_ids, checked_board_id] = e.status_code
+
+            await client.aclose()
+
+        assert results == {
+            ((board_id, other_board_id), board_id): board_id,
+            ((board_id, other_board_id), other_board_id): 404,
+            ((other_board_id, board_id), other_board_id): 404,
+            ((other_board_id, board_id), board_id): board_id,
+        }
+
+class TestSnapshot:
+    async def test_snapshot_with_etag(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            board_response = await client.post(
+                "/api/boards",
+                content=json.dumps({'board': {'title': 'title', 'public': True}}),
+                headers=headers
+            )
+            board_id = board_response.json()['id']
+
+            for title in ('first', 'second'):
+                list_response = await client.post(
+                    f"/api/boards/{board_id}/lists",
+                    content=json.dumps({'title': title}),
+                    headers=headers
+                )
+            for title in ('card', 'other card'):
+                await client.post(
+                    f"/api/boards/{board_id}/lists/{list_response.json()['id']}/cards",
+                    content=json.dumps({'card': {'title': title}}),
+                    headers=headers
+                )
+
+            response = await client.get(f"/api/boards/{board_id}/snapshot")
+            not_modified_response = await client.get(
+                f"/api/boards/{board_id}/snapshot",
+                headers={'If-None-Match': response.headers['ETag']}
+            )
+
+            await client.aclose()
+
+        assert response.status_code == 200
+        assert [lst['title'] for lst in response.json()['lists']] == ['first', 'second']
+        assert [card['title'] for card in response.json()['lists'][1]['cards']] == ['card', 'other card']
+        assert response.json()['lists'][0]['cards'] == []
+        assert not_modified_response.status_code == 304
+        assert not_modified_response.headers['ETag'] == response.headers['ETag']
+
+
+class TestConditionalGet:
+    async def test_etag_changes_with_board_version(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            board_response = await client.post(
+                "/api/boards",
+                content=json.dumps({'board': {'title': 'title'}}),
+                headers=headers
+            )
+            board_id = board_response.json()['id']
+
+            list_response = await client.post(
+                f"/api/boards/{board_id}/lists",
+                content=json.dumps({'title': 'title'}),
+                headers=headers
+            )
+            cards_url = f"/api/boards/{board_id}/lists/{list_response.json()['id']}/cards"
+
+            response = await client.get(cards_url, headers=headers)
+            etag = response.headers['ETag']
+
+            not_modified_response = await client.get(cards_url, headers=headers | {'If-None-Match': etag})
+
+            await client.post(cards_url, content=json.dumps({'card': {'title': 'card'}}), headers=headers)
+
+            modified_response = await client.get(cards_url, headers=headers | {'If-None-Match': etag})
+
+            await client.aclose()
+
+        assert etag == f'"{board_id}-2"'
+        assert not_modified_response.status_code == 304
+        assert not_modified_response.content == b''
+        assert modified_response.status_code == 200
+        assert modified_response.headers['ETag'] == f'"{board_id}-3"'
+        assert len(modified_response.json()) == 1
+
+
+class TestSearch:
+    async def test_ranked_search_with_highlights(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            tokens = {}
+            for username in ('username', 'other'):
+                await UsersRepository().register_new_user(
+                    user_schema.UserCreate(**{'email': f'{username}@example.com', 'username': username, 'password': 'password'})
+                )
+                token_response = await client.post(
+                    "/api/users/login/token",
+                    data={'username': username, 'password': 'password'}
+                )
+                tokens[username] = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            board_ids = []
+            for username in ('username', 'other'):
+                board_response = await client.post(
+                    "/api/boards",
+                    content=json.dumps({'board': {'title': 'title'}}),
+                    headers=tokens[username]
+                )
+                board_id = board_response.json()['id']
+                list_response = await client.post(
+                    f"/api/boards/{board_id}/lists",
+                    content=json.dumps({'title': 'list'}),
+                    headers=tokens[username]
+                )
+                for card in (
+                        {'title': 'Release notes', 'description': 'Deployed services'},
+                        {'title': 'Deploy release', 'description': None},
+                        {'title': 'Groceries', 'description': 'milk'},
+                        {'title': '<script>alert("xss")</script> Rollout', 'description': 'Tom & Jerry <i>rollout</i>'},
+                ):
+                    await client.post(
+                        f"/api/boards/{board_id}/lists/{list_response.json()['id']}/cards",
+                        content=json.dumps({'card': card}),
+                        headers=tokens[username]
+                    )
+                board_ids.append(board_id)
+
+            search_url = f"/api/boards/{board_ids[0]}/search"
+            first_page_response = await client.get(search_url, params={'q': 'deploy', 'limit': 1}, headers=tokens['username'])
+            second_page_response = await client.get(
+                search_url,
+                params={'q': 'deploy', 'limit': 1, 'cursor': first_page_response.headers['X-Next-Cursor']},
+                headers=tokens['username']
+            )
+            phrase_response = await client.get(search_url, params={'q': '"release notes"'}, headers=tokens['username'])
+            other_user_response = await client.get(search_url, params={'q': 'deploy'}, headers=tokens['other'])
+            script_response = await client.get(search_url, params={'q': 'rollout'}, headers=tokens['username'])
+
+            await client.aclose()
+
+        results = first_page_response.json() + second_page_response.json()
+
+        # title matches rank higher than description ones
+        assert [card['title'] for card in results] == ['Deploy release', 'Release notes']
+        assert results[0]['title_highlight'] == '<b>Deploy</b> release'
+        assert results[0]['description_highlight'] is None
+        assert results[1]['description_highlight'] == '<b>Deployed</b> services'
+        assert results[0]['score'] > results[1]['score']
+        assert [card['title'] for card in phrase_response.json()] == ['Release notes']
+        assert other_user_response.status_code == 404
+
+        # user written text is escaped, only highlight markers are html
+        script_card = script_response.json()[0]
+        assert script_card['title'] == '<script>alert("xss")</script> Rollout'
+        # headline drops non-word tokens at fragment edges, entities are dropped whole
+        assert script_card['title_highlight'] == 'script&gt;alert(&quot;xss&quot;)&lt;/script&gt; <b>Rollout</b>'
+        assert script_card['description_highlight'] == 'Jerry &lt;i&gt;<b>rollout</b>'
+        for highlight in (script_card['title_highlight'], script_card['description_highlight']):
+            assert '<' not in highlight.replace('<b>', '').replace('</b>', '')
+
+
+class TestExport:
+    async def test_export_ndjson_and_csv(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            board_response = await client.post(
+                "/api/boards", content=json.dumps({'board': {'title': 'title'}}), headers=headers
+            )
+            board_id = board_response.json()['id']
+            list_response = await client.post(
+                f"/api/boards/{board_id}/lists", content=json.dumps({'title': 'list'}), headers=headers
+            )
+            cards_url = f"/api/boards/{board_id}/lists/{list_response.json()['id']}/cards"
+            for title in ('first', 'second'):
+                card_response = await client.post(
+                    cards_url, content=json.dumps({'card': {'title': title}}), headers=headers
+                )
+            await client.patch(
+                f"{cards_url}/{card_response.json()['id']}",
+                content=json.dumps({'updated_card': {'title': 'second', 'description': 'text'}}),
+                headers=headers
+            )
+
+            ndjson_response = await client.get(f"/api/boards/{board_id}/export", headers=headers)
+            csv_response = await client.get(f"/api/boards/{board_id}/export?format=csv", headers=headers)
+            anonymous_response = await client.get(f"/api/boards/{board_id}/export")
+            chunks = [
+                chunk async for chunk in iterate_board_export(board_id=board_id, export_format=NDJSON, batch_size=1)
+            ]
+
+            await client.aclose()
+
+        rows = [json.loads(line) for line in ndjson_response.text.splitlines()]
+        csv_rows = list(csv.DictReader(io.StringIO(csv_response.text)))
+
+        assert ndjson_response.headers['content-type'] == 'application/x-ndjson'
+        assert [row['type'] for row in rows] == ['board', 'list', 'card', 'card', 'history', 'history', 'history']
+        assert [row['title'] for row in rows if row['type'] == 'card'] == ['first', 'second']
+        assert rows[-1]['action'] == 'update'
+        assert rows[-1]['changed_fields'] == ['description']
+        assert [row['type'] for row in csv_rows] == [row['type'] for row in rows]
+        assert csv_rows[-1]['changed_fields'] == '["description"]'
+        assert csv_rows[0]['description'] == ''
+        assert anonymous_response.status_code == 404
+        assert len(chunks) == len(rows)
+
+
+class TestImport:
+    async def test_import_ndjson(self, client):
+        lines = [
+            {'type': 'board', 'id': 'b1', 'title': 'imported'},
+            {'type': 'list', 'id': 'l1', 'board_id': 'b1', 'title': 'first list'},
+            {'type': 'list', 'id': 'l2', 'board_id': 'b1', 'title': 'second list'},
+            {'type': 'card', 'list_id': 'l1', 'title': 'first', 'description': 'text'},
+            {'type': 'card', 'list_id': 'l1', 'title': 'second'},
+            {'type': 'card', 'list_id': 'l2', 'title': 'third'},
+            {'type': 'history', 'id': 1},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            import_response = await client.post("/api/boards/import", content=body, headers=headers)
+            board_id = import_response.json()['board_ids']['b1']
+            lists_response = await client.get(f"/api/boards/{board_id}/lists", headers=headers)
+            list_id = lists_response.json()[0]['id']
+            cards_response = await client.get(f"/api/boards/{board_id}/lists/{list_id}/cards", headers=headers)
+            history = await models.CardHistory.query.where(models.CardHistory.board_id == board_id).gino.all()
+
+            invalid_response = await client.post(
+                "/api/boards/import",
+                content=json.dumps({'type': 'card', 'list_id': 'unknown', 'title': 'card'}),
+                headers=headers
+            )
+            anonymous_response = await client.post("/api/boards/import", content=body)
+
+            await client.aclose()
+
+        assert import_response.status_code == 201
+        assert import_response.json()['cards'] == 3
+        assert [lst['title'] for lst in lists_response.json()] == ['first list', 'second list']
+        assert [card['title'] for card in cards_response.json()] == ['first', 'second']
+        assert cards_response.json()[0]['description'] == 'text'
+        assert len(history) == 3
+        assert all(record.action == enums.CardHistoryActions.create for record in history)
+        assert invalid_response.status_code == 400
+        assert 'Line 1' in invalid_response.json()['detail']
+        assert anonymous_response.status_code == 401
+
+
+class TestLinks:
+    async def test_links_of_board_and_lists(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            board_response = await client.post(
+                "/api/boards", content=json.dumps({'board': {'title': 'title'}}), headers=headers
+            )
+            board_id = board_response.json()['id']
+            await client.post(f"/api/boards/{board_id}/lists", content=json.dumps({'title': 'list'}), headers=headers)
+
+            board = (await client.get(f"/api/boards/{board_id}", headers=headers)).json()
+            lst = (await client.get(f"/api/boards/{board_id}/lists", headers=headers)).json()[0]
+            linked_responses = [
+                await client.get(url, headers=headers)
+                for url in (board['url'], board['collaborators_url'], lst['url'], lst['cards_url'])
+            ]
+
+            await client.aclose()
+
+        assert board['url'] == f'{app_config.BASE_URL}/api/boards/{board_id}'
+        assert lst['cards_url'] == f'{app_config.BASE_URL}/api/boards/{board_id}/lists/{lst["id"]}/cards/'
+        assert [response.status_code for response in linked_responses] == [200, 200, 200, 200]
+        assert link_builder.url('board:get-board-users', relative=True, board_id=1) == '/api/boards/1/users'
+
+
+class TestSingleFlight:
+    async def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def load(value):
+            calls.append(value)
+            await release.wait()
+            if value == 'error':
+                raise ValueError(value)
+            return [value]
+
+        tasks = [asyncio.create_task(flight.run('key', load, 'rows')) for _ in range(5)]
+        error_tasks = [asyncio.create_task(flight.run('other', load, 'error')) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+
+        results = await asyncio.gather(*tasks)
+        errors = await asyncio.gather(*error_tasks, return_exceptions=True)
+        # finished call is not reused
+        later_result = await flight.run('key', load, 'rows')
+
+        assert calls == ['rows', 'error', 'rows']
+        assert all(result is results[0] for result in results)
+        assert later_result is not results[0]
+        assert [type(error) for error in errors] == [ValueError, ValueError]
+        assert flight.stats()['coalesced'] == 5
+
+    async def test_thundering_herd_on_public_board(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            board_response = await client.post(
+                "/api/boards", content=json.dumps({'board': {'title': 'title', 'public': True}}), headers=headers
+            )
+            board_id = board_response.json()['id']
+            for title in ('first', 'second'):
+                await client.post(f"/api/boards/{board_id}/lists", content=json.dumps({'title': title}), headers=headers)
+
+            calls_before = read_flight.calls
+            responses = await asyncio.gather(*[client.get(f"/api/boards/{board_id}/lists") for _ in range(20)])
+            calls = read_flight.calls - calls_before
+
+            await client.aclose()
+
+        assert [response.status_code for response in responses] == [200] * 20
+        assert all(response.json() == responses[0].json() for response in responses)
+        # board and lists queries of 20 requests
+        assert calls < 2 * 20
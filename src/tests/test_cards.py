@@ -0,0 +1,757 @@
+import asyncio
+import csv
+import datetime
+import gzip
+import json
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from sqlalchemy import create_engine
+
+from app.core import config as app_config
+from app.db import enums, history_partitions, models, rank_maintenance
+from app.db.database import db
+from app.db.repositories.boards import board_repo
+from app.db.repositories.cards import card_repo
+from app.db.repositories.lists import list_repo
+from app.schemes import board as board_schema
+from app.db.repositories.users import UsersRepository
+from app.schemes import card as card_schema
+from app.schemes import list as list_schema
+from app.schemes import user as user_schema
+from app.services.history_sink import HistorySink
+from app.services.read_cache import read_cache
+from app.utils.serialization import RowsResponse, serialize_row
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_user_and_get_headers(client):
+    user_payload = {'email': 'user@example.com', 'username': 'username', 'password': 'password'}
+    await UsersRepository().register_new_user(
+        user_schema.UserCreate(**user_payload)
+    )
+
+    token_response = await client.post(
+        "/api/users/login/token",
+        data={'username': 'username', 'password': 'password'}
+    )
+
+    return {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+
+async def create_board_with_lists(client, headers, lists_count=2):
+    board_response = await client.post(
+        "/api/boards",
+        content=json.dumps({'board': {'title': 'title'}}),
+        headers=headers
+    )
+    board_id = board_response.json()['id']
+
+    list_ids = []
+    for i in range(lists_count):
+        list_response = await client.post(
+            f"/api/boards/{board_id}/lists",
+            content=json.dumps({'title': f'list{i}'}),
+            headers=headers
+        )
+        list_ids.append(list_response.json()['id'])
+
+    return board_id, list_ids
+
+
+class TestBatch:
+    async def test_create_update_move_delete(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, other_list_id) = await create_board_with_lists(client, headers)
+
+            create_response = await client.post(
+                f"/api/boards/{board_id}/lists/{list_id}/cards:batch",
+                content=json.dumps({'batch': {'create': [{'title': f'card{i}'} for i in range(3)]}}),
+                headers=headers
+            )
+            card_ids = sorted(card['id'] for card in create_response.json()['created'])
+
+            batch_data = {'batch': {
+                'update': [
+                    {'id': card_ids[0], 'title': 'updated'},
+                    {'id': card_ids[1], 'list_id': other_list_id},
+                ],
+                'delete': [card_ids[2]],
+            }}
+            response = await client.post(
+                f"/api/boards/{board_id}/lists/{list_id}/cards:batch",
+                content=json.dumps(batch_data),
+                headers=headers
+            )
+
+            history = await models.CardHistory.query.order_by(models.CardHistory.id).gino.all()
+
+            await client.aclose()
+
+        assert create_response.status_code == 200
+        assert response.status_code == 200
+
+        updated = {card['id']: card for card in response.json()['updated']}
+        assert updated[card_ids[0]]['title'] == 'updated'
+        assert updated[card_ids[1]]['list_id'] == other_list_id
+        assert [card['id'] for card in response.json()['deleted']] == [card_ids[2]]
+
+        assert [str(record.action) for record in history] == ['create'] * 3 + ['update', 'move', 'delete']
+
+    async def test_card_from_other_list(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, other_list_id) = await create_board_with_lists(client, headers)
+
+            create_response = await client.post(
+                f"/api/boards/{board_id}/lists/{other_list_id}/cards:batch",
+                content=json.dumps({'batch': {'create': [{'title': 'card'}]}}),
+                headers=headers
+            )
+            card_id = create_response.json()['created'][0]['id']
+
+            response = await client.post(
+                f"/api/boards/{board_id}/lists/{list_id}/cards:batch",
+                content=json.dumps({'batch': {'create': [{'title': 'new'}], 'delete': [card_id]}}),
+                headers=headers
+            )
+
+            cards_count = await db.func.count(models.Card.id).gino.scalar()
+
+            await client.aclose()
+
+        assert response.status_code == 404
+        # whole batch is rolled back
+        assert cards_count == 1
+
+
+class TestBoardChanges:
+    async def test_changes_are_compacted(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, other_list_id) = await create_board_with_lists(client, headers)
+            batch_url = f"/api/boards/{board_id}/lists/{list_id}/cards:batch"
+
+            create_response = await client.post(
+                batch_url,
+                content=json.dumps({'batch': {'create': [{'title': 'updated'}, {'title': 'deleted'}]}}),
+                headers=headers
+            )
+            updated_id, deleted_id = sorted(card['id'] for card in create_response.json()['created'])
+
+            since = (await client.get(f"/api/boards/{board_id}/changes", headers=headers)).json()['last_history_id']
+
+            create_response = await client.post(
+                batch_url,
+                content=json.dumps({'batch': {
+                    'create': [{'title': 'created'}, {'title': 'created and deleted'}],
+                    'update': [{'id': updated_id, 'title': 'new title'}],
+                    'delete': [deleted_id],
+                }}),
+                headers=headers
+            )
+            created_id, created_and_deleted_id = sorted(card['id'] for card in create_response.json()['created'])
+
+            await client.post(
+                batch_url,
+                content=json.dumps({'batch': {
+                    'update': [
+                        {'id': created_id, 'title': 'created and updated'},
+                        {'id': updated_id, 'list_id': other_list_id},
+                    ],
+                    'delete': [created_and_deleted_id],
+                }}),
+                headers=headers
+            )
+
+            response = await client.get(f"/api/boards/{board_id}/changes?since={since}", headers=headers)
+
+            await client.aclose()
+
+        changes = {change['card_id']: change for change in response.json()['changes']}
+
+        assert response.status_code == 200
+        assert response.json()['has_more'] is False
+        assert response.json()['last_history_id'] == since + 7
+        assert set(changes) == {updated_id, deleted_id, created_id}
+        assert changes[deleted_id]['action'] == 'delete'
+        assert (changes[created_id]['action'], changes[created_id]['title']) == ('create', 'created and updated')
+        assert (changes[updated_id]['action'], changes[updated_id]['title']) == ('update', 'new title')
+        assert changes[updated_id]['list_id'] == other_list_id
+
+
+class TestHistoryPartitions:
+    async def test_create_and_archive_partitions(self, client, tmp_path):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            await client.post(
+                f"/api/boards/{board_id}/lists/{list_id}/cards",
+                content=json.dumps({'card': {'title': 'card'}}),
+                headers=headers
+            )
+            await client.aclose()
+
+        engine = create_engine(app_config.TEST_DB_DSN)
+        with engine.connect() as connection:
+            created = history_partitions.create_future_partitions(
+                connection, today=datetime.date(2020, 12, 10), months_ahead=1
+            )
+            # old record, moved to its month partition
+            connection.execute("UPDATE cards_history SET last_change_at = '2020-12-20'")
+
+            archived = history_partitions.archive_old_partitions(
+                connection, today=datetime.date(2022, 1, 1), retention_months=12, archive_path=str(tmp_path)
+            )
+            partitions = history_partitions.get_partitions(connection)
+            records_count = connection.execute("SELECT count(*) FROM cards_history").scalar()
+        engine.dispose()
+
+        with gzip.open(tmp_path / 'cards_history_y2020m12.csv.gz', 'rt') as file:
+            archived_rows = list(csv.DictReader(file))
+
+        assert created == ['cards_history_y2020m12', 'cards_history_y2021m01']
+        assert archived == [str(tmp_path / 'cards_history_y2020m12.csv.gz')]
+        assert list(partitions.values()) == ['cards_history_y2021m01']
+        assert records_count == 0
+        assert [row['title'] for row in archived_rows] == ['card']
+
+
+    async def test_create_partition_with_records_in_default_partition(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            for title in ('old', 'new'):
+                await client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards",
+                    content=json.dumps({'card': {'title': title}}),
+                    headers=headers
+                )
+            await client.aclose()
+
+        engine = create_engine(app_config.TEST_DB_DSN)
+        with engine.connect() as connection:
+            connection.execute("UPDATE cards_history SET last_change_at = '2019-06-20' WHERE title = 'old'")
+            connection.execute("UPDATE cards_history SET last_change_at = '2019-09-20' WHERE title = 'new'")
+
+            created = history_partitions.create_future_partitions(
+                connection, today=datetime.date(2019, 6, 10), months_ahead=1
+            )
+            rows = connection.execute(
+                "SELECT tableoid::regclass::text, title FROM cards_history ORDER BY title"
+            ).fetchall()
+            default_attached = connection.execute(
+                "SELECT count(*) FROM pg_inherits WHERE inhrelid = 'cards_history_default'::regclass"
+            ).scalar()
+
+            for name in created:
+                connection.execute(f'DROP TABLE {name}')
+        engine.dispose()
+
+        assert created == ['cards_history_y2019m06', 'cards_history_y2019m07']
+        assert [tuple(row) for row in rows] == [
+            ('cards_history_default', 'new'), ('cards_history_y2019m06', 'old')
+        ]
+        assert default_attached == 1
+
+
+class TestHistoryDiffs:
+    async def test_history_is_rebuilt_from_changes(self, client, monkeypatch):
+        monkeypatch.setattr(app_config, 'HISTORY_SNAPSHOT_INTERVAL', 3)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.post(
+                cards_url,
+                content=json.dumps({'card': {'title': 'title 0', 'description': 'long description'}}),
+                headers=headers
+            )
+            card_id = card_response.json()['id']
+
+            for i in range(1, 5):
+                await client.patch(
+                    f"{cards_url}/{card_id}",
+                    content=json.dumps({'updated_card': {'title': f'title {i}', 'description': 'long description'}}),
+                    headers=headers
+                )
+            await client.post(
+                f"{cards_url}:batch",
+                content=json.dumps({'batch': {'update': [{'id': card_id, 'description': 'new description'}]}}),
+                headers=headers
+            )
+
+            stored_records = await models.CardHistory.query.order_by(models.CardHistory.id).gino.all()
+
+            # second page starts with record, which keeps only changed title
+            first_page_response = await client.get(f"{cards_url}/{card_id}/history?limit=3", headers=headers)
+            second_page_response = await client.get(
+                f"{cards_url}/{card_id}/history?limit=3",
+                headers=headers,
+                params={'cursor': first_page_response.headers['X-Next-Cursor']}
+            )
+            list_history_response = await client.get(f"/api/boards/{board_id}/lists/{list_id}/history", headers=headers)
+
+            await client.aclose()
+
+        history = first_page_response.json() + second_page_response.json()
+
+        assert [record.changed_fields for record in stored_records] == [
+            None, ['title'], ['title'], None, ['title'], ['description'],
+        ]
+        assert [record.description for record in stored_records][1:3] == [None, None]
+        assert [(record['title'], record['description']) for record in history] == [
+            ('title 4', 'new description'),
+            ('title 4', 'long description'),
+            ('title 3', 'long description'),
+            ('title 2', 'long description'),
+            ('title 1', 'long description'),
+            ('title 0', 'long description'),
+        ]
+        assert list_history_response.json() == history
+
+    async def test_diff_base_is_read_from_locked_row(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.post(
+                cards_url, content=json.dumps({'card': {'title': 'X', 'description': None}}), headers=headers
+            )
+            card_id = card_response.json()['id']
+
+            # card is loaded before concurrent change to Y, then set back to X
+            stale_card = await models.Card.get(card_id)
+            await client.patch(
+                f"{cards_url}/{card_id}", content=json.dumps({'updated_card': {'title': 'Y'}}), headers=headers
+            )
+            await card_repo.update_and_write_history(card=stale_card, updated_card=card_schema.CardUpdate(title='X'))
+
+            stored_records = await models.CardHistory.query.order_by(models.CardHistory.id).gino.all()
+            history_response = await client.get(f"{cards_url}/{card_id}/history", headers=headers)
+
+            await client.aclose()
+
+        assert [record.changed_fields for record in stored_records] == [None, ['title'], ['title']]
+        assert [record['title'] for record in history_response.json()] == ['X', 'Y', 'X']
+
+    async def test_first_change_in_month_is_full_copy(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.post(
+                cards_url, content=json.dumps({'card': {'title': 'title', 'description': None}}), headers=headers
+            )
+            card_id = card_response.json()['id']
+
+            # card was changed last month, its full copy is in previous partition
+            last_month = history_partitions.add_months(history_partitions.month_start(datetime.date.today()), -1)
+            await models.Card.update.values(
+                last_change_at=datetime.datetime.combine(last_month, datetime.time())
+            ).where(models.Card.id == card_id).gino.status()
+
+            for title in ('title 1', 'title 2'):
+                await client.patch(
+                    f"{cards_url}/{card_id}", content=json.dumps({'updated_card': {'title': title}}), headers=headers
+                )
+
+            stored_records = await models.CardHistory.query.order_by(models.CardHistory.id).gino.all()
+
+            await client.aclose()
+
+        assert [record.changed_fields for record in stored_records] == [None, None, ['title']]
+        assert stored_records[1].title == 'title 1'
+
+
+class TestHistorySink:
+    async def test_buffered_history_is_written_on_flush(self, client, monkeypatch):
+        sink = HistorySink(mode=HistorySink.BUFFERED, batch_size=100, flush_interval=60, max_buffer=1000)
+        monkeypatch.setattr('app.db.repositories.cards.history_sink', sink)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.post(
+                cards_url, content=json.dumps({'card': {'title': 'title', 'description': None}}), headers=headers
+            )
+            await client.aclose()
+
+            records_before_flush = await models.CardHistory.query.gino.all()
+            buffered_stats = sink.stats()
+
+            flushed = await sink.flush()
+            records = await models.CardHistory.query.gino.all()
+
+        assert card_response.status_code == 200
+        assert records_before_flush == []
+        assert buffered_stats['buffer_depth'] == 1
+        assert flushed == 1
+        assert [(record.card_id, record.title, record.action) for record in records] == [
+            (card_response.json()['id'], 'title', enums.CardHistoryActions.create)
+        ]
+        assert sink.stats()['buffer_depth'] == 0
+        assert sink.stats()['flushed_records'] == 1
+
+    async def test_rolled_back_history_is_not_buffered(self, client, monkeypatch):
+        sink = HistorySink(mode=HistorySink.BUFFERED, batch_size=100, flush_interval=60, max_buffer=1000)
+        monkeypatch.setattr('app.db.repositories.cards.history_sink', sink)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            card_response = await client.post(
+                f"/api/boards/{board_id}/lists/{list_id}/cards",
+                content=json.dumps({'card': {'title': 'title', 'description': None}}),
+                headers=headers
+            )
+            await client.aclose()
+            await sink.flush()
+
+            card = await models.Card.get(card_response.json()['id'])
+            with pytest.raises(RuntimeError):
+                async with sink.collecting(), db.transaction():
+                    await card_repo.write_history(card=card, action=enums.CardHistoryActions.update)
+                    raise RuntimeError('change failed')
+
+            records = await models.CardHistory.query.gino.all()
+
+        assert sink.stats()['buffer_depth'] == 0
+        assert len(records) == 1
+
+    async def test_full_buffer_is_flushed_before_transaction(self, client, monkeypatch):
+        sink = HistorySink(mode=HistorySink.BUFFERED, batch_size=100, flush_interval=60, max_buffer=1)
+        monkeypatch.setattr('app.db.repositories.cards.history_sink', sink)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+
+            # second card waits for flush of the first one's record, then is buffered
+            responses = [
+                await client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards",
+                    content=json.dumps({'card': {'title': f'title {i}', 'description': None}}),
+                    headers=headers
+                )
+                for i in range(2)
+            ]
+            await client.aclose()
+
+            records = await models.CardHistory.query.gino.all()
+
+        assert [response.status_code for response in responses] == [200, 200]
+        assert [record.title for record in records] == ['title 0']
+        assert sink.stats()['buffer_depth'] == 1
+        assert sink.stats()['flushes'] == 1
+
+
+class FakeRedis:
+    """
+    In-memory replacement of redis client with commands used by read cache.
+    """
+
+    def __init__(self, *, broken=False):
+        self.broken = broken
+        self.data = {}
+
+    async def get(self, key):
+        if self.broken:
+            raise ConnectionError('redis is down')
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def incr(self, key):
+        self.commands.append(key)
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        for key in self.commands:
+            self.redis.data[key] = str(int(self.redis.data.get(key, 0)) + 1).encode()
+
+
+class TestReadCache:
+    async def test_cached_cards_are_invalidated_on_write(self, client, monkeypatch):
+        monkeypatch.setattr(read_cache, '_redis', FakeRedis())
+        stats_before = read_cache.stats()
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, other_list_id) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.post(
+                cards_url, content=json.dumps({'card': {'title': 'title'}}), headers=headers
+            )
+            card_id = card_response.json()['id']
+
+            first_response = await client.get(cards_url, headers=headers)
+            cached_response = await client.get(cards_url, headers=headers)
+            stats_after_reads = read_cache.stats()
+            board_before_writes = await board_repo.get_board(board_id)
+
+            await client.patch(
+                f"{cards_url}/{card_id}", content=json.dumps({'updated_card': {'title': 'new title'}}), headers=headers
+            )
+            updated_response = await client.get(cards_url, headers=headers)
+
+            await client.post(
+                f"{cards_url}/{card_id}/move", content=json.dumps({'move': {'list_id': other_list_id}}), headers=headers
+            )
+            moved_from_response = await client.get(cards_url, headers=headers)
+            moved_to_response = await client.get(
+                f"/api/boards/{board_id}/lists/{other_list_id}/cards", headers=headers
+            )
+            board_after_writes = await board_repo.get_board(board_id)
+
+            # invalidation after commit is lost, page cached under previous board version is not read
+            other_cards_url = f"/api/boards/{board_id}/lists/{other_list_id}/cards"
+            with monkeypatch.context() as patch:
+                patch.setattr(read_cache, '_increment_generations', lambda namespaces: asyncio.sleep(0))
+                await client.patch(
+                    f"{other_cards_url}/{card_id}",
+                    content=json.dumps({'updated_card': {'title': 'newest title'}}),
+                    headers=headers
+                )
+            not_invalidated_response = await client.get(other_cards_url, headers=headers)
+
+            # reads go to database while redis is down
+            monkeypatch.setattr(read_cache, '_redis', FakeRedis(broken=True))
+            broken_response = await client.get(
+                f"/api/boards/{board_id}/lists/{other_list_id}/cards", headers=headers
+            )
+            stats_after_error = read_cache.stats()
+            monkeypatch.setattr(read_cache, '_retry_at', 0.0)
+
+            await client.aclose()
+
+        assert first_response.json() == cached_response.json()
+        assert stats_after_reads['hits'] == stats_before['hits'] + 1
+        assert [card['title'] for card in updated_response.json()] == ['new title']
+        assert moved_from_response.json() == []
+        assert [card['id'] for card in moved_to_response.json()] == [card_id]
+        assert [card['title'] for card in not_invalidated_response.json()] == ['newest title']
+        assert not_invalidated_response.headers['ETag'] == f'"{board_id}-7"'
+        assert (board_before_writes.version, board_after_writes.version) == (4, 6)
+        assert [card['id'] for card in broken_response.json()] == [card_id]
+        assert stats_after_error['errors'] == stats_before['errors'] + 1
+        assert stats_after_error['available'] is False
+
+
+class TestRanks:
+    async def test_move_cards_and_lists(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, other_list_id) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_ids = []
+            for title in ('a', 'b', 'c'):
+                card_response = await client.post(
+                    cards_url, content=json.dumps({'card': {'title': title}}), headers=headers
+                )
+                card_ids.append(card_response.json()['id'])
+            a, b, c = card_ids
+
+            await client.post(f"{cards_url}/{c}/move", content=json.dumps({'move': {'before_id': a}}), headers=headers)
+            await client.post(f"{cards_url}/{a}/move", content=json.dumps({'move': {}}), headers=headers)
+            cards_response = await client.get(cards_url, headers=headers)
+
+            # to other list, after its only card
+            await client.post(
+                f"{cards_url}/{a}/move",
+                content=json.dumps({'move': {'list_id': other_list_id}}),
+                headers=headers
+            )
+            other_move_response = await client.post(
+                f"{cards_url}/{b}/move",
+                content=json.dumps({'move': {'list_id': other_list_id, 'after_id': a}}),
+                headers=headers
+            )
+            other_cards_response = await client.get(
+                f"/api/boards/{board_id}/lists/{other_list_id}/cards", headers=headers
+            )
+
+            invalid_move_response = await client.post(
+                f"{cards_url}/{c}/move", content=json.dumps({'move': {'before_id': a}}), headers=headers
+            )
+
+            list_move_response = await client.post(
+                f"/api/boards/{board_id}/lists/{other_list_id}/move",
+                content=json.dumps({'move': {'before_id': list_id}}),
+                headers=headers
+            )
+            lists_response = await client.get(f"/api/boards/{board_id}/lists", headers=headers)
+
+            history = await models.CardHistory.query.where(models.CardHistory.card_id == c).gino.all()
+
+            await client.aclose()
+
+        assert [card['id'] for card in cards_response.json()] == [c, b, a]
+        assert other_move_response.status_code == 200
+        assert [card['id'] for card in other_cards_response.json()] == [a, b]
+        assert invalid_move_response.status_code == 400
+        assert list_move_response.status_code == 200
+        assert [lst['id'] for lst in lists_response.json()] == [other_list_id, list_id]
+        assert [record.action for record in history] == [
+            enums.CardHistoryActions.create, enums.CardHistoryActions.move
+        ]
+
+    async def test_list_move_alongside_card_create(self, client, monkeypatch):
+        lock_lists, lock_board = card_repo.lock_lists, list_repo.lock_board
+
+        # hold the first lock of each request long enough for the other request to take its own
+        async def slow_lock_lists(*args, **kwargs):
+            await lock_lists(*args, **kwargs)
+            await asyncio.sleep(0.3)
+
+        async def slow_lock_board(*args, **kwargs):
+            await lock_board(*args, **kwargs)
+            await asyncio.sleep(0.3)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, other_list_id) = await create_board_with_lists(client, headers)
+
+            monkeypatch.setattr(card_repo, 'lock_lists', slow_lock_lists)
+            monkeypatch.setattr(list_repo, 'lock_board', slow_lock_board)
+            card_response, move_response = await asyncio.gather(
+                client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards",
+                    content=json.dumps({'card': {'title': 'title'}}),
+                    headers=headers
+                ),
+                client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/move",
+                    content=json.dumps({'move': {'after_id': other_list_id}}),
+                    headers=headers
+                ),
+            )
+            monkeypatch.undo()
+
+            lists_response = await client.get(f"/api/boards/{board_id}/lists", headers=headers)
+            await client.aclose()
+
+        assert card_response.status_code == 200
+        assert move_response.status_code == 200
+        assert [lst['id'] for lst in lists_response.json()] == [other_list_id, list_id]
+
+    async def test_long_ranks_are_rebalanced(self, client, monkeypatch):
+        monkeypatch.setattr(app_config, 'RANK_REBALANCE_LENGTH', 6)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_ids = []
+            for title in ('first', 'last'):
+                card_response = await client.post(
+                    cards_url, content=json.dumps({'card': {'title': title}}), headers=headers
+                )
+                card_ids.append(card_response.json()['id'])
+
+            # every card is put right after the first one, ranks between them get longer
+            for i in range(20):
+                card_response = await client.post(
+                    cards_url, content=json.dumps({'card': {'title': f'card {i}'}}), headers=headers
+                )
+                card_ids.insert(1, card_response.json()['id'])
+                await client.post(
+                    f"{cards_url}/{card_ids[1]}/move",
+                    content=json.dumps({'move': {'after_id': card_ids[0]}}),
+                    headers=headers
+                )
+
+            messages = await models.OutboxMessage.query.where(
+                models.OutboxMessage.task_name == 'rebalance_ranks'
+            ).gino.all()
+            ranks_before = await db.select([models.Card.rank]).gino.all()
+
+            engine = create_engine(app_config.TEST_DB_DSN)
+            with engine.connect() as connection:
+                rebalanced = rank_maintenance.rebalance_ranks(connection, **messages[0].payload)
+            engine.dispose()
+
+            cards_response = await client.get(f"{cards_url}?limit=100", headers=headers)
+            await client.aclose()
+
+        assert messages[0].payload == {'list_id': list_id}
+        assert max(len(rank) for rank, in ranks_before) > 6
+        assert rebalanced == len(card_ids)
+        assert [card['id'] for card in cards_response.json()] == card_ids
+        assert max(len(card['rank']) for card in cards_response.json()) <= 6
+
+
+class TestSerialization:
+    @staticmethod
+    def validated_body(rows, schema):
+        """
+        Response body, as it was returned before rows were serialized without pydantic validation.
+        """
+        return jsonable_encoder(parse_obj_as(List[schema], [row.to_dict() for row in rows]))
+
+    @staticmethod
+    def serialized_body(rows, schema):
+        return json.loads(RowsResponse([serialize_row(row, schema) for row in rows]).body)
+
+    async def test_rows_are_serialized_as_validated_by_schema(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await create_user_and_get_headers(client)
+            board_id, (list_id, _) = await create_board_with_lists(client, headers)
+            cards_url = f"/api/boards/{board_id}/lists/{list_id}/cards"
+
+            card_response = await client.post(
+                cards_url, content=json.dumps({'card': {'title': 'title', 'description': 'description'}}),
+                headers=headers
+            )
+            card_id = card_response.json()['id']
+            await client.patch(
+                f"{cards_url}/{card_id}", content=json.dumps({'updated_card': {'title': 'new title'}}), headers=headers
+            )
+            history_response = await client.get(f"/api/boards/{board_id}/lists/{list_id}/history", headers=headers)
+
+            rows = [
+                ([await models.Board.get(board_id)], board_schema.Board),
+                (await models.List.query.where(models.List.board_id == board_id).gino.all(), list_schema.ListModel),
+                ([await models.Card.get(card_id)], card_schema.Card),
+                (await card_repo.get_history(card_id=card_id), card_schema.CardHistoryRetrieve),
+            ]
+            list_history = await list_repo.get_cards_history(list_id=list_id)
+
+            await client.aclose()
+
+        for schema_rows, schema in rows:
+            assert self.serialized_body(schema_rows, schema) == self.validated_body(schema_rows, schema)
+        assert len(list_history) == 2
+        assert history_response.json() == self.validated_body(list_history, card_schema.CardHistoryRetrieve)
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import pytest
+
+from app.api.routes.events import board_history_stream
+from app.core import config as app_config
+from app.db.database import db
+from app.db.repositories.users import UsersRepository
+from app.schemes import user as user_schema
+from app.services.board_events import BoardEventHub, SlowConsumer, board_event_hub
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_board_with_list(client):
+    await UsersRepository().register_new_user(
+        user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+    )
+
+    token_response = await client.post(
+        "/api/users/login/token",
+        data={'username': 'username', 'password': 'password'}
+    )
+    headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+    board_response = await client.post(
+        "/api/boards",
+        content=json.dumps({'board': {'title': 'title'}}),
+        headers=headers
+    )
+    board_id = board_response.json()['id']
+
+    list_response = await client.post(
+        f"/api/boards/{board_id}/lists",
+        content=json.dumps({'title': 'title'}),
+        headers=headers
+    )
+
+    return headers, board_id, list_response.json()['id']
+
+
+class TestBoardEventHub:
+    async def test_events_are_coalesced(self, client):
+        hub = BoardEventHub(
+            dsn=app_config.TEST_DB_DSN, channel=app_config.BOARD_EVENTS_CHANNEL, max_pending=100, coalesce_delay=0.1
+        )
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers, board_id, list_id = await create_board_with_list(client)
+
+            async with await hub.subscribe(board_id) as subscription:
+                card_response = await client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards",
+                    content=json.dumps({'card': {'title': 'card'}}),
+                    headers=headers
+                )
+                card_id = card_response.json()['id']
+                await client.patch(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards/{card_id}",
+                    content=json.dumps({'updated_card': {'title': 'new title'}}),
+                    headers=headers
+                )
+
+                message = await asyncio.wait_for(subscription.get(), timeout=5)
+
+            await hub.stop()
+            await client.aclose()
+
+        assert message['board_id'] == board_id
+        assert message['version'] == 4
+        assert message['events'] == [{'type': 'card', 'action': 'update', 'id': card_id, 'list_id': list_id}]
+        assert hub.stats()['subscribers'] == 0
+
+    async def test_slow_consumer_is_dropped(self, client):
+        hub = BoardEventHub(
+            dsn=app_config.TEST_DB_DSN, channel=app_config.BOARD_EVENTS_CHANNEL, max_pending=1, coalesce_delay=0
+        )
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers, board_id, list_id = await create_board_with_list(client)
+
+            subscription = await hub.subscribe(board_id)
+            await client.post(
+                f"/api/boards/{board_id}/lists/{list_id}/cards:batch",
+                content=json.dumps({'batch': {'create': [{'title': 'first'}, {'title': 'second'}]}}),
+                headers=headers
+            )
+
+            with pytest.raises(SlowConsumer):
+                await asyncio.wait_for(subscription.get(), timeout=5)
+
+            await hub.stop()
+            await client.aclose()
+
+        assert hub.stats()['dropped_subscribers'] == 1
+        assert hub.stats()['subscribers'] == 0
+
+    async def test_subscribers_are_dropped_and_listener_reconnects_on_lost_connection(self, client):
+        hub = BoardEventHub(
+            dsn=app_config.TEST_DB_DSN, channel=app_config.BOARD_EVENTS_CHANNEL, max_pending=100,
+            coalesce_delay=0, reconnect_interval=0.05,
+        )
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers, board_id, list_id = await create_board_with_list(client)
+
+            subscription = await hub.subscribe(board_id)
+            # database restart or failover
+            await db.scalar(db.text('SELECT pg_terminate_backend(:pid)'), pid=hub._connection.get_server_pid())
+
+            with pytest.raises(SlowConsumer):
+                await asyncio.wait_for(subscription.get(), timeout=5)
+
+            while not hub.stats()['reconnects']:
+                await asyncio.sleep(0.05)
+
+            # listener is reconnected in background, clients subscribing again get events
+            async with await hub.subscribe(board_id) as new_subscription:
+                await client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards",
+                    content=json.dumps({'card': {'title': 'card'}}),
+                    headers=headers
+                )
+                message = await asyncio.wait_for(new_subscription.get(), timeout=5)
+
+            await hub.stop()
+            await client.aclose()
+
+        assert message['board_id'] == board_id
+        assert hub.stats()['dropped_subscribers'] == 1
+        assert hub.stats()['connected'] is False
+
+
+class DisconnectedRequest:
+    """
+    Request of client, which disconnects after catching up on history
+    """
+    scope = {}
+
+    async def is_disconnected(self):
+        return True
+
+
+class TestHistoryStream:
+    async def test_replay_after_last_event_id(self, client, monkeypatch):
+        monkeypatch.setattr(board_event_hub, 'dsn', app_config.TEST_DB_DSN)
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers, board_id, list_id = await create_board_with_list(client)
+
+            for title in ('first', 'second', 'third'):
+                await client.post(
+                    f"/api/boards/{board_id}/lists/{list_id}/cards",
+                    content=json.dumps({'card': {'title': title}}),
+                    headers=headers
+                )
+            history_response = await client.get(f"/api/boards/{board_id}/lists/{list_id}/history", headers=headers)
+            first_history_id = history_response.json()[-1]['id']
+
+            messages = [
+                message async for message in
+                board_history_stream(DisconnectedRequest(), board_id=board_id, after_id=first_history_id)
+            ]
+
+            await board_event_hub.stop()
+            await client.aclose()
+
+        assert len(messages) == 2
+        assert messages[0].startswith(f'id: {first_history_id + 1}\nevent: create\ndata: '.encode())
+        assert json.loads(messages[1].split(b'data: ')[1])['title'] == 'third'
+        assert board_event_hub.stats()['subscribers'] == 0
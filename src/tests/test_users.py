@@ -1,10 +1,20 @@
+import asyncio
 import json
+import threading
+
 import pytest
+from gino.crud import UpdateRequest
 
 from app.core import config as app_config
+from app.db import models
 from app.db.database import db
 from app.db.repositories.users import UsersRepository
 from app.schemes import user as user_schema
+from app.services.outbox import outbox_dispatcher
+from app.services.password_hasher import PasswordHasher
+from app.services.read_cache import read_cache, user_namespace
+from app.utils import image_loading
+from tests.test_cards import FakeRedis
 
 
 pytestmark = pytest.mark.asyncio
@@ -23,6 +33,26 @@ class TestSingUp:
         assert len(users_in_db) == 1
         assert response.status_code == 201
 
+    async def test_sign_up_email_is_sent_through_outbox(self, client, monkeypatch):
+        payload = {'new_user': {'email': 'user@example.com', 'username': 'username', 'password': 'password'}}
+        sent_messages = []
+        monkeypatch.setattr(
+            outbox_dispatcher, '_publish',
+            lambda messages: sent_messages.extend((message.task_name, message.payload) for message in messages)
+        )
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            response = await client.post("/api/users", content=json.dumps(payload))
+            await client.aclose()
+
+            dispatched = await outbox_dispatcher.dispatch_batch()
+            pending_messages = await models.OutboxMessage.query.gino.all()
+
+        assert response.status_code == 201
+        assert dispatched == 1
+        assert sent_messages == [('send_email', {'email': 'user@example.com'})]
+        assert pending_messages == []
+
     async def test_with_invalid_username(self, client):
         payload = {'new_user': {'email': 'user@example.com', 'username': 'ab', 'password': 'password'}}
 
@@ -103,6 +133,66 @@ class TestLogin:
 
         assert response.status_code == 401
 
+    async def test_concurrent_logins(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+
+            user = await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            await user.update(is_superuser=True).apply()
+
+            # password checks run in hasher thread pool, requests wait in its queue
+            responses = await asyncio.gather(*[
+                client.post(
+                    "/api/users/login/token",
+                    data={'username': 'username', 'password': 'password'}
+                )
+                for _ in range(8)
+            ])
+
+            anonymous_metrics_response = await client.get("/api/metrics")
+            metrics_response = await client.get(
+                "/api/metrics", headers={'Authorization': f'Bearer {responses[0].json()["access_token"]}'}
+            )
+
+            await client.aclose()
+
+        assert all(response.status_code == 200 for response in responses)
+        assert anonymous_metrics_response.status_code == 401
+        assert metrics_response.json()['password_hasher']['queued'] == 0
+        assert metrics_response.json()['password_hasher']['completed'] >= 9
+
+
+class TestPasswordHasher:
+    async def test_cancelled_queued_calls_leave_queue(self):
+        hasher = PasswordHasher(max_workers=1, max_queue=2)
+        release = threading.Event()
+        calls = []
+
+        running = asyncio.ensure_future(hasher.run(release.wait))
+        try:
+            while not hasher.stats()['running']:
+                await asyncio.sleep(0.01)
+
+            queued = [asyncio.ensure_future(hasher.run(calls.append, 'queued')) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            assert hasher.stats()['queued'] == 2
+
+            for future in queued:
+                future.cancel()
+            await asyncio.gather(*queued, return_exceptions=True)
+            assert hasher.stats()['queued'] == 0
+        finally:
+            release.set()
+            await running
+
+        # queue is not full anymore
+        await hasher.run(calls.append, 'after')
+        hasher.shutdown()
+
+        assert calls == ['after']
+        assert hasher.stats()['rejected'] == 0
+
 
 class TestSelfUser:
     async def test_authenticated_user(self, client):
@@ -269,3 +359,257 @@ class TestPasswordUpdate:
         assert response.status_code == 200
         assert old_salt != new_salt
         assert old_password != new_password
+
+
+class TestUserCache:
+    @staticmethod
+    def cache_old_row_during_update(monkeypatch):
+        """
+        Concurrent request, which reads user while update is written, caches previous row.
+        """
+        apply = UpdateRequest.apply
+
+        async def apply_after_concurrent_read(self):
+            await UsersRepository().get_cached_user_by_username('username')
+            return await apply(self)
+
+        monkeypatch.setattr(UpdateRequest, 'apply', apply_after_concurrent_read)
+
+    async def test_profile_update_is_seen_by_next_request(self, client, monkeypatch):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            self.cache_old_row_during_update(monkeypatch)
+            update_response = await client.patch(
+                '/api/users/me',
+                content=json.dumps({"profile_update": {'email': 'new_email@example.com'}}),
+                headers=headers
+            )
+            me_response = await client.get('/api/users/me/', headers=headers)
+
+            await client.aclose()
+
+        assert update_response.status_code == 200
+        assert me_response.json()['email'] == 'new_email@example.com'
+
+    async def test_password_update_is_seen_by_next_request(self, client, monkeypatch):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            self.cache_old_row_during_update(monkeypatch)
+            update_response = await client.patch(
+                '/api/users/me/password_update',
+                content=json.dumps({"password_update": {'password': 'new_password'}}),
+                headers=headers
+            )
+            monkeypatch.undo()
+
+            cached_user = await UsersRepository().get_cached_user_by_username('username')
+            stored_user = await UsersRepository().get_user_by_username('username')
+
+            await client.aclose()
+
+        assert update_response.status_code == 200
+        assert (cached_user.password, cached_user.salt) == (stored_user.password, stored_user.salt)
+
+
+    async def test_user_changed_by_other_process_is_not_read_from_cache(self, client, monkeypatch):
+        monkeypatch.setattr(read_cache, '_redis', FakeRedis())
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            cached_user = await UsersRepository().get_cached_user_by_username('username')
+
+            # other process writes the row and invalidates its own cache
+            await models.User.update.values(email='new_email@example.com')\
+                .where(models.User.username == 'username').gino.status()
+            await read_cache.invalidate(user_namespace('username'))
+
+            user = await UsersRepository().get_cached_user_by_username('username')
+
+            await client.aclose()
+
+        assert cached_user.email == 'user@example.com'
+        assert user.email == 'new_email@example.com'
+
+    async def test_failed_update_doesnt_change_cached_user(self, client, monkeypatch):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            await UsersRepository().register_new_user(
+                user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+            )
+            token_response = await client.post(
+                "/api/users/login/token",
+                data={'username': 'username', 'password': 'password'}
+            )
+            headers = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+            await client.get('/api/users/me/', headers=headers)
+
+            async def failing_apply(self):
+                raise ConnectionError('database is down')
+
+            with monkeypatch.context() as patch:
+                patch.setattr(UpdateRequest, 'apply', failing_apply)
+                with pytest.raises(ConnectionError):
+                    await client.patch(
+                        '/api/users/me',
+                        content=json.dumps({"profile_update": {'email': 'new_email@example.com'}}),
+                        headers=headers
+                    )
+
+            me_response = await client.get('/api/users/me/', headers=headers)
+
+            await client.aclose()
+
+        assert me_response.json()['email'] == 'user@example.com'
+
+
+class TestProfilePicture:
+    @staticmethod
+    async def login(client):
+        await UsersRepository().register_new_user(
+            user_schema.UserCreate(**{'email': 'user@example.com', 'username': 'username', 'password': 'password'})
+        )
+        token_response = await client.post(
+            "/api/users/login/token",
+            data={'username': 'username', 'password': 'password'}
+        )
+        return {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+    @staticmethod
+    def spool_to(monkeypatch, tmp_path):
+        queued = []
+        monkeypatch.setattr(image_loading, 'UPLOAD_SPOOL_PATH', str(tmp_path))
+        monkeypatch.setattr(
+            image_loading.upload_image_task, 'delay', lambda **kwargs: queued.append(kwargs) or 'task-id'
+        )
+        return queued
+
+    async def test_file_is_streamed_to_spool(self, client, monkeypatch, tmp_path):
+        queued = self.spool_to(monkeypatch, tmp_path)
+        image = bytes(range(256)) * 1024
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await self.login(client)
+            response = await client.post(
+                "/api/users/profile_picture",
+                data={'comment': 'avatar'},
+                files={'file': ('avatar.jpg', image, 'image/jpeg')},
+                headers=headers
+            )
+            await client.aclose()
+
+        assert response.status_code == 200
+        assert response.json() == {'task_id': 'task-id'}
+        assert queued[0]['username'] == 'username'
+        with open(queued[0]['path'], 'rb') as spooled_file:
+            assert spooled_file.read() == image
+
+    async def test_too_large_file_is_rejected(self, client, monkeypatch, tmp_path):
+        queued = self.spool_to(monkeypatch, tmp_path)
+        image = b'x' * (app_config.MAX_PROFILE_PICTURE_SIZE + 1024 * 1024)
+        boundary = 'boundary'
+        head = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="avatar.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        received = []
+
+        async def chunked_body():
+            # no Content-Length, size is found while body is read
+            for data in (head, *[image[i:i + 64 * 1024] for i in range(0, len(image), 64 * 1024)], tail):
+                received.append(len(data))
+                yield data
+
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            headers = await self.login(client)
+            content_length_response = await client.post(
+                "/api/users/profile_picture",
+                files={'file': ('avatar.jpg', image, 'image/jpeg')},
+                headers=headers
+            )
+            chunked_response = await client.post(
+                "/api/users/profile_picture",
+                content=chunked_body(),
+                headers={**headers, 'Content-Type': f'multipart/form-data; boundary={boundary}'}
+            )
+            await client.aclose()
+
+        assert content_length_response.status_code == 413
+        assert chunked_response.status_code == 413
+        # reading stopped right after the limit was passed
+        assert sum(received) <= app_config.MAX_PROFILE_PICTURE_SIZE + 128 * 1024
+        assert queued == []
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestSearch:
+    async def test_search_and_export(self, client):
+        async with db.with_bind(app_config.TEST_DB_DSN):
+            users = {}
+            for username, email in (
+                    ('alice_dev', 'alice@example.com'),
+                    ('alicexdev', 'ax@example.com'),
+                    ('malik', 'bob@example.com'),
+                    ('carol', 'carol@example.com'),
+            ):
+                users[username] = await UsersRepository().register_new_user(
+                    user_schema.UserCreate(**{'email': email, 'username': username, 'password': 'password'})
+                )
+            await users['carol'].update(is_superuser=True).apply()
+
+            headers = {}
+            for username in ('alice_dev', 'carol'):
+                token_response = await client.post(
+                    "/api/users/login/token",
+                    data={'username': username, 'password': 'password'}
+                )
+                headers[username] = {'Authorization': f'Bearer {token_response.json()["access_token"]}'}
+
+            first_page_response = await client.get(
+                "/api/users/search", params={'q': 'ALI', 'limit': 2}, headers=headers['alice_dev']
+            )
+            second_page_response = await client.get(
+                "/api/users/search",
+                params={'q': 'ALI', 'limit': 2, 'cursor': first_page_response.headers['X-Next-Cursor']},
+                headers=headers['alice_dev']
+            )
+            # underscore is matched literally
+            escaped_response = await client.get("/api/users/search", params={'q': 'e_d'}, headers=headers['alice_dev'])
+            email_response = await client.get("/api/users/search", params={'q': 'bob@'}, headers=headers['alice_dev'])
+            short_query_response = await client.get("/api/users/search", params={'q': 'al'}, headers=headers['alice_dev'])
+            anonymous_response = await client.get("/api/users/search", params={'q': 'ali'})
+
+            forbidden_export_response = await client.get("/api/users/export", headers=headers['alice_dev'])
+            export_response = await client.get("/api/users/export", headers=headers['carol'])
+
+            await client.aclose()
+
+        assert [user['username'] for user in first_page_response.json()] == ['alice_dev', 'alicexdev']
+        assert [user['username'] for user in second_page_response.json()] == ['malik']
+        assert [user['username'] for user in escaped_response.json()] == ['alice_dev']
+        assert [user['username'] for user in email_response.json()] == ['malik']
+        assert short_query_response.status_code == 422
+        assert anonymous_response.status_code == 401
+
+        assert forbidden_export_response.status_code == 403
+        assert export_response.headers['content-type'] == 'application/x-ndjson'
+        exported = [json.loads(line) for line in export_response.text.splitlines()]
+        assert [user['username'] for user in exported] == ['alice_dev', 'alicexdev', 'malik', 'carol']
+        assert 'password' not in exported[0]